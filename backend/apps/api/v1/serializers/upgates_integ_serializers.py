@@ -0,0 +1,9 @@
+from rest_framework import serializers
+from apps.upgates_integration.models import SyncRun
+
+class SyncRunSerializer(serializers.ModelSerializer):
+    duration_seconds = serializers.ReadOnlyField()
+
+    class Meta:
+        model = SyncRun
+        fields = '__all__'
@@ -6,6 +6,7 @@ router = DefaultRouter()
 router.register(r'products', product_views.ProductViewSet)
 router.register(r'variants', product_views.ProductVariantViewSet)
 router.register(r'stock-adjustments', product_views.StockAdjustmentViewSet)
+router.register(r'sync-runs', upgates_integ_views.SyncRunViewSet)
 
 urlpatterns = [
     # Example: path('', views.product_list, name='product_list'),
@@ -1,18 +1,35 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.permissions import IsAuthenticated, IsAdminUser # Or define your own
 from django.utils import timezone
 
 from apps.upgates_integration.tasks import *
-from apps.djangocore.utils import get_app_setting
+from apps.upgates_integration.constants import SyncType
+from apps.upgates_integration.locks import enqueue_sync
+from apps.upgates_integration.models import SyncRun
+from apps.djangocore.utils import get_app_setting, get_int_app_setting
+from ..serializers.upgates_integ_serializers import SyncRunSerializer
+
+SYNC_RUNS_DEFAULT_LIMIT = 50
+SYNC_RUNS_MAX_LIMIT = 500
 
 class SyncDataTriggerAPIView(APIView):
+    """
+    Starts a sync in background. Order and product syncs are single-flight: while a run of the same type
+    is queued or running, a trigger doesn't queue another one. The response carries the id of the new run
+    (`run_id`, see /sync-runs/) or of the run in progress (`already_running`: true).
+    Stock adjustments are claimed by the processing tasks instead, so 'update_stock' queues
+    UPGATES_STOCK_ADJUSTMENT_WORKERS tasks that process the pending adjustments in parallel.
+    """
     # Only allow authenticated admin users to trigger syncs
     # permission_classes = [IsAuthenticated, IsAdminUser]
 
     def post(self, request, *args, **kwargs):
         data_type = request.data.get('type') # 'products' or 'orders'
+        run_id = None
+        queued = True
         # if data_type == 'products':
         #     sync_products_task.delay()
         #     message = "Product synchronization started in background."
@@ -26,7 +43,7 @@ class SyncDataTriggerAPIView(APIView):
             if data_status_ids:
                 status_ids = data_status_ids
             
-            sync_orders_task.delay(creation_time_from=creation_time_from_str, status_ids=status_ids)#creation_time_from=creation_time_from_str)
+            run_id, queued = enqueue_sync(SyncType.ORDERS, sync_orders_task, creation_time_from=creation_time_from_str, status_ids=status_ids)
             message = "Order synchronization started in background."
         elif data_type == 'orders_status':
             orderids = request.data.get('orderids')
@@ -36,16 +53,20 @@ class SyncDataTriggerAPIView(APIView):
         elif data_type == 'products_simple':
             # Trigger simple product sync task
             data_codes = request.data.get('codes') # Optional, e.g., "code1;code2;code3"
-            sync_products_simple_task.delay(codes=data_codes)
+            run_id, queued = enqueue_sync(SyncType.PRODUCTS_SIMPLE, sync_products_simple_task, codes=data_codes)
             message = "Simple product synchronization started in background."
         elif data_type == 'products_full':
-            sync_full_products_task.delay()
+            force = bool(request.data.get('force', False)) # Re-process the feed even if unchanged
+            run_id, queued = enqueue_sync(SyncType.PRODUCTS_FULL, sync_full_products_task, force=force)
             message = "FULL product synchronization started in background."
         elif data_type == 'products_partial':
-            sync_partial_products_task.delay()
+            force = bool(request.data.get('force', False)) # Re-process the feed even if unchanged
+            run_id, queued = enqueue_sync(SyncType.PRODUCTS_PARTIAL, sync_partial_products_task, force=force)
             message = "PARTIAL product synchronization started in background."
         elif data_type == 'update_stock':
-            process_stock_adjustments_task.delay()
+            workers = max(1, get_int_app_setting('UPGATES_STOCK_ADJUSTMENT_WORKERS', 1))
+            for _ in range(workers):
+                process_stock_adjustments_task.delay()
             message = "Stock adjustments synchronization started in background."
         else:
             return Response(
@@ -53,4 +74,36 @@ class SyncDataTriggerAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        return Response({"message": message}, status=status.HTTP_202_ACCEPTED) # 202 Accepted means processing has begun
\ No newline at end of file
+        if not queued:
+            return Response(
+                {"message": "Synchronization of this type is already in progress.", "run_id": run_id, "already_running": True},
+                status=status.HTTP_200_OK,
+            )
+        return Response({"message": message, "run_id": run_id}, status=status.HTTP_202_ACCEPTED) # 202 Accepted means processing has begun
+
+class SyncRunViewSet(ReadOnlyModelViewSet):
+    """
+    Recent sync runs, newest first. Optional query parameters: `type` (e.g. 'products_full'),
+    `status` ('queued', 'running', 'succeeded', 'failed') and `limit` (default 50, at most 500).
+    """
+    queryset = SyncRun.objects.all()
+    serializer_class = SyncRunSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        sync_type = self.request.query_params.get('type')
+        if sync_type:
+            queryset = queryset.filter(sync_type=sync_type)
+        run_status = self.request.query_params.get('status')
+        if run_status:
+            queryset = queryset.filter(status=run_status)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', SYNC_RUNS_DEFAULT_LIMIT))
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, SYNC_RUNS_MAX_LIMIT))
+        serializer = self.get_serializer(self.get_queryset()[:limit], many=True)
+        return Response(serializer.data)
@@ -1,12 +1,33 @@
 from django.core.cache import cache
 from .models import AppSetting
 
-def get_app_setting(key, default=None):
-    value = cache.get(f'app_setting_{key}')
+def get_app_setting(key, default=None, use_cache=True):
+    # use_cache=False reads straight from the DB, for state that other processes may have changed
+    value = cache.get(f'app_setting_{key}') if use_cache else None
     if value is None:
         try:
             value = AppSetting.objects.get(key=key).value
             cache.set(f'app_setting_{key}', value, timeout=60*60)  # cache for 1 hour
         except AppSetting.DoesNotExist:
             value = default
-    return value
\ No newline at end of file
+    return value
+
+def get_int_app_setting(key, default):
+    # AppSetting values are stored as text; fall back to the default if the value isn't a valid integer
+    value = get_app_setting(key, default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def set_app_setting(key, value):
+    AppSetting.objects.update_or_create(key=key, defaults={'value': value})
+    cache.set(f'app_setting_{key}', value, timeout=60*60)  # keep cache in sync with the DB
+
+def get_float_app_setting(key, default):
+    # Same as get_int_app_setting, for fractional values (e.g. rates, delays in seconds)
+    value = get_app_setting(key, default)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
@@ -23,6 +23,8 @@ class Product(models.Model):
     # Internal tracking fields
     uma_is_active = models.BooleanField(default=True) # To mark products as inactive if they disappear from feed
     uma_last_synced_at = models.DateTimeField(auto_now=True) # Automatically updates on each save
+    uma_sync_digest = models.CharField(max_length=64, blank=True, null=True, help_text="Digest of the feed data last written by the full sync") # Unchanged rows are skipped
+    uma_sync_generation = models.PositiveBigIntegerField(null=True, blank=True, db_index=True, help_text="Full sync run that last saw this row in the feed") # Rows with an older generation are deactivated
 
     class Meta:
         ordering = ['code'] # Default ordering for products
@@ -61,6 +63,8 @@ class ProductVariant(models.Model):
     # Internal tracking fields
     uma_is_active = models.BooleanField(default=True) # To mark variants as inactive if they disappear from feed
     uma_last_synced_at = models.DateTimeField(auto_now=True)
+    uma_sync_digest = models.CharField(max_length=64, blank=True, null=True, help_text="Digest of the feed data last written by the full sync") # Unchanged rows are skipped
+    uma_sync_generation = models.PositiveBigIntegerField(null=True, blank=True, db_index=True, help_text="Full sync run that last saw this row in the feed") # Rows with an older generation are deactivated
 
     class Meta:
         ordering = ['product', 'code'] # Order by product, then variant code
@@ -144,6 +148,17 @@ class ProductStockAdjustment(models.Model):
         help_text="Detailed error message if the API update failed."
     )
 
+    claimed_by = models.CharField(
+        max_length=100,
+        null=True, blank=True,
+        help_text="Worker that claimed the adjustment for processing."
+    )
+    lease_expires_at = models.DateTimeField(
+        null=True, blank=True,
+        db_index=True,
+        help_text="Until when the claim of a 'processing' adjustment is held. Expired claims are picked up again."
+    )
+
     class Meta:
         verbose_name = "Product Stock Adjustment" 
         verbose_name_plural = "Product Stock Adjustments" 
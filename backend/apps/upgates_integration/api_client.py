@@ -1,8 +1,13 @@
-import requests
 import logging
 import base64
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from requests.exceptions import RequestException, Timeout
-from apps.djangocore.utils import get_app_setting
+from apps.djangocore.utils import get_app_setting, get_int_app_setting
+from .instrumentation import current_sync_run
+from .ratelimit import get_rate_limiter
+from .transport import get_session
 
 logger = logging.getLogger(__name__)
 
@@ -28,10 +33,18 @@ class UpgatesAPIClient:
 
     def _make_request(self, method, endpoint, params=None, json_data=None, timeout=30):
         url = f"{self.base_url}{endpoint}"
+        waited = get_rate_limiter().acquire() # Shared API quota across workers; blocks instead of provoking 429s
+        run = current_sync_run()
+        run.add_counts(api_calls=1)
+        if waited:
+            logger.debug(f"Upgates API request to {url} throttled for {waited:.2f}s by the rate limiter.")
+            run.add_counts(api_throttled_calls=1, api_throttle_wait_seconds=waited)
         try:
-            response = requests.request(
+            # Pooled keep-alive session shared per process; retries with backoff and honours Retry-After on 429
+            response = get_session().request(
                 method, url, headers=self.headers, params=params, json=json_data, timeout=timeout
             )
+            run.add_bytes(len(response.content))
             response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
             if response.status_code == 204:
                 return {} # Return an empty dict for No Content success
@@ -51,6 +64,42 @@ class UpgatesAPIClient:
             )
             raise
 
+    def iter_pages(self, fetch_page, params=None, start_page=1):
+        """
+        Yields (page, number_of_pages, response) for every page of a paginated endpoint, in page order.
+        `fetch_page` is one of the GET methods (e.g. self.get_orders). After the first response reveals
+        `number_of_pages`, the remaining pages are downloaded concurrently by a bounded thread pool
+        (UPGATES_API_MAX_WORKERS) while the caller processes earlier pages; at most UPGATES_API_PREFETCH_PAGES
+        pages are buffered ahead of the caller. A failed page request is raised when that page is reached.
+        Page requests run in the caller's context, so they are counted in the current sync run.
+        `start_page` skips the pages before it (to resume an interrupted sync).
+        """
+        params = dict(params or {})
+        response, return_code = fetch_page(**params, page=start_page)
+        number_of_pages = response.get('number_of_pages', 1) if isinstance(response, dict) else 1
+        yield start_page, number_of_pages, response
+        if number_of_pages <= start_page:
+            return
+
+        max_workers = max(1, get_int_app_setting('UPGATES_API_MAX_WORKERS', 4))
+        prefetch = max(1, get_int_app_setting('UPGATES_API_PREFETCH_PAGES', max_workers * 2))
+        next_page = start_page + 1
+        pending = deque() # (page, future) in page order, bounded by `prefetch`
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upgates-pages')
+        try:
+            while next_page <= number_of_pages or pending:
+                while next_page <= number_of_pages and len(pending) < prefetch:
+                    pending.append((next_page, executor.submit(contextvars.copy_context().run, fetch_page, **params, page=next_page)))
+                    next_page += 1
+                page, future = pending.popleft()
+                response, return_code = future.result()
+                yield page, number_of_pages, response
+        finally:
+            # Consumer stopped early or a page failed: don't download the rest
+            for _, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
     def get_orders(self, **kwargs):
         # Fetch orders from Upgates API
         return self._make_request('GET', '/orders', params=kwargs)
@@ -0,0 +1,38 @@
+class SyncType:
+    ORDERS = 'orders'
+    ORDERS_STATUS = 'orders_status'
+    PRODUCTS_SIMPLE = 'products_simple'
+    PRODUCTS_FULL = 'products_full'
+    PRODUCTS_PARTIAL = 'products_partial'
+    STOCK_ADJUSTMENTS = 'stock_adjustments'
+
+    CHOICES = [
+        (ORDERS, 'Orders'),
+        (ORDERS_STATUS, 'Order Status Push'),
+        (PRODUCTS_SIMPLE, 'Products (API)'),
+        (PRODUCTS_FULL, 'Products (Full Feed)'),
+        (PRODUCTS_PARTIAL, 'Products (Partial Feed)'),
+        (STOCK_ADJUSTMENTS, 'Stock Adjustments'),
+    ]
+
+class SyncRunStatus:
+    QUEUED = 'queued' # Triggered and holding the sync type's lock, waiting for a worker
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+
+    CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+class SyncPhase:
+    # Phase names used in SyncRun.phase_durations
+    DOWNLOAD = 'download' # Feed download or API page fetches
+    PARSE = 'parse'
+    DB_WRITE = 'db_write'
+    DEACTIVATE = 'deactivate' # Deactivation of rows missing from the feed (and the staged merge)
+    API_PUSH = 'api_push' # Writes to the Upgates API
+    PRESYNC = 'presync' # Targeted stock refresh before pushing stock adjustments
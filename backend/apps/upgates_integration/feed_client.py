@@ -1,11 +1,47 @@
-import requests
-import xml.etree.ElementTree as ET
+import hashlib
+import json
 import logging
-from apps.djangocore.utils import get_app_setting
+import os
+import tempfile
+from contextlib import contextmanager
+from apps.djangocore.utils import get_app_setting, set_app_setting
 from requests.exceptions import RequestException, Timeout
+from .constants import SyncPhase
+from .instrumentation import current_sync_run
+from .transport import get_session
 
 logger = logging.getLogger(__name__)
 
+FULL_FEED_STATE_KEY = "UPGATES_PRODUCTS_FULL_XML_STATE"
+PARTIAL_FEED_STATE_KEY = "UPGATES_PRODUCTS_AVAIBILITY_XML_STATE"
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+class FeedDownload:
+    """
+    Result of a (conditional) feed download.
+    `file` is an open binary file with the spooled feed body, positioned at the start,
+    or None if the feed hasn't changed since it was last processed (`unchanged` is True).
+    """
+    def __init__(self, url, state_key, etag=None, last_modified=None, content_hash=None, size=0, file=None, path=None, unchanged=False):
+        self.url = url
+        self.state_key = state_key
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+        self.size = size
+        self.file = file
+        self.path = path
+        self.unchanged = unchanged
+
+    def validators(self):
+        return {
+            'url': self.url,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'content_hash': self.content_hash,
+        }
+
 class UpgatesFeedClient:
     def __init__(self):
         self.product_full_feed_url = get_app_setting("UPGATES_PRODUCTS_FULL_XML_URL") # This URL points directly to the XML feed
@@ -13,33 +49,111 @@ class UpgatesFeedClient:
         if not self.product_full_feed_url and not self.availability_feed_url:
             raise ValueError("UPGATES_PRODUCTS_FULL_XML_URL or UPGATES_PRODUCTS_AVAIBILITY_XML_URL must be configured in settings.")
 
-    def _fetch_xml_feed(self, url):
-        """Helper to fetch and parse an XML feed from a given URL."""
+    def _get_feed_state(self, state_key, url):
+        """Returns the stored validators of the last processed feed, if they belong to the given URL."""
+        raw_state = get_app_setting(state_key, use_cache=False)
+        if not raw_state:
+            return {}
         try:
-            response = requests.get(url, timeout=180)
+            state = json.loads(raw_state)
+        except ValueError:
+            logger.warning(f"Ignoring invalid stored feed state under {state_key}.")
+            return {}
+        if state.get('url') != url:
+            return {} # Feed URL changed, stored validators don't apply
+        return state
+
+    @contextmanager
+    def _download_xml_feed(self, url, state_key, conditional=True):
+        """
+        Helper to download an XML feed into a temporary file on disk.
+        Sends a conditional request based on the validators of the last processed feed, so an unchanged feed
+        costs a 304 response. Feeds whose body hash matches the last processed one are reported as unchanged too.
+        Yields a FeedDownload; the temporary file is removed on exit.
+        """
+        state = self._get_feed_state(state_key, url) if conditional else {}
+        headers = {}
+        if state.get('etag'):
+            headers['If-None-Match'] = state['etag']
+        if state.get('last_modified'):
+            headers['If-Modified-Since'] = state['last_modified']
+
+        run = current_sync_run()
+        try:
+            with run.phase(SyncPhase.DOWNLOAD):
+                response = get_session().get(url, headers=headers, timeout=180, stream=True)
             response.raise_for_status()
-            logger.info(f"Successfully fetched XML feed from {url}")
-            return ET.fromstring(response.content)
         except Timeout:
             logger.error(f"XML feed download timed out from {url}.")
             raise
         except RequestException as e:
             logger.error(f"Error fetching XML feed from {url}: {e} - Response: {getattr(e.response, 'text', 'N/A')}")
             raise
-        except ET.ParseError as e:
-            logger.error(f"Error parsing XML feed from {url}: {e}")
-            raise
-        except Exception as e:
-            logger.error(f"An unexpected error occurred while fetching/parsing XML feed from {url}: {e}")
-            raise
 
-    def get_full_products_xml_feed(self):
-        """Fetches the full product XML feed."""
-        return self._fetch_xml_feed(self.product_full_feed_url)
+        fd, path = None, None
+        try:
+            if response.status_code == 304:
+                logger.info(f"XML feed from {url} not modified since last sync (HTTP 304).")
+                yield FeedDownload(url, state_key, etag=state.get('etag'), last_modified=state.get('last_modified'),
+                                   content_hash=state.get('content_hash'), unchanged=True)
+                return
+
+            # Spool the body to disk instead of holding it in memory
+            fd, path = tempfile.mkstemp(prefix='upgates-feed-', suffix='.xml')
+            digest = hashlib.sha256()
+            size = 0
+            with os.fdopen(fd, 'w+b') as feed_file:
+                fd = None # Closed together with feed_file
+                with run.phase(SyncPhase.DOWNLOAD):
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        feed_file.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                feed_file.seek(0)
+                run.add_bytes(size)
+
+                download = FeedDownload(
+                    url, state_key,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified'),
+                    content_hash=digest.hexdigest(),
+                    size=size,
+                    file=feed_file,
+                    path=path,
+                )
+                logger.info(f"Downloaded XML feed from {url} ({size} bytes).")
+
+                if conditional and state.get('content_hash') == download.content_hash:
+                    logger.info(f"XML feed from {url} has the same content as the last processed one.")
+                    download.file = None
+                    download.unchanged = True
+                    # Remember the fresh validators so the next run gets a 304
+                    self.mark_feed_processed(download)
+
+                yield download
+        finally:
+            response.close()
+            if fd is not None:
+                os.close(fd)
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+    def mark_feed_processed(self, download):
+        """Stores the validators of a successfully processed feed for the next conditional download."""
+        set_app_setting(download.state_key, json.dumps(download.validators()))
+
+    @contextmanager
+    def open_full_products_feed(self, conditional=True):
+        """Downloads the full product XML feed. Yields a FeedDownload."""
+        with self._download_xml_feed(self.product_full_feed_url, FULL_FEED_STATE_KEY, conditional=conditional) as download:
+            yield download
 
-    def get_partial_products_xml_feed(self):
-        """Fetches the partial product XML feed."""
+    @contextmanager
+    def open_partial_products_feed(self, conditional=True):
+        """Downloads the partial product XML feed. Yields a FeedDownload, or None if the feed URL is not configured."""
         if not self.availability_feed_url:
             logger.warning("Partial product feed URL is not configured. Skipping partial feed sync.")
-            return None # Or raise an error
-        return self._fetch_xml_feed(self.availability_feed_url)
\ No newline at end of file
+            yield None
+            return
+        with self._download_xml_feed(self.availability_feed_url, PARTIAL_FEED_STATE_KEY, conditional=conditional) as download:
+            yield download
@@ -0,0 +1,316 @@
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from django.utils import timezone
+from .constants import SyncRunStatus
+from .models import SyncRun
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Logger whose ERROR records are kept as the error message of a failed run
+SYNC_LOGGER_NAME = 'apps.upgates_integration'
+ERROR_MESSAGE_MAX_LENGTH = 2000
+
+_current_recorder = contextvars.ContextVar('upgates_sync_run', default=None)
+_queued_run_id = contextvars.ContextVar('upgates_queued_sync_run', default=None)
+_last_run = contextvars.ContextVar('upgates_last_sync_run', default=None)
+_END = object()
+
+def _current_rss_bytes():
+    """Resident set size of this process, or its peak RSS where the current one can't be read."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        if resource is None:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # KiB on Linux
+
+class _LastErrorHandler(logging.Handler):
+    """Remembers the last ERROR record logged while a run is active."""
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.message = None
+
+    def emit(self, record):
+        try:
+            self.message = record.getMessage()
+        except Exception:
+            pass
+
+class SyncRunRecorder:
+    """
+    Records one sync run into a SyncRun row: phase durations, row counters, downloaded bytes and peak memory.
+    Use it as a context manager (or through the @recorded_sync decorator); inside the run, sync code reaches it
+    with current_sync_run(). Phases are timed exclusively: a nested phase pauses the enclosing one.
+    A top-level run started inside adopt_queued_run() takes over that queued SyncRun instead of creating one.
+    A run whose work continues in other tasks can be detach()ed and finished later with `resume_run_id`.
+    Recording problems are logged and never fail the sync itself.
+    """
+    def __init__(self, sync_type, resume_run_id=None, **details):
+        self.sync_type = sync_type
+        self.resume_run_id = resume_run_id
+        self.detached = False
+        self.details = dict(details)
+        self.phases = {}
+        self.rows = {'read': 0, 'inserted': 0, 'updated': 0, 'skipped': 0, 'failed': 0}
+        self.bytes_downloaded = 0
+        self.peak_memory_bytes = None
+        self.status = SyncRunStatus.RUNNING
+        self.error_message = None
+        self.run = None
+        self._lock = threading.Lock() # add_bytes() is called from API page prefetch threads
+        self._phase_stack = []
+        self._phase_mark = None
+        self._error_handler = _LastErrorHandler()
+        self._token = None
+
+    def __enter__(self):
+        parent = _current_recorder.get()
+        if parent is not None and parent.run is not None and self.resume_run_id is None:
+            self.details.setdefault('parent_run_id', parent.run.pk)
+        try:
+            queued_run_id = _queued_run_id.get() if parent is None else None
+            if self.resume_run_id is not None:
+                self.run = self._resume(self.resume_run_id)
+            elif queued_run_id is not None:
+                _queued_run_id.set(None) # Only the outermost run takes it over
+                self.run = self._adopt(queued_run_id)
+            if self.run is None:
+                self.run = SyncRun.objects.create(sync_type=self.sync_type, details=self.details)
+        except Exception as e:
+            logger.warning(f"Could not record {self.sync_type} sync run: {e}")
+        self._token = _current_recorder.set(self)
+        logging.getLogger(SYNC_LOGGER_NAME).addHandler(self._error_handler)
+        self.sample_memory()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        logging.getLogger(SYNC_LOGGER_NAME).removeHandler(self._error_handler)
+        _current_recorder.reset(self._token)
+        while self._phase_stack:
+            self._exit_phase()
+        self.sample_memory()
+        if exc is not None:
+            self.fail(f"{exc_type.__name__}: {exc}")
+        elif self.detached and self.status == SyncRunStatus.RUNNING:
+            # Finished by the task that resumes it, which may already have happened
+            self._save(finished=False, if_running=True)
+            return False
+        elif self.status == SyncRunStatus.RUNNING:
+            self.status = SyncRunStatus.SUCCEEDED
+        self._save()
+        return False
+
+    def _adopt(self, run_id):
+        run = SyncRun.objects.filter(pk=run_id, sync_type=self.sync_type, status=SyncRunStatus.QUEUED).first()
+        if run is None:
+            return None
+        self.details = {**run.details, **self.details}
+        run.status = SyncRunStatus.RUNNING
+        run.started_at = timezone.now()
+        run.details = self.details
+        run.save(update_fields=['status', 'started_at', 'details'])
+        return run
+
+    def _resume(self, run_id):
+        run = SyncRun.objects.filter(pk=run_id, sync_type=self.sync_type, status=SyncRunStatus.RUNNING).first()
+        if run is None:
+            return None
+        self.phases = dict(run.phase_durations)
+        self.rows = {
+            'read': run.rows_read, 'inserted': run.rows_inserted, 'updated': run.rows_updated,
+            'skipped': run.rows_skipped, 'failed': run.rows_failed,
+        }
+        self.bytes_downloaded = run.bytes_downloaded
+        self.peak_memory_bytes = run.peak_memory_bytes
+        self.details = {**run.details, **self.details}
+        return run
+
+    def detach(self):
+        """
+        Leaves the run open (status 'running') when the block ends without an error. The run is saved right away,
+        so call this before handing the work over: the task that resumes the run starts from the totals so far.
+        """
+        self.detached = True
+        self._charge_phase(time.perf_counter()) # Include the time of the phase in progress
+        self.sample_memory()
+        self._save(finished=False, if_running=True)
+
+    def _save(self, finished=True, if_running=False):
+        """Writes the run to its SyncRun row. With `if_running`, a row that was finished in the meantime is left alone."""
+        if self.run is None:
+            return
+        values = {
+            'status': self.status,
+            'finished_at': timezone.now() if finished else None,
+            'phase_durations': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            'rows_read': self.rows['read'],
+            'rows_inserted': self.rows['inserted'],
+            'rows_updated': self.rows['updated'],
+            'rows_skipped': self.rows['skipped'],
+            'rows_failed': self.rows['failed'],
+            'bytes_downloaded': self.bytes_downloaded,
+            'peak_memory_bytes': self.peak_memory_bytes,
+            'details': self.details,
+            'error_message': self.error_message[:ERROR_MESSAGE_MAX_LENGTH] if self.error_message else None,
+        }
+        try:
+            if if_running:
+                SyncRun.objects.filter(pk=self.run.pk, status=SyncRunStatus.RUNNING).update(**values)
+                return
+            for field, value in values.items():
+                setattr(self.run, field, value)
+            self.run.save()
+        except Exception as e:
+            logger.warning(f"Could not save {self.sync_type} sync run {self.run.pk}: {e}")
+
+    def fail(self, message=None):
+        """Marks the run as failed; without a message, the last error logged during the run is used."""
+        self.status = SyncRunStatus.FAILED
+        self.error_message = message or self._error_handler.message or self.error_message
+
+    def _charge_phase(self, now):
+        if self._phase_stack:
+            name = self._phase_stack[-1]
+            self.phases[name] = self.phases.get(name, 0) + now - self._phase_mark
+        self._phase_mark = now
+
+    def _enter_phase(self, name):
+        self._charge_phase(time.perf_counter())
+        self._phase_stack.append(name)
+
+    def _exit_phase(self):
+        self._charge_phase(time.perf_counter())
+        self._phase_stack.pop()
+        self.sample_memory()
+
+    @contextmanager
+    def phase(self, name):
+        """Adds the time spent in the block to phase `name`."""
+        self._enter_phase(name)
+        try:
+            yield
+        finally:
+            self._exit_phase()
+
+    def timed(self, iterable, name):
+        """Iterates `iterable`, adding the time spent producing each item to phase `name`."""
+        iterator = iter(iterable)
+        while True:
+            self._enter_phase(name)
+            try:
+                item = next(iterator, _END)
+            finally:
+                self._exit_phase()
+            if item is _END:
+                return
+            yield item
+
+    def add_rows(self, read=0, inserted=0, updated=0, skipped=0, failed=0):
+        self.rows['read'] += read
+        self.rows['inserted'] += inserted
+        self.rows['updated'] += updated
+        self.rows['skipped'] += skipped
+        self.rows['failed'] += failed
+
+    def add_bytes(self, count):
+        with self._lock:
+            self.bytes_downloaded += count
+
+    def note(self, **details):
+        """Adds sync specific values to SyncRun.details."""
+        self.details.update(details)
+
+    def add_counts(self, **amounts):
+        """Adds the amounts to counters in SyncRun.details (e.g. API calls); called from API threads too."""
+        with self._lock:
+            for key, amount in amounts.items():
+                total = self.details.get(key, 0) + amount
+                self.details[key] = round(total, 3) if isinstance(total, float) else total
+
+    def sample_memory(self):
+        rss = _current_rss_bytes()
+        if rss is not None and (self.peak_memory_bytes is None or rss > self.peak_memory_bytes):
+            self.peak_memory_bytes = rss
+
+class _NullRecorder:
+    """Stand-in for code running outside a recorded sync; records nothing."""
+    run = None
+
+    @contextmanager
+    def phase(self, name):
+        yield
+
+    def timed(self, iterable, name):
+        return iterable
+
+    def add_rows(self, **counts):
+        pass
+
+    def add_bytes(self, count):
+        pass
+
+    def note(self, **details):
+        pass
+
+    def add_counts(self, **amounts):
+        pass
+
+    def fail(self, message=None):
+        pass
+
+    def detach(self):
+        pass
+
+    def sample_memory(self):
+        pass
+
+_null_recorder = _NullRecorder()
+
+def current_sync_run():
+    """Returns the recorder of the sync run in progress, or a recorder that does nothing."""
+    return _current_recorder.get() or _null_recorder
+
+@contextmanager
+def adopt_queued_run(run_id):
+    """Makes the next top-level sync run in the block record into the queued SyncRun `run_id`."""
+    token = _queued_run_id.set(run_id)
+    try:
+        yield
+    finally:
+        _queued_run_id.reset(token)
+
+def last_sync_run():
+    """Returns the SyncRun of the last @recorded_sync call that finished in this context (e.g. for a task result)."""
+    return _last_run.get()
+
+def recorded_sync(sync_type):
+    """
+    Decorator that records each call of a sync function as a SyncRun.
+    A False return value marks the run as failed (with the last error logged during the run),
+    an exception marks it as failed and is re-raised.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = SyncRunRecorder(sync_type)
+            try:
+                with recorder:
+                    result = func(*args, **kwargs)
+                    if result is False:
+                        recorder.fail()
+                    return result
+            finally:
+                _last_run.set(recorder.run)
+        return wrapper
+    return decorator
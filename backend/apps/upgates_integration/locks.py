@@ -0,0 +1,177 @@
+import functools
+import logging
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.utils import timezone
+from apps.djangocore.utils import get_int_app_setting
+from .constants import SyncRunStatus
+from .instrumentation import adopt_queued_run
+from .models import SyncRun
+
+try:
+    import redis
+except ImportError: # redis-py comes with the Celery Redis broker, but keep the syncs usable without it
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+SYNC_LOCK_KEY = 'upgates:sync:lock:{sync_type}'
+
+# Single-flight locks: at most one run per sync type is queued or running at a time. The lock lives in the Redis
+# instance used as the Celery broker and holds the id of the SyncRun that owns it, so a second trigger can report
+# the run it was coalesced into. The owner keeps extending the lock while it runs; if its worker dies, the lock
+# expires after UPGATES_SYNC_LOCK_TTL seconds. Without Redis, syncs run unlocked (as before).
+
+# Deletes / extends the lock only if it is still held by the given run
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+class SyncLock:
+    """Redis single-flight lock of one sync type, owned by a SyncRun id."""
+    def __init__(self, sync_type, redis_url=None):
+        self.sync_type = sync_type
+        self.key = SYNC_LOCK_KEY.format(sync_type=sync_type)
+        self.ttl = max(10, get_int_app_setting('UPGATES_SYNC_LOCK_TTL', 900))
+        self.redis_client = None
+        redis_url = redis_url or getattr(settings, 'CELERY_BROKER_URL', None)
+        if redis is not None and redis_url and redis_url.startswith(('redis://', 'rediss://', 'unix://')):
+            self.redis_client = redis.Redis.from_url(redis_url, socket_timeout=1, socket_connect_timeout=1)
+            self.release_script = self.redis_client.register_script(RELEASE_SCRIPT)
+            self.extend_script = self.redis_client.register_script(EXTEND_SCRIPT)
+
+    def acquire(self, run_id):
+        """
+        Takes the lock for `run_id`. Returns the id of the run holding the lock afterwards: `run_id` if it was
+        taken (or already held by that run), otherwise the other run's id.
+        """
+        if self.redis_client is None:
+            return run_id
+        try:
+            if self.redis_client.set(self.key, run_id, nx=True, ex=self.ttl):
+                return run_id
+            holder = self.redis_client.get(self.key)
+        except redis.RedisError as e:
+            logger.warning(f"Can't reach Redis for the {self.sync_type} sync lock ({e}), running unlocked.")
+            return run_id
+        if holder is None: # Released in the meantime
+            return self.acquire(run_id)
+        return int(holder)
+
+    def extend(self, run_id):
+        """Resets the lock's expiry; returns False if `run_id` no longer holds it."""
+        if self.redis_client is None:
+            return True
+        try:
+            return bool(self.extend_script(keys=[self.key], args=[run_id, self.ttl * 1000]))
+        except redis.RedisError as e:
+            logger.warning(f"Could not extend the {self.sync_type} sync lock: {e}")
+            return True
+
+    def release(self, run_id):
+        if self.redis_client is None:
+            return
+        try:
+            self.release_script(keys=[self.key], args=[run_id])
+        except redis.RedisError as e:
+            logger.warning(f"Could not release the {self.sync_type} sync lock (expires in {self.ttl}s): {e}")
+
+def _queue_run(sync_type, **details):
+    return SyncRun.objects.create(
+        sync_type=sync_type, status=SyncRunStatus.QUEUED, details={'queued_at': timezone.now().isoformat(), **details},
+    )
+
+def enqueue_sync(sync_type, task, **task_kwargs):
+    """
+    Queues `task` for `sync_type` unless a run of that type is already queued or running.
+    Returns (run id, True) for a new run, or (id of the run in progress, False) when the trigger was coalesced into it.
+    """
+    run = _queue_run(sync_type, trigger='api')
+    lock = SyncLock(sync_type)
+    holder = lock.acquire(run.pk)
+    if holder != run.pk:
+        run.delete()
+        logger.info(f"{sync_type} sync already queued or running (run {holder}), not queueing another one.")
+        return holder, False
+    try:
+        task.delay(run_id=run.pk, **task_kwargs)
+    except Exception:
+        lock.release(run.pk)
+        run.delete()
+        raise
+    return run.pk, True
+
+def _keep_alive(lock, run_id, stopped):
+    while not stopped.wait(lock.ttl / 3):
+        if not lock.extend(run_id):
+            logger.warning(f"{lock.sync_type} sync run {run_id} lost its lock.")
+            return
+
+@contextmanager
+def single_flight(sync_type, run_id=None):
+    """
+    Runs the block as the only run of `sync_type`. Yields True if the block may sync, or False if another run
+    holds the lock (the caller should skip). `run_id` is the queued SyncRun created by enqueue_sync(), if any;
+    otherwise (beat schedule, task retries) a queued run is created here. The sync run recorded inside the
+    block takes over the queued SyncRun.
+    """
+    run = None
+    if run_id is not None:
+        run = SyncRun.objects.filter(pk=run_id, status=SyncRunStatus.QUEUED).first()
+    if run is None: # Not triggered through enqueue_sync(), or a retry of a run that already finished
+        run = _queue_run(sync_type, trigger='task')
+    lock = SyncLock(sync_type)
+    holder = lock.acquire(run.pk)
+    if holder != run.pk:
+        logger.info(f"{sync_type} sync already running (run {holder}), skipping this one.")
+        if run.pk == run_id:
+            run.status = SyncRunStatus.FAILED
+            run.finished_at = timezone.now()
+            run.error_message = f"Another {sync_type} run ({holder}) took over the sync lock."
+            run.save(update_fields=['status', 'finished_at', 'error_message'])
+        else:
+            run.delete()
+        yield False
+        return
+
+    stopped = threading.Event()
+    keeper = threading.Thread(target=_keep_alive, args=(lock, run.pk, stopped), name=f'sync-lock-{sync_type}', daemon=True)
+    keeper.start()
+    try:
+        with adopt_queued_run(run.pk):
+            yield True
+    finally:
+        stopped.set()
+        keeper.join()
+        # A run still 'running' here was detached to follow-up tasks (fan-out full sync), which release the lock
+        if not SyncRun.objects.filter(pk=run.pk, status=SyncRunStatus.RUNNING).exists():
+            lock.release(run.pk)
+        # A run that never started (e.g. an error before the sync function) shouldn't stay queued
+        SyncRun.objects.filter(pk=run.pk, status=SyncRunStatus.QUEUED).update(
+            status=SyncRunStatus.FAILED, finished_at=timezone.now(), error_message="The sync did not start.",
+        )
+
+def single_flight_task(sync_type):
+    """
+    Decorator for sync tasks: runs the task inside single_flight(sync_type) and skips it while another run of
+    that type holds the lock. The task accepts an extra `run_id` keyword (the queued run from enqueue_sync()).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, run_id=None, **kwargs):
+            with single_flight(sync_type, run_id) as acquired:
+                if not acquired:
+                    return None
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
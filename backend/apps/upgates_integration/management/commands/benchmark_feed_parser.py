@@ -0,0 +1,297 @@
+import gc
+import logging
+import os
+import re
+import statistics
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from apps.upgates_integration.xml_parser import (
+    BACKEND_LXML, BACKEND_STDLIB, UpgatesProductXMLParser, lxml_etree, parse_xml_string,
+)
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_RE = re.compile(r'<PRODUCT>.*?\n\t</PRODUCT>', re.S)
+CODE_RE = re.compile(r'<CODE>([^<]+)</CODE>')
+
+def write_synthetic_feed(template_path, products, path):
+    """
+    Writes a feed with `products` copies of the first <PRODUCT> of `template_path` (export-full.xml by default).
+    Every copy gets its own product/variant codes; returns the number of variants written.
+    """
+    with open(template_path, encoding='utf-8') as template_file:
+        template = template_file.read()
+    match = PRODUCT_RE.search(template)
+    if match is None:
+        raise CommandError(f"No <PRODUCT> found in {template_path}.")
+    product = match.group(0)
+    code = CODE_RE.search(product).group(1)
+    variants_per_product = product.count('<VARIANT>')
+    with open(path, 'w', encoding='utf-8') as feed_file:
+        feed_file.write(template[:match.start()])
+        for i in range(products):
+            feed_file.write(product.replace(f'<CODE>{code}', f'<CODE>B{i:06d}'))
+            feed_file.write('\n\t')
+        feed_file.write(template[match.end():])
+    return products * variants_per_product
+
+class _BaselineProductXMLParser:
+    """
+    The per-product parsing of the feed parser as it was before the single-pass field tables, kept for --baseline:
+    one find() per field, XPath predicate lookups for prices and parameters, products and variants as nested dicts.
+    """
+
+    def _get_text(self, element, tag, default=None):
+        node = element.find(tag)
+        if node is not None and node.text is not None:
+            return node.text.strip()
+        return default
+
+    def _get_decimal(self, element, tag, default=None):
+        text = self._get_text(element, tag)
+        if text:
+            try:
+                return float(text)
+            except ValueError:
+                logger.warning(f"Could not convert '{text}' to decimal for tag '{tag}'.")
+        return default
+
+    def _parse_prices(self, price_element):
+        prices = {}
+        if price_element is None:
+            return prices
+        cz_price_node = price_element.find('PRICE[@language="cz"]')
+        if cz_price_node is None:
+            return prices
+        pricelist_node = cz_price_node.find('PRICELISTS/PRICELIST')
+        if pricelist_node:
+            prices['price_original'] = self._get_decimal(pricelist_node, 'PRICE_ORIGINAL')
+            prices['price_sale'] = self._get_decimal(pricelist_node, 'PRICE_SALE')
+            prices['price_with_vat'] = self._get_decimal(pricelist_node, 'PRICE_WITH_VAT')
+            prices['price_without_vat'] = self._get_decimal(pricelist_node, 'PRICE_WITHOUT_VAT')
+        prices['price_purchase'] = self._get_decimal(cz_price_node, 'PRICE_PURCHASE')
+        prices['currency'] = self._get_text(cz_price_node, 'CURRENCY')
+        return prices
+
+    def _parse_parameters(self, parameters_element):
+        params_dict = {}
+        if parameters_element is None:
+            return params_dict
+        for param_node in parameters_element.findall('PARAMETER'):
+            name = self._get_text(param_node, 'NAME[@language="cz"]')
+            value = self._get_text(param_node, 'VALUE[@language="cz"]')
+            if name and value:
+                params_dict[name] = value
+        return params_dict
+
+    def _get_nested_text(self, element, path, default=None):
+        if element is None:
+            return default
+        found = element.find(path)
+        if found is not None and found.text is not None:
+            return found.text.strip()
+        return default
+
+    def _get_main_image_url(self, element):
+        images = element.find('IMAGES')
+        if images is not None:
+            for image in images.findall('IMAGE'):
+                if self._get_text(image, 'MAIN_YN') == '1':
+                    return self._get_text(image, 'URL')
+        return None
+
+    def parse_product(self, product_node):
+        product_data = {
+            'code': self._get_text(product_node, 'CODE'),
+            'product_id': self._get_text(product_node, 'PRODUCT_ID'),
+            'title': self._get_nested_text(product_node, './/DESCRIPTION[@language="cz"]/TITLE'),
+            'manufacturer': self._get_text(product_node, 'MANUFACTURER'),
+            'ean': self._get_text(product_node, 'EAN'),
+            'supplier_code': self._get_text(product_node, 'SUPPLIER_CODE'),
+            'availability': self._get_text(product_node, 'AVAILABILITY'),
+            'stock': self._get_text(product_node, 'STOCK', '0'),
+            'stock_position': self._get_text(product_node, 'STOCK_POSITION'),
+            'weight': self._get_decimal(product_node, 'WEIGHT', 0),
+            'unit': self._get_text(product_node, 'UNIT'),
+            'image_url': self._get_main_image_url(product_node),
+        }
+        try:
+            if product_data['product_id']:
+                product_data['product_id'] = int(product_data['product_id'])
+            if product_data['stock']:
+                product_data['stock'] = int(product_data['stock'])
+        except (ValueError, TypeError):
+            product_data['product_id'] = None
+            product_data['stock'] = 0
+        return product_data
+
+    def parse_variant(self, variant_node):
+        variant_data = {
+            'code': self._get_text(variant_node, 'CODE'),
+            'variant_id': self._get_text(variant_node, 'VARIANT_ID'),
+            'supplier_code': self._get_text(variant_node, 'SUPPLIER_CODE'),
+            'ean': self._get_text(variant_node, 'EAN'),
+            'availability': self._get_text(variant_node, 'AVAILABILITY'),
+            'stock': self._get_text(variant_node, 'STOCK', '0'),
+            'stock_position': self._get_text(variant_node, 'STOCK_POSITION'),
+            'weight': self._get_decimal(variant_node, 'WEIGHT', 0),
+            'image_url': self._get_text(variant_node, 'IMAGE_URL'),
+            'prices': self._parse_prices(variant_node.find('PRICES')),
+            'parameters': self._parse_parameters(variant_node.find('PARAMETERS')),
+        }
+        try:
+            if variant_data['variant_id']:
+                variant_data['variant_id'] = int(variant_data['variant_id'])
+            if variant_data['stock']:
+                variant_data['stock'] = int(variant_data['stock'])
+        except (ValueError, TypeError):
+            variant_data['variant_id'] = None
+            variant_data['stock'] = 0
+        return variant_data
+
+    def parse_product_with_variants(self, product_node):
+        product_info = self.parse_product(product_node)
+        product_info['variants'] = []
+        variants_node = product_node.find('VARIANTS')
+        if variants_node is not None:
+            for variant_node in variants_node.findall('VARIANT'):
+                product_info['variants'].append(self.parse_variant(variant_node))
+        return product_info
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the product feed parser on a synthetic feed built from export-full.xml: "
+        "per-product parsing of an already parsed tree and the streaming parse of the whole file, per backend. "
+        "With --memory, measures the memory retained by the parsed records instead. "
+        "With --baseline, first compares the per-product parsing with the parser from before the single-pass field tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000, help="Products in the synthetic feed (default 2000).")
+        parser.add_argument('--template', default=str(settings.BASE_DIR.parent / 'export-full.xml'),
+                            help="Feed whose first product is repeated (default export-full.xml).")
+        parser.add_argument('--backend', choices=[BACKEND_LXML, BACKEND_STDLIB, 'both'], default='both')
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement, the best one is reported.")
+        parser.add_argument('--memory', action='store_true',
+                            help="Measure the memory retained by all parsed records (e.g. --products 5000 for 100k variants).")
+        parser.add_argument('--baseline', action='store_true',
+                            help="Compare with the previous per-field find() parser on the stdlib tree of the same feed.")
+
+    def handle(self, *args, **options):
+        backends = [BACKEND_LXML, BACKEND_STDLIB] if options['backend'] == 'both' else [options['backend']]
+        if lxml_etree is None and BACKEND_LXML in backends:
+            self.stdout.write("lxml is not installed, skipping the lxml backend.")
+            backends.remove(BACKEND_LXML)
+        repeat = max(1, options['repeat'])
+        if options['baseline'] and options['memory']:
+            raise CommandError("--baseline only applies to the timing benchmark, not to --memory.")
+
+        fd, path = tempfile.mkstemp(prefix='upgates-bench-', suffix='.xml')
+        os.close(fd)
+        try:
+            variants = write_synthetic_feed(options['template'], options['products'], path)
+            size = os.path.getsize(path)
+            self.stdout.write(f"Synthetic feed: {options['products']} products, {variants} variants, {size / 2 ** 20:.1f} MiB.")
+            records = options['products'] + variants
+            if options['baseline']:
+                self._compare_with_baseline(path, repeat, options['products'])
+            for backend in backends:
+                if options['memory']:
+                    self._measure_memory(path, backend, records)
+                else:
+                    self._benchmark_backend(path, backend, repeat, options['products'], records)
+        finally:
+            os.remove(path)
+
+    def _best_of(self, repeat, func):
+        best = None
+        for _ in range(repeat):
+            # Like timeit: full collections walk the whole parsed tree and land in random runs
+            gc.collect()
+            gc.disable()
+            try:
+                started = time.perf_counter()
+                func()
+                elapsed = time.perf_counter() - started
+            finally:
+                gc.enable()
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    def _compare_with_baseline(self, path, repeat, products):
+        """
+        Per-product parsing of the stdlib tree by the baseline and the current parser. The two alternate within
+        every repeat and the speedup is the median of the per-repeat ratios, so a slow stretch of a noisy machine
+        doesn't land on one of them only.
+        """
+        with open(path, 'rb') as feed_file:
+            root = parse_xml_string(feed_file.read(), backend=BACKEND_STDLIB)
+        product_nodes = root.findall('PRODUCT')
+
+        def parse_tree(parser):
+            for product_node in product_nodes:
+                parser.parse_product_with_variants(product_node)
+
+        runs = []
+        for _ in range(repeat):
+            runs.append((
+                self._best_of(1, lambda: parse_tree(_BaselineProductXMLParser())),
+                self._best_of(1, lambda: parse_tree(UpgatesProductXMLParser(root, backend=BACKEND_STDLIB))),
+            ))
+        baseline_seconds = min(baseline for baseline, _ in runs)
+        current_seconds = min(current for _, current in runs)
+        self.stdout.write(
+            f"baseline: parsed tree {baseline_seconds * 1e6 / products:.0f} us/product with the per-field find() parser, "
+            f"{current_seconds * 1e6 / products:.0f} us/product now; "
+            f"{statistics.median(baseline / current for baseline, current in runs):.1f}x faster (median of {repeat} paired runs)"
+        )
+
+    def _benchmark_backend(self, path, backend, repeat, products, records):
+        with open(path, 'rb') as feed_file:
+            root = parse_xml_string(feed_file.read(), backend=backend)
+        product_nodes = root.findall('PRODUCT')
+
+        def parse_tree():
+            parser = UpgatesProductXMLParser(root, backend=backend)
+            for product_node in product_nodes:
+                parser.parse_product_with_variants(product_node)
+
+        def parse_stream():
+            parser = UpgatesProductXMLParser(backend=backend)
+            for _ in parser.iter_products_data(path):
+                pass
+
+        tree_seconds = self._best_of(repeat, parse_tree)
+        del root, product_nodes
+        stream_seconds = self._best_of(repeat, parse_stream)
+        self.stdout.write(
+            f"{backend}: parsed tree {tree_seconds * 1e6 / products:.0f} us/product "
+            f"({tree_seconds * 1e6 / records:.1f} us per product or variant), "
+            f"streaming parse {stream_seconds:.2f}s ({records / stream_seconds:.0f} records/s)"
+        )
+
+    def _measure_memory(self, path, backend, records):
+        """Memory retained by the records of the whole feed (tracemalloc), and by the same data as plain dicts."""
+        gc.collect()
+        tracemalloc.start()
+        try:
+            started = time.perf_counter()
+            products = list(UpgatesProductXMLParser(backend=backend).iter_products_data(path))
+            elapsed = time.perf_counter() - started
+            gc.collect()
+            records_bytes = tracemalloc.get_traced_memory()[0]
+            # Nested dicts with the same (shared) values, i.e. the container overhead the records avoid
+            dicts = [asdict(product) for product in products]
+            gc.collect()
+            dicts_bytes = tracemalloc.get_traced_memory()[0] - records_bytes
+        finally:
+            tracemalloc.stop()
+        del products, dicts
+        self.stdout.write(
+            f"{backend}: records retain {records_bytes / 2 ** 20:.1f} MiB ({records_bytes / records:.0f} B per product or variant), "
+            f"as dicts {dicts_bytes / 2 ** 20:.1f} MiB ({dicts_bytes / records:.0f} B); parsed in {elapsed:.1f}s"
+        )
@@ -1,3 +1,112 @@
 from django.db import models
+from django.utils import timezone
+from .constants import SyncType, SyncRunStatus
 
-# Create your models here.
+# Staging tables for the full catalog sync in 'staged' mode (UPGATES_FULL_SYNC_MODE).
+# The parsed feed is bulk-loaded here first and then merged into the live product tables in one short transaction.
+# Rows are keyed by the sync generation that loaded them and removed after the merge.
+
+class StagedProduct(models.Model):
+    generation = models.PositiveBigIntegerField(db_index=True) # Full sync run that loaded the row
+    code = models.CharField(max_length=255)
+    code_hash = models.PositiveBigIntegerField(default=0) # CRC32 of the code, splits the fan-out merge into ranges
+    product_id = models.IntegerField(null=True, blank=True)
+    title = models.CharField(max_length=500, blank=True, null=True)
+    manufacturer = models.CharField(max_length=255, blank=True, null=True)
+    code_supplier = models.CharField(max_length=255, blank=True, null=True)
+    ean = models.CharField(max_length=100, blank=True, null=True)
+    availability_id = models.IntegerField(null=True, blank=True)
+    availability = models.CharField(max_length=100, blank=True, null=True)
+    stock = models.IntegerField(default=0)
+    stock_position = models.CharField(max_length=100, blank=True, null=True)
+    weight = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    unit = models.CharField(max_length=50, blank=True, null=True)
+    image_url = models.URLField(max_length=2000, blank=True, null=True)
+    sync_digest = models.CharField(max_length=64) # Becomes Product.uma_sync_digest
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['generation', 'code'], name='unique_staged_product_code'),
+        ]
+        indexes = [
+            models.Index(fields=['generation', 'code_hash'], name='staged_product_code_hash'),
+        ]
+
+    def __str__(self):
+        return f"{self.code} (generation {self.generation})"
+
+class StagedProductVariant(models.Model):
+    generation = models.PositiveBigIntegerField(db_index=True) # Full sync run that loaded the row
+    code = models.CharField(max_length=255)
+    code_hash = models.PositiveBigIntegerField(default=0) # CRC32 of the code, splits the fan-out merge into ranges
+    product_code = models.CharField(max_length=255) # Parent Product.code, resolved to the FK during the merge
+    variant_id = models.IntegerField(null=True, blank=True)
+    code_supplier = models.CharField(max_length=255, blank=True, null=True)
+    ean = models.CharField(max_length=100, blank=True, null=True)
+    availability_id = models.IntegerField(null=True, blank=True)
+    availability = models.CharField(max_length=100, blank=True, null=True)
+    stock = models.IntegerField(default=0)
+    stock_position = models.CharField(max_length=100, blank=True, null=True)
+    weight = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    image_url = models.URLField(max_length=2000, blank=True, null=True)
+    price_original = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    price_with_vat = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    price_without_vat = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    price_purchase = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    currency = models.CharField(max_length=10, blank=True, null=True)
+    parameters = models.JSONField(null=True, blank=True)
+    sync_digest = models.CharField(max_length=64) # Becomes ProductVariant.uma_sync_digest
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['generation', 'code'], name='unique_staged_variant_code'),
+        ]
+        indexes = [
+            models.Index(fields=['generation', 'code_hash'], name='staged_variant_code_hash'),
+        ]
+
+    def __str__(self):
+        return f"{self.code} (generation {self.generation})"
+
+class SyncRun(models.Model):
+    """One run of a sync function, recorded by apps.upgates_integration.instrumentation."""
+    sync_type = models.CharField(max_length=30, choices=SyncType.CHOICES, db_index=True)
+    status = models.CharField(max_length=20, choices=SyncRunStatus.CHOICES, default=SyncRunStatus.RUNNING)
+    started_at = models.DateTimeField(default=timezone.now, db_index=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    phase_durations = models.JSONField(default=dict, blank=True) # Phase name -> seconds (see SyncPhase)
+    rows_read = models.IntegerField(default=0)
+    rows_inserted = models.IntegerField(default=0)
+    rows_updated = models.IntegerField(default=0)
+    rows_skipped = models.IntegerField(default=0) # Unchanged rows that didn't need a write
+    rows_failed = models.IntegerField(default=0)
+    bytes_downloaded = models.BigIntegerField(default=0)
+    peak_memory_bytes = models.BigIntegerField(null=True, blank=True) # Highest RSS sampled during the run
+    details = models.JSONField(default=dict, blank=True) # Sync specific extras (generation, mode, ...)
+    error_message = models.TextField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    @property
+    def duration_seconds(self):
+        if self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+
+    def __str__(self):
+        return f"{self.sync_type} run {self.pk} ({self.status})"
+
+class SyncCheckpoint(models.Model):
+    """
+    Progress of an interrupted sync, one per sync type, so the next run over the same input continues where the
+    previous one stopped instead of starting over. See apps.upgates_integration.checkpoints.
+    """
+    sync_type = models.CharField(max_length=30, choices=SyncType.CHOICES, unique=True)
+    fingerprint = models.CharField(max_length=64) # Digest of the feed content / query parameters the progress belongs to
+    position = models.IntegerField(default=0) # Last completed API page, or number of feed products committed
+    state = models.JSONField(default=dict, blank=True) # Extra state needed to resume (generation, watermark candidate, ...)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.sync_type} checkpoint at {self.position}"
@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from apps.djangocore.utils import get_float_app_setting
+
+try:
+    import redis
+except ImportError: # redis-py comes with the Celery Redis broker, but keep the limiter usable without it
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_KEY = 'upgates:api:ratelimit'
+REDIS_RETRY_INTERVAL = 30 # Seconds to stay on the local bucket after a Redis error
+
+# Token bucket in Redis: refills `rate` tokens per second up to `capacity`. Takes one token and returns 0,
+# or returns the number of seconds until a token is available. Uses the Redis clock, so all workers agree on time.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+class LocalTokenBucket:
+    """Per-process token bucket, used when Redis isn't available. Same semantics as TOKEN_BUCKET_SCRIPT."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = None
+        self.ts = None
+
+    def take(self, rate, capacity):
+        with self.lock:
+            now = time.monotonic()
+            if self.tokens is None:
+                self.tokens, self.ts = capacity, now
+            self.tokens = min(capacity, self.tokens + max(0, now - self.ts) * rate)
+            self.ts = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / rate
+
+class UpgatesRateLimiter:
+    """
+    Token-bucket rate limiter shared by all UpgatesAPIClient instances.
+    The bucket lives in the Redis instance used as the Celery broker, so every worker process draws from
+    the same API quota; if Redis can't be reached, a per-process bucket is used until it comes back.
+    acquire() blocks until a token is available (at most UPGATES_API_RATE_LIMIT_MAX_WAIT seconds).
+    Callers record the waits on the current sync run (SyncRun.details), get_metrics() only covers this process.
+
+    Settings: UPGATES_API_RATE_LIMIT (requests per second, 0 disables the limiter),
+    UPGATES_API_RATE_LIMIT_BURST (bucket capacity), UPGATES_API_RATE_LIMIT_MAX_WAIT.
+    """
+    def __init__(self, redis_url=None):
+        self.rate = get_float_app_setting('UPGATES_API_RATE_LIMIT', 5)
+        self.capacity = max(1, get_float_app_setting('UPGATES_API_RATE_LIMIT_BURST', max(self.rate, 1) * 2))
+        self.max_wait = get_float_app_setting('UPGATES_API_RATE_LIMIT_MAX_WAIT', 30)
+        self.local_bucket = LocalTokenBucket()
+        self.redis_client = None
+        self.redis_script = None
+        self.redis_retry_at = 0
+        redis_url = redis_url or getattr(settings, 'CELERY_BROKER_URL', None)
+        if redis is not None and redis_url and redis_url.startswith(('redis://', 'rediss://', 'unix://')):
+            self.redis_client = redis.Redis.from_url(redis_url, socket_timeout=1, socket_connect_timeout=1)
+            self.redis_script = self.redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+        self.metrics_lock = threading.Lock()
+        self.reset_metrics()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def _take(self):
+        """Takes a token; returns (seconds to wait before retrying, backend name)."""
+        if self.redis_script is not None and time.monotonic() >= self.redis_retry_at:
+            try:
+                return float(self.redis_script(keys=[RATE_LIMIT_KEY], args=[self.rate, self.capacity])), 'redis'
+            except redis.RedisError as e:
+                self.redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+                with self.metrics_lock:
+                    self.metrics['redis_errors'] += 1
+                logger.warning(f"Upgates rate limiter can't reach Redis ({e}), using a per-process limit for {REDIS_RETRY_INTERVAL}s.")
+        return self.local_bucket.take(self.rate, self.capacity), 'local'
+
+    def acquire(self):
+        """Blocks until a request may be sent. Returns the number of seconds spent waiting."""
+        if not self.enabled:
+            return 0
+        started = time.monotonic()
+        waited = 0
+        while True:
+            wait, backend = self._take()
+            if wait <= 0:
+                break
+            remaining = self.max_wait - waited
+            if remaining <= 0:
+                # Don't fail the caller; the HTTP layer still backs off on 429
+                logger.warning(f"Upgates rate limiter: no token after {waited:.1f}s, sending request anyway.")
+                break
+            time.sleep(min(wait, remaining))
+            waited = time.monotonic() - started
+
+        with self.metrics_lock:
+            self.metrics['calls'] += 1
+            self.metrics['last_backend'] = backend
+            if waited > 0:
+                self.metrics['throttled_calls'] += 1
+                self.metrics['total_wait_seconds'] += waited
+                self.metrics['max_wait_seconds'] = max(self.metrics['max_wait_seconds'], waited)
+        return waited
+
+    def get_metrics(self):
+        """Returns a snapshot of this process' limiter metrics."""
+        with self.metrics_lock:
+            return dict(self.metrics)
+
+    def reset_metrics(self):
+        with self.metrics_lock:
+            self.metrics = {
+                'calls': 0,
+                'throttled_calls': 0,
+                'total_wait_seconds': 0.0,
+                'max_wait_seconds': 0.0,
+                'redis_errors': 0,
+                'last_backend': None,
+            }
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """Returns the process-wide Upgates API rate limiter."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = UpgatesRateLimiter()
+    return _rate_limiter
@@ -0,0 +1,89 @@
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+
+# Compact, slotted record types for parsed product data (XML feeds and the simple products API).
+# Slots avoid a per-instance __dict__, so a variant costs a fraction of the equivalent nested dicts.
+
+def decimal_or_none(value):
+    """Converts an API number (int/float/str) to Decimal, without float rounding artifacts."""
+    if value is None or value == '':
+        return None
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+
+@dataclass(slots=True)
+class PriceRecord:
+    """Variant prices from the 'cz' <PRICE> (the first pricelist of it)."""
+    price_original: Optional[Decimal] = None
+    price_sale: Optional[Decimal] = None
+    price_with_vat: Optional[Decimal] = None
+    price_without_vat: Optional[Decimal] = None
+    price_purchase: Optional[Decimal] = None
+    currency: Optional[str] = None
+
+@dataclass(slots=True)
+class VariantRecord:
+    code: Optional[str] = None
+    variant_id: Optional[int] = None
+    supplier_code: Optional[str] = None
+    ean: Optional[str] = None
+    availability_id: Optional[int] = None # Only provided by the API
+    availability: Optional[str] = None
+    stock: Optional[int] = 0
+    stock_position: Optional[str] = None
+    weight: Optional[Decimal] = None
+    image_url: Optional[str] = None
+    prices: Optional[PriceRecord] = None # None if the variant has no 'cz' price
+    parameters: Optional[dict] = None # name -> value ('cz'), None if the variant has no <PARAMETERS>
+
+    @classmethod
+    def from_api(cls, data):
+        """Builds a record from a variant of the /products/simple API response."""
+        return cls(
+            code=data.get('code'),
+            variant_id=data.get('variant_id'),
+            supplier_code=data.get('code_supplier'),
+            ean=data.get('ean'),
+            availability_id=data.get('availability_id'),
+            availability=data.get('availability'),
+            stock=data.get('stock', 0),
+            stock_position=data.get('stock_position'),
+            weight=decimal_or_none(data.get('weight')),
+        )
+
+@dataclass(slots=True)
+class ProductRecord:
+    code: Optional[str] = None
+    product_id: Optional[int] = None
+    title: Optional[str] = None
+    manufacturer: Optional[str] = None
+    ean: Optional[str] = None
+    supplier_code: Optional[str] = None
+    availability_id: Optional[int] = None # Only provided by the API
+    availability: Optional[str] = None
+    stock: Optional[int] = 0
+    stock_position: Optional[str] = None
+    weight: Optional[Decimal] = None
+    unit: Optional[str] = None
+    image_url: Optional[str] = None
+    variants: list = field(default_factory=list) # VariantRecord
+
+    @classmethod
+    def from_api(cls, data):
+        """Builds a record (with variants) from a product of the /products/simple API response."""
+        return cls(
+            code=data.get('code'),
+            product_id=data.get('product_id'),
+            manufacturer=data.get('manufacturer'),
+            ean=data.get('ean'),
+            supplier_code=data.get('code_supplier'),
+            availability_id=data.get('availability_id'),
+            availability=data.get('availability'),
+            stock=data.get('stock', 0),
+            stock_position=data.get('stock_position'),
+            weight=decimal_or_none(data.get('weight')),
+            variants=[VariantRecord.from_api(variant_data) for variant_data in data.get('variants', [])],
+        )
@@ -1,219 +1,444 @@
+import contextvars
+import hashlib
+import json
 import logging
-from datetime import datetime
-from django.db import transaction, IntegrityError
+import os
+import socket
+import uuid
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+from urllib.parse import quote
+from django.db import connection, transaction, IntegrityError
+from django.db.models import Case, Exists, IntegerField, OuterRef, Q, Value, When
 from django.utils import timezone
 import pytz # Import pytz
 
 from apps.orders.models import Order, OrderItem
 from apps.products.models import Product, ProductVariant, ProductStockAdjustment
 from .api_client import UpgatesAPIClient
-from .feed_client import UpgatesFeedClient
-from .xml_parser import UpgatesProductXMLParser 
+from .checkpoints import clear_checkpoint, compute_fingerprint, load_checkpoint, save_checkpoint
+from .constants import SyncPhase, SyncType
+from .feed_client import FeedDownload, UpgatesFeedClient
+from .instrumentation import SyncRunRecorder, current_sync_run, recorded_sync
+from .locks import SyncLock
+from .models import StagedProduct, StagedProductVariant
+from .records import ProductRecord
+from .xml_parser import UpgatesProductXMLParser, XML_PARSE_ERRORS, DEFAULT_PARSE_CHUNK_BYTES
 from apps.orders.constants import OrderStatus
+from apps.djangocore.models import AppSetting
+from apps.djangocore.utils import get_app_setting, get_int_app_setting, set_app_setting
 
 logger = logging.getLogger(__name__)
 
-def sync_orders_from_api(creation_time_from=None, status_ids=None):
+# Fields written by the order sync (besides the unique 'order_number' / the item's order and uuid)
+ORDER_SYNC_FIELDS = [
+    'order_id', 'case_number', 'external_order_number', 'uuid', 'language_id', 'currency_id', 'default_currency_rate',
+    'prices_with_vat_yn', 'status_id', 'status', 'paid_date', 'tracking_code', 'tracking_url', 'statistics_yn',
+    'resolved_yn', 'oss_yn', 'internal_note', 'last_update_time', 'creation_time', 'variable_symbol', 'total_weight',
+    'order_total', 'order_total_before_round', 'order_total_rest', 'invoice_number', 'admin_url', 'customer',
+    'discount_voucher', 'quantity_discount', 'loyalty_points', 'shipment', 'payment', 'attachments', 'metas',
+    'uma_updated_at',
+]
+ORDER_ITEM_SYNC_FIELDS = [
+    'product_id', 'options_set_id', 'type', 'parent_uuid', 'code', 'code_supplier', 'supplier', 'ean', 'title',
+    'adult_yn', 'unit', 'length', 'length_unit', 'quantity', 'price_per_unit', 'price_per_unit_with_vat',
+    'price_per_unit_without_vat', 'price', 'price_with_vat', 'price_without_vat', 'vat', 'buy_price', 'recycling_fee',
+    'weight', 'availability', 'stock_position', 'invoice_info', 'parameters', 'configurations', 'categories',
+    'image_url', 'uma_updated_at',
+]
+
+def _parse_api_datetime(value, tz):
+    """Converts a datetime string from the API to an aware datetime, assuming `tz` for naive values."""
+    if not value:
+        return None
+    dt_object = datetime.fromisoformat(value)
+    if dt_object.tzinfo is None:
+        return tz.localize(dt_object)
+    return dt_object
+
+def _order_defaults_from_api(order_api_data, tz):
+    """Maps API order JSON fields to Order model fields."""
+    return {
+        'order_id': order_api_data.get('order_id'), # Assuming this is an int
+        'case_number': order_api_data.get('case_number'),
+        'external_order_number': order_api_data.get('external_order_number'),
+        'uuid': order_api_data.get('uuid'),
+        'language_id': order_api_data.get('language_id'),
+        'currency_id': order_api_data.get('currency_id'),
+        'default_currency_rate': order_api_data.get('default_currency_rate'),
+        'prices_with_vat_yn': order_api_data.get('prices_with_vat_yn'),
+        'status_id': order_api_data.get('status_id'),
+        'status': order_api_data.get('status'),
+        'paid_date': _parse_api_datetime(order_api_data.get('paid_date'), tz),
+        'tracking_code': order_api_data.get('tracking_code'),
+        'tracking_url': order_api_data.get('tracking_url'),
+        'statistics_yn': order_api_data.get('statistics_yn'),
+        'resolved_yn': order_api_data.get('resolved_yn'),
+        'oss_yn': order_api_data.get('oss_yn'),
+        'internal_note': order_api_data.get('internal_note'),
+        'last_update_time': _parse_api_datetime(order_api_data.get('last_update_time'), tz),
+        'creation_time': _parse_api_datetime(order_api_data.get('creation_time'), tz),
+        'variable_symbol': order_api_data.get('variable_symbol'),
+        'total_weight': order_api_data.get('total_weight'),
+        'order_total': order_api_data.get('order_total'),
+        'order_total_before_round': order_api_data.get('order_total_before_round'),
+        'order_total_rest': order_api_data.get('order_total_rest'),
+        'invoice_number': order_api_data.get('invoice_number'),
+        'admin_url': order_api_data.get('admin_url'),
+
+        # JSONFields - store the raw dictionary/list
+        'customer': order_api_data.get('customer'),
+        'discount_voucher': order_api_data.get('discount_voucher'),
+        'quantity_discount': order_api_data.get('quantity_discount'),
+        'loyalty_points': order_api_data.get('loyalty_points'),
+        'shipment': order_api_data.get('shipment'),
+        'payment': order_api_data.get('payment'),
+        'attachments': order_api_data.get('attachments'),
+        'metas': order_api_data.get('metas'),
+
+        # Your internal fields
+        # 'pg_status': This would be updated by your fullfilment logic
+        'uma_updated_at': timezone.now(),
+    }
+
+def _order_item_defaults_from_api(item_api_data):
+    """Maps API order item JSON fields to OrderItem model fields (without order and uuid)."""
+    return {
+        'product_id': item_api_data.get('product_id'),
+        'options_set_id': item_api_data.get('options_set_id'),
+        'type': item_api_data.get('type'),
+        'parent_uuid': item_api_data.get('parent_uuid'),
+        'code': item_api_data.get('code'),
+        'code_supplier': item_api_data.get('code_supplier'),
+        'supplier': item_api_data.get('supplier'),
+        'ean': item_api_data.get('ean'),
+        'title': item_api_data.get('title'),
+        'adult_yn': item_api_data.get('adult_yn', False), # Provide default for boolean
+        'unit': item_api_data.get('unit'),
+        'length': item_api_data.get('length'),
+        'length_unit': item_api_data.get('length_unit'),
+        'quantity': item_api_data.get('quantity'),
+        'price_per_unit': item_api_data.get('price_per_unit'),
+        'price_per_unit_with_vat': item_api_data.get('price_per_unit_with_vat'),
+        'price_per_unit_without_vat': item_api_data.get('price_per_unit_without_vat'),
+        'price': item_api_data.get('price'),
+        'price_with_vat': item_api_data.get('price_with_vat'),
+        'price_without_vat': item_api_data.get('price_without_vat'),
+        'vat': item_api_data.get('vat'),
+        'buy_price': item_api_data.get('buy_price'),
+        'recycling_fee': item_api_data.get('recycling_fee'),
+        'weight': item_api_data.get('weight'),
+        'availability': item_api_data.get('availability'),
+        'stock_position': item_api_data.get('stock_position'),
+        'invoice_info': item_api_data.get('invoice_info'),
+        'parameters': item_api_data.get('parameters'),
+        'configurations': item_api_data.get('configurations'),
+        'categories': item_api_data.get('categories'),
+        'image_url': item_api_data.get('image_url'),
+        'uma_updated_at': timezone.now(),
+    }
+
+def _sync_single_order(order_number, order_defaults, items):
     """
-    Retrieves orders from the Upgates API, optionally filtering by creation_time_from.
+    Writes a single order and its items in its own transaction.
+    `items` is a list of (uuid, item_defaults) tuples. Used as the fallback when a page can't be written in bulk.
+    Returns True on success.
+    """
+    try:
+        with transaction.atomic():
+            order_obj, created = Order.objects.update_or_create(
+                order_number=order_number, # Use a unique external identifier
+                defaults=order_defaults
+            )
+            if created:
+                logger.info(f"Created new Order: {order_obj.order_number}")
+            else:
+                logger.debug(f"Updated Order: {order_obj.order_number}")
+
+            # --- Sync Order Items ---
+            # Delete existing items for this order that are not in the API response (simplest for full sync)
+            order_obj.items.exclude(uuid__in=[uuid for uuid, _ in items if uuid]).delete() # Be careful with this!
+
+            for uuid, item_defaults in items:
+                # Use a combination of order and API-provided uuid for uniqueness
+                OrderItem.objects.update_or_create(
+                    order=order_obj,
+                    uuid=uuid,
+                    defaults=item_defaults
+                )
+        return True
+
+    except IntegrityError as ie:
+        logger.error(f"Integrity error during order sync for order_number {order_number}: {ie}")
+        # Could happen if multiple syncs create the same order
+    except Exception as e:
+        logger.error(f"Unhandled error during order sync for order_number {order_number}: {e}")
+    return False
+
+def _bulk_write_orders_page(planned_orders, existing_orders):
+    """
+    Writes a page of planned orders in bulk. `planned_orders` maps order_number to (order_defaults, items),
+    `existing_orders` maps order_number to the already loaded Order objects.
+    Existing items are fetched with one query, inserts/updates/deletes are computed in memory
+    and applied with bulk_create/bulk_update and one delete. Must run inside a transaction.
+    """
+    existing_items = {}
+    for item in OrderItem.objects.filter(order__in=[existing_orders[number] for number in planned_orders if number in existing_orders]):
+        existing_items.setdefault(item.order_id, []).append(item)
+
+    orders_to_create = []
+    orders_to_update = []
+    for order_number, (order_defaults, _) in planned_orders.items():
+        order_obj = existing_orders.get(order_number)
+        if order_obj is None:
+            orders_to_create.append(Order(order_number=order_number, **order_defaults))
+        else:
+            for field, value in order_defaults.items():
+                setattr(order_obj, field, value)
+            orders_to_update.append(order_obj)
+
+    if orders_to_create:
+        Order.objects.bulk_create(orders_to_create)
+        if any(order_obj.pk is None for order_obj in orders_to_create):
+            # Backends that can't return ids from bulk inserts
+            created_pks = dict(Order.objects.filter(
+                order_number__in=[order_obj.order_number for order_obj in orders_to_create]
+            ).values_list('order_number', 'pk'))
+            for order_obj in orders_to_create:
+                order_obj.pk = created_pks[order_obj.order_number]
+    if orders_to_update:
+        Order.objects.bulk_update(orders_to_update, ORDER_SYNC_FIELDS)
+
+    orders = {order_obj.order_number: order_obj for order_obj in orders_to_create + orders_to_update}
+    items_to_create = []
+    items_to_update = []
+    item_pks_to_delete = []
+    for order_number, (_, items) in planned_orders.items():
+        order_obj = orders[order_number]
+        stored_items = {}
+        for item in existing_items.get(order_obj.pk, []):
+            if item.uuid and item.uuid not in stored_items:
+                stored_items[item.uuid] = item
+            else:
+                item_pks_to_delete.append(item.pk) # No uuid or duplicate uuid, can't be matched to the API
+        # An item listed more than once under the same uuid is one row, the last listing wins (like update_or_create)
+        api_items = {}
+        for uuid, item_defaults in items:
+            api_items[uuid] = item_defaults
+        for uuid, item_defaults in api_items.items():
+            item = stored_items.get(uuid) if uuid else None
+            if item is None:
+                items_to_create.append(OrderItem(order=order_obj, uuid=uuid, **item_defaults))
+            else:
+                for field, value in item_defaults.items():
+                    setattr(item, field, value)
+                items_to_update.append(item)
+        # Delete existing items for this order that are not in the API response
+        item_pks_to_delete.extend(item.pk for uuid, item in stored_items.items() if uuid not in api_items)
+
+    if item_pks_to_delete:
+        OrderItem.objects.filter(pk__in=item_pks_to_delete).delete()
+    if items_to_create:
+        OrderItem.objects.bulk_create(items_to_create)
+    if items_to_update:
+        OrderItem.objects.bulk_update(items_to_update, ORDER_ITEM_SYNC_FIELDS)
+
+    logger.debug(
+        f"Orders page written: {len(orders_to_create)} created, {len(orders_to_update)} updated, "
+        f"{len(items_to_create)} items created, {len(items_to_update)} items updated, {len(item_pks_to_delete)} items deleted."
+    )
+
+def _sync_orders_page(orders_list, tz):
+    """
+    Syncs one page of orders from the API as a single unit (one transaction).
+    Orders whose last_update_time matches the stored one are skipped without any writes.
+    If the bulk write fails, falls back to per-order writes so failures stay isolated to single orders.
+    Returns (synced_count, skipped_count, failed_order_numbers).
+    """
+    planned_orders = {}
+    failed_order_numbers = []
+    for order_api_data in orders_list:
+        order_number = order_api_data.get('order_number')
+        if not order_number:
+            logger.warning("Skipping order with no order_number.")
+            continue
+        try:
+            items = [
+                (item_api_data.get('uuid'), _order_item_defaults_from_api(item_api_data))
+                for item_api_data in order_api_data.get('products', [])
+            ]
+            planned_orders[order_number] = (_order_defaults_from_api(order_api_data, tz), items)
+        except Exception as e:
+            logger.error(f"Unhandled error during order sync for order_number {order_number}: {e}")
+            failed_order_numbers.append(order_number)
+
+    # Skip orders that haven't changed upstream since they were stored (one query for the whole page)
+    existing_orders = Order.objects.in_bulk(list(planned_orders), field_name='order_number')
+    skipped_count = 0
+    for order_number, (order_defaults, _) in list(planned_orders.items()):
+        order_obj = existing_orders.get(order_number)
+        last_update_time = order_defaults['last_update_time']
+        if order_obj is not None and last_update_time is not None and order_obj.last_update_time == last_update_time:
+            del planned_orders[order_number]
+            skipped_count += 1
+
+    if not planned_orders:
+        return 0, skipped_count, failed_order_numbers
+
+    run = current_sync_run()
+    new_count = sum(1 for order_number in planned_orders if order_number not in existing_orders)
+    try:
+        with transaction.atomic():
+            _bulk_write_orders_page(planned_orders, existing_orders)
+        run.add_rows(inserted=new_count, updated=len(planned_orders) - new_count)
+        return len(planned_orders), skipped_count, failed_order_numbers
+    except Exception as e:
+        logger.error(f"Bulk write of {len(planned_orders)} orders failed, falling back to per-order sync: {e}")
+
+    synced_count = 0
+    for order_number, (order_defaults, items) in planned_orders.items():
+        if _sync_single_order(order_number, order_defaults, items):
+            synced_count += 1
+            if order_number in existing_orders:
+                run.add_rows(updated=1)
+            else:
+                run.add_rows(inserted=1)
+        else:
+            failed_order_numbers.append(order_number)
+    return synced_count, skipped_count, failed_order_numbers
+
+ORDERS_WATERMARK_KEY = 'UPGATES_ORDERS_LAST_UPDATE_WATERMARK'
+
+def _orders_watermark_key(status_ids=None):
+    """
+    Setting key of the high-water mark for runs filtered by `status_ids` ("1;2" or a list). Every status filter has
+    its own mark: a filtered run doesn't see updates of orders in other statuses, so it must not move the unfiltered one.
+    """
+    if isinstance(status_ids, (list, tuple)):
+        status_ids = ';'.join(str(status_id) for status_id in status_ids)
+    normalized = ';'.join(sorted({status_id.strip() for status_id in (status_ids or '').split(';') if status_id.strip()}))
+    if not normalized:
+        return ORDERS_WATERMARK_KEY
+    key = f"{ORDERS_WATERMARK_KEY}:{normalized}"
+    if len(key) > AppSetting._meta.get_field('key').max_length:
+        key = f"{ORDERS_WATERMARK_KEY}:{hashlib.sha256(normalized.encode()).hexdigest()[:16]}"
+    return key
+
+def get_orders_watermark(status_ids=None):
+    """Returns the stored high-water mark (latest synced order last_update_time) of the status filter, or None."""
+    value = get_app_setting(_orders_watermark_key(status_ids), use_cache=False)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid orders watermark: {value}")
+        return None
+
+@recorded_sync(SyncType.ORDERS)
+def sync_orders_from_api(creation_time_from=None, status_ids=None, last_update_time_from=None):
+    """
+    Retrieves orders from the Upgates API, optionally filtering by creation_time_from and/or last_update_time_from.
+    Each API page is written as one unit with bulk statements; orders unchanged since the last sync are skipped.
+    Incremental runs (last_update_time_from set, usually from get_orders_watermark()) advance the stored
+    high-water mark of their status filter (see _orders_watermark_key) once all orders were synced without errors.
+    Progress is checkpointed after every page; a run with the same parameters after an interrupted one
+    continues after the last completed page.
     """
     client = UpgatesAPIClient()
-    # Start at page 1 for the API
-    current_page = 1 
-    # Initialize total pages to a value that ensures the loop runs at least once
-    number_of_pages = 1
+    run = current_sync_run()
+    current_page = 0 # Last page received from the API
 
     synced_count = 0 # Count of successfully synced orders
+    skipped_count = 0 # Count of orders unchanged since the last sync
+    failed_order_numbers = []
+    earlier_failed_count = 0 # Orders that failed in the interrupted run this one resumes
+    latest_update_time = None # Newest last_update_time seen, candidate for the new high-water mark
 
     # Define the Prague timezone
     prague_tz = pytz.timezone('Europe/Prague')
 
-    while current_page <= number_of_pages:
-        params = {'page': current_page} 
-        if creation_time_from:
-            # 'creation_time_from' or similar to filter orders
-            params['creation_time_from'] = creation_time_from.isoformat()
-        if status_ids:
-            params['status_ids'] = status_ids
-        try:
-            orders_response, return_code = client.get_orders(**params)
-
-            # --- UPDATED PAGINATION CHECK ---
+    params = {}
+    if creation_time_from:
+        # 'creation_time_from' or similar to filter orders
+        params['creation_time_from'] = creation_time_from.isoformat()
+    if last_update_time_from:
+        params['last_update_time_from'] = last_update_time_from.isoformat()
+    if status_ids:
+        params['status_ids'] = status_ids
+
+    # Continue after the last completed page if a run with the same parameters was interrupted
+    fingerprint = compute_fingerprint(params)
+    checkpoint = load_checkpoint(SyncType.ORDERS, fingerprint)
+    if checkpoint is not None:
+        current_page = checkpoint.position
+        earlier_failed_count = checkpoint.state.get('failed_orders', 0)
+        if checkpoint.state.get('latest_update_time'):
+            latest_update_time = datetime.fromisoformat(checkpoint.state['latest_update_time'])
+        logger.info(f"Resuming order sync after page {current_page}.")
+        run.note(resumed_after_page=current_page)
+
+    # Pages are downloaded concurrently in the background while earlier pages are written
+    try:
+        pages = client.iter_pages(client.get_orders, params, start_page=current_page + 1)
+        for current_page, number_of_pages, orders_response in run.timed(pages, SyncPhase.DOWNLOAD):
             orders_list = orders_response.get('orders', []) # Actual list of order data
-            # Update number_of_pages based on the API response, if available
-            # This ensures the loop correctly identifies the total number of pages
-            if 'number_of_pages' in orders_response:
-                number_of_pages = orders_response['number_of_pages']
-            # --------------------------------
 
             logger.info(f"Retrieved {len(orders_list)} orders from Upgates API (page {current_page}/{number_of_pages}).")
 
             if not orders_list:
-                # If the current page returns no orders, and it's not the last expected page, something might be off,
-                # but if current_page > number_of_pages, the loop will naturally end.
+                # If the current page returns no orders, and it's not the last expected page, something might be off
                 break 
 
-            for order_api_data in orders_list:
-                try:
-                    with transaction.atomic():
-                        order_number = order_api_data.get('order_number')
-                        if not order_number:
-                            logger.warning("Skipping order with no order_number.")
-                            continue
-
-                        # Convert datetime strings from API to datetime objects
-                        creation_time_str = order_api_data.get('creation_time')
-                        last_update_time_str = order_api_data.get('last_update_time')
-                        paid_date_str = order_api_data.get('paid_date')
-
-                        if creation_time_str:
-                            dt_object = datetime.fromisoformat(creation_time_str)
-                            if dt_object.tzinfo is None:
-                                creation_time = prague_tz.localize(dt_object)
-                            else:
-                                creation_time = dt_object
-                        else:
-                            creation_time = None
-                        
-                        if last_update_time_str:
-                            dt_object = datetime.fromisoformat(last_update_time_str)
-                            if dt_object.tzinfo is None:
-                                last_update_time = prague_tz.localize(dt_object)
-                            else:
-                                last_update_time = dt_object
-                        else:
-                            last_update_time = None
-                        
-                        if paid_date_str:
-                            dt_object = datetime.fromisoformat(paid_date_str)
-                            if dt_object.tzinfo is None:
-                                paid_date = prague_tz.localize(dt_object)
-                            else:
-                                paid_date = dt_object
-                        else:
-                            paid_date = None
-
-                        # Map API JSON fields to your Django model fields
-                        order_defaults = {
-                            'order_id': order_api_data.get('order_id'), # Assuming this is an int
-                            'case_number': order_api_data.get('case_number'),
-                            'external_order_number': order_api_data.get('external_order_number'),
-                            'uuid': order_api_data.get('uuid'),
-                            'language_id': order_api_data.get('language_id'),
-                            'currency_id': order_api_data.get('currency_id'),
-                            'default_currency_rate': order_api_data.get('default_currency_rate'),
-                            'prices_with_vat_yn': order_api_data.get('prices_with_vat_yn'),
-                            'status_id': order_api_data.get('status_id'),
-                            'status': order_api_data.get('status'),
-                            'paid_date': paid_date,
-                            'tracking_code': order_api_data.get('tracking_code'),
-                            'tracking_url': order_api_data.get('tracking_url'),
-                            'statistics_yn': order_api_data.get('statistics_yn'),
-                            'resolved_yn': order_api_data.get('resolved_yn'),
-                            'oss_yn': order_api_data.get('oss_yn'),
-                            'internal_note': order_api_data.get('internal_note'),
-                            'last_update_time': last_update_time,
-                            'creation_time': creation_time,
-                            'variable_symbol': order_api_data.get('variable_symbol'),
-                            'total_weight': order_api_data.get('total_weight'),
-                            'order_total': order_api_data.get('order_total'),
-                            'order_total_before_round': order_api_data.get('order_total_before_round'),
-                            'order_total_rest': order_api_data.get('order_total_rest'),
-                            'invoice_number': order_api_data.get('invoice_number'),
-                            'admin_url': order_api_data.get('admin_url'),
-
-                            # JSONFields - store the raw dictionary/list
-                            'customer': order_api_data.get('customer'),
-                            'discount_voucher': order_api_data.get('discount_voucher'),
-                            'quantity_discount': order_api_data.get('quantity_discount'),
-                            'loyalty_points': order_api_data.get('loyalty_points'),
-                            'shipment': order_api_data.get('shipment'),
-                            'payment': order_api_data.get('payment'),
-                            'attachments': order_api_data.get('attachments'),
-                            'metas': order_api_data.get('metas'),
-
-                            # Your internal fields
-                            # 'pg_status': This would be updated by your fullfilment logic
-                            'uma_updated_at': timezone.now(),
-                        }
-                        order_obj, created = Order.objects.update_or_create(
-                            order_number=order_number, # Use a unique external identifier
-                            defaults=order_defaults
-                        )
-                        if created:
-                            logger.info(f"Created new Order: {order_obj.order_number}")
-                        else:
-                            logger.debug(f"Updated Order: {order_obj.order_number}")
-
-                        # --- Sync Order Items ---
-                        api_items = order_api_data.get('products', [])
-                        # Delete existing items for this order that are not in the API response (simplest for full sync)
-                        # More complex: update_or_create for each, then delete any remaining in DB not in API list
-                        order_obj.items.exclude(uuid__in=[item['uuid'] for item in api_items if 'uuid' in item]).delete() # Be careful with this!
-
-                        for item_api_data in api_items:
-                            # Map item fields
-                            item_defaults = {
-                                'product_id': item_api_data.get('product_id'),
-                                'options_set_id': item_api_data.get('options_set_id'),
-                                'type': item_api_data.get('type'),
-                                'uuid': item_api_data.get('uuid'),
-                                'parent_uuid': item_api_data.get('parent_uuid'),
-                                'code': item_api_data.get('code'),
-                                'code_supplier': item_api_data.get('code_supplier'),
-                                'supplier': item_api_data.get('supplier'),
-                                'ean': item_api_data.get('ean'),
-                                'title': item_api_data.get('title'),
-                                'adult_yn': item_api_data.get('adult_yn', False), # Provide default for boolean
-                                'unit': item_api_data.get('unit'),
-                                'length': item_api_data.get('length'),
-                                'length_unit': item_api_data.get('length_unit'),
-                                'quantity': item_api_data.get('quantity'),
-                                'price_per_unit': item_api_data.get('price_per_unit'),
-                                'price_per_unit_with_vat': item_api_data.get('price_per_unit_with_vat'),
-                                'price_per_unit_without_vat': item_api_data.get('price_per_unit_without_vat'),
-                                'price': item_api_data.get('price'),
-                                'price_with_vat': item_api_data.get('price_with_vat'),
-                                'price_without_vat': item_api_data.get('price_without_vat'),
-                                'vat': item_api_data.get('vat'),
-                                'buy_price': item_api_data.get('buy_price'),
-                                'recycling_fee': item_api_data.get('recycling_fee'),
-                                'weight': item_api_data.get('weight'),
-                                'availability': item_api_data.get('availability'),
-                                'stock_position': item_api_data.get('stock_position'),
-                                'invoice_info': item_api_data.get('invoice_info'),
-                                'parameters': item_api_data.get('parameters'),
-                                'configurations': item_api_data.get('configurations'),
-                                'categories': item_api_data.get('categories'),
-                                'image_url': item_api_data.get('image_url'),
-                            }
-                            # Use a combination of order and API-provided product_id/uuid for uniqueness
-                            OrderItem.objects.update_or_create(
-                                order=order_obj,
-                                # Assuming product_id from API is unique per order item
-                                uuid=item_api_data.get('uuid'),
-                                defaults=item_defaults
-                            )
-                        synced_count += 1
-
-                except IntegrityError as ie:
-                    logger.error(f"Integrity error during order sync for order_number {order_number}: {ie}")
-                    # Could happen if multiple syncs create the same order
-                except Exception as e:
-                    logger.error(f"Unhandled error during order sync for order_number {order_number}: {e}")
-                    # Continue to next order even if one fails
+            with run.phase(SyncPhase.DB_WRITE):
+                page_synced_count, page_skipped_count, page_failed_order_numbers = _sync_orders_page(orders_list, prague_tz)
+            run.add_rows(read=len(orders_list), skipped=page_skipped_count, failed=len(page_failed_order_numbers))
+            synced_count += page_synced_count
+            skipped_count += page_skipped_count
+            failed_order_numbers.extend(page_failed_order_numbers)
 
-            current_page += 1 # Move to the next page
+            for order_api_data in orders_list:
+                order_update_time = _parse_api_datetime(order_api_data.get('last_update_time'), prague_tz)
+                if order_update_time and (latest_update_time is None or order_update_time > latest_update_time):
+                    latest_update_time = order_update_time
 
-        except Exception as e:
-            logger.error(f"Failed to retrieve orders from Upgates API (page {current_page}): {e}")
-            number_of_pages = 0 # Stop on error
+            save_checkpoint(
+                SyncType.ORDERS, fingerprint, current_page,
+                latest_update_time=latest_update_time.isoformat() if latest_update_time else None,
+                failed_orders=earlier_failed_count + len(failed_order_numbers),
+            )
 
-    logger.info(f"Order synchronization complete. Synced {synced_count} orders.")
+    except Exception as e:
+        logger.error(f"Failed to retrieve orders from Upgates API (page {current_page + 1}): {e}")
+        # Fail the run so the task retries; the retry resumes after the last checkpointed page
+        run.note(failed_page=current_page + 1)
+        if failed_order_numbers:
+            logger.warning(f"Failed to sync {len(failed_order_numbers)} orders: {', '.join(failed_order_numbers)}")
+        raise
+
+    clear_checkpoint(SyncType.ORDERS, fingerprint)
+    if failed_order_numbers:
+        logger.warning(f"Failed to sync {len(failed_order_numbers)} orders: {', '.join(failed_order_numbers)}")
+    elif earlier_failed_count:
+        logger.warning(f"{earlier_failed_count} orders failed before this run resumed, not advancing the high-water mark.")
+    elif latest_update_time:
+        # Only a complete incremental run (or the very first run) may move the high-water mark,
+        # a manual creation_time window doesn't cover orders created earlier but modified since
+        current_watermark = get_orders_watermark(status_ids)
+        if (last_update_time_from or current_watermark is None) and (current_watermark is None or latest_update_time > current_watermark):
+            set_app_setting(_orders_watermark_key(status_ids), latest_update_time.isoformat())
+            logger.info(f"Orders high-water mark{f' of statuses {status_ids}' if status_ids else ''} advanced to {latest_update_time.isoformat()}.")
+    logger.info(f"Order synchronization complete. Synced {synced_count} orders, skipped {skipped_count} unchanged.")
     return True
 
+@recorded_sync(SyncType.ORDERS_STATUS)
 def sync_orders_status_to_api(orderids, status_id):
     client = UpgatesAPIClient()
+    run = current_sync_run()
 
     if not status_id:
         logger.error("No status_id provided for order status update.")
@@ -235,7 +460,9 @@ def sync_orders_status_to_api(orderids, status_id):
             logger.error(f"Order with ID {order_id} does not exist.")
             continue
 
-    response, return_code = client.put_order_data(data)
+    run.add_rows(read=len(orderids), failed=len(orderids) - len(data['orders']))
+    with run.phase(SyncPhase.API_PUSH):
+        response, return_code = client.put_order_data(data)
 
     if return_code == 200:
         logger.info(f"Successfully updated order statuses in Upgates API for orders: {orderids}")
@@ -246,6 +473,7 @@ def sync_orders_status_to_api(orderids, status_id):
                 order.uma_status = OrderStatus.COMPLETED
                 order.uma_updated_at = timezone.now()
                 order.save(update_fields=['uma_status', 'uma_updated_at']) # Update only the status and timestamp
+                run.add_rows(updated=1)
             except Order.DoesNotExist:
                 logger.error(f"Order with ID {order_id} does not exist for status update.")
                 continue
@@ -254,15 +482,16 @@ def sync_orders_status_to_api(orderids, status_id):
         logger.error(f"Failed to update order statuses in Upgates API: {response.get('error', 'Unknown error')}")
         return False
 
+@recorded_sync(SyncType.PRODUCTS_SIMPLE)
 def sync_products_simple_from_api(codes=None):
     """
     Retrieves products from the Upgates API, optionally filtering by product_ids
+    Progress is checkpointed after every page; a run with the same codes after an interrupted one
+    continues after the last completed page.
     """
     client = UpgatesAPIClient()
-    # Start at page 1 for the API
-    current_page = 1 
-    # Initialize total pages to a value that ensures the loop runs at least once
-    number_of_pages = 1
+    run = current_sync_run()
+    current_page = 0 # Last page received from the API
 
     synced_count = 0 # Count of successfully synced products
 
@@ -275,50 +504,55 @@ def sync_products_simple_from_api(codes=None):
         if ',' in codes:
             codes = codes.replace(',', ';') # Convert commas to semicolons if needed
 
-    while current_page <= number_of_pages:
-        params = {'page': current_page} 
-        if codes:
-            params['codes'] = codes
+    params = {}
+    if codes:
+        params['codes'] = codes
 
-        try:
-            response, return_code = client.get_products_simple(**params)
+    # Continue after the last completed page if a run with the same codes was interrupted
+    fingerprint = compute_fingerprint(params)
+    checkpoint = load_checkpoint(SyncType.PRODUCTS_SIMPLE, fingerprint)
+    if checkpoint is not None:
+        current_page = checkpoint.position
+        logger.info(f"Resuming product sync after page {current_page}.")
+        run.note(resumed_after_page=current_page)
 
-            # --- UPDATED PAGINATION CHECK ---
+    # Pages are downloaded concurrently in the background while earlier pages are written
+    try:
+        pages = client.iter_pages(client.get_products_simple, params, start_page=current_page + 1)
+        for current_page, number_of_pages, response in run.timed(pages, SyncPhase.DOWNLOAD):
             products_list = response.get('products', [])
-            # Update number_of_pages based on the API response, if available
-            # This ensures the loop correctly identifies the total number of pages
-            if 'number_of_pages' in response:
-                number_of_pages = response['number_of_pages']
-            # --------------------------------
 
             logger.info(f"Retrieved {len(products_list)} products from Upgates API (page {current_page}/{number_of_pages}).")
 
             if not products_list:
-                # If the current page returns no products, and it's not the last expected page, something might be off,
-                # but if current_page > number_of_pages, the loop will naturally end.
+                # If the current page returns no products, and it's not the last expected page, something might be off
                 break 
 
+            run.add_rows(read=len(products_list))
             for product_api_data in products_list:
+                product_code = product_api_data.get('code')
                 try:
-                    with transaction.atomic():
-                        product_code = product_api_data.get('code')
+                    with run.phase(SyncPhase.DB_WRITE), transaction.atomic():
+                        product_record = ProductRecord.from_api(product_api_data)
                         if not product_code:
                             logger.warning("Skipping product with no code.")
+                            run.add_rows(failed=1)
                             continue
 
                         # Map API JSON fields to your Django model fields
                         product_defaults = {
-                            'code_supplier': product_api_data.get('code_supplier'),
-                            'ean': product_api_data.get('ean'),
-                            'product_id': product_api_data.get('product_id'),
-                            'manufacturer': product_api_data.get('manufacturer'),
-                            'availability_id': product_api_data.get('availability_id'),
-                            'availability': product_api_data.get('availability'),
-                            'stock': product_api_data.get('stock', 0),
-                            'stock_position': product_api_data.get('stock_position'),
-                            'weight': product_api_data.get('weight'),
+                            'code_supplier': product_record.supplier_code,
+                            'ean': product_record.ean,
+                            'product_id': product_record.product_id,
+                            'manufacturer': product_record.manufacturer,
+                            'availability_id': product_record.availability_id,
+                            'availability': product_record.availability,
+                            'stock': product_record.stock,
+                            'stock_position': product_record.stock_position,
+                            'weight': product_record.weight,
                             'uma_is_active': True,
                             'uma_last_synced_at': timezone.now(),
+                            'uma_sync_digest': None, # Out-of-band change, next full sync must rewrite the row
                         }
                         # Use the unique code as the identifier
                         product_obj, created = Product.objects.update_or_create(
@@ -329,24 +563,25 @@ def sync_products_simple_from_api(codes=None):
                             logger.info(f"Created new Product: {product_obj.title} (Code: {product_obj.code})")
                         else:
                             logger.debug(f"Updated Product: {product_obj.title} (Code: {product_obj.code})")
+                        run.add_rows(inserted=int(created), updated=int(not created))
                         
                         # --- Sync Product Variants ---
-                        variants_data = product_api_data.get('variants', [])
-                        for variant_data in variants_data:
-                            variant_code = variant_data.get('code')
+                        for variant_record in product_record.variants:
+                            variant_code = variant_record.code
                             if not variant_code:
-                                logger.warning(f"Skipping variant with no CODE for product {product_code}: {variant_data}")
+                                logger.warning(f"Skipping variant with no CODE for product {product_code}: {variant_record}")
                                 continue
 
                             variant_defaults = {
                                 'product': product_obj, # Link to the parent product
-                                'code_supplier': variant_data.get('code_supplier'),
-                                'ean': variant_data.get('ean'),
-                                'variant_id': variant_data.get('variant_id'),
-                                'stock': variant_data.get('stock', 0),
-                                'stock_position': variant_data.get('stock_position'),
-                                'availability_id': variant_data.get('availability_id'),
-                                'availability': variant_data.get('availability'),
+                                'code_supplier': variant_record.supplier_code,
+                                'ean': variant_record.ean,
+                                'variant_id': variant_record.variant_id,
+                                'stock': variant_record.stock,
+                                'stock_position': variant_record.stock_position,
+                                'availability_id': variant_record.availability_id,
+                                'availability': variant_record.availability,
+                                'uma_sync_digest': None, # Out-of-band change, next full sync must rewrite the row
                             }
                             # Use 'code' as the unique identifier for variant
                             variant_obj, v_created = ProductVariant.objects.update_or_create(
@@ -362,491 +597,1338 @@ def sync_products_simple_from_api(codes=None):
                 except IntegrityError as ie:
                     logger.error(f"Integrity error during product sync for product_code {product_code}: {ie}")
                     # Could happen if multiple syncs create the same product
+                    run.add_rows(failed=1)
                 except Exception as e:
                     logger.error(f"Unhandled error during product sync for product_code {product_code}: {e}")
                     # Continue to next product even if one fails
+                    run.add_rows(failed=1)
 
-            current_page += 1 # Move to the next page
+            if number_of_pages > 1:
+                save_checkpoint(SyncType.PRODUCTS_SIMPLE, fingerprint, current_page)
 
-        except Exception as e:
-            logger.error(f"Failed to retrieve products from Upgates API (page {current_page}): {e}")
-            number_of_pages = 0 # Stop on error
+        clear_checkpoint(SyncType.PRODUCTS_SIMPLE, fingerprint)
+    except Exception as e:
+        logger.error(f"Failed to retrieve products from Upgates API (page {current_page + 1}): {e}")
+        # Fail the run so the task retries; the retry resumes after the last checkpointed page
+        run.note(failed_page=current_page + 1)
+        raise
 
     logger.info(f"Product synchronization complete. Synced {synced_count} products.")
     return True
 
-def sync_products_from_full_feed ():
+def _chunked(iterable, size):
+    """Yields lists of at most `size` items from any iterable (including generators)."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _compute_sync_digest(values):
+    """Stable digest of a dict of field values, used to detect unchanged catalog rows."""
+    payload = json.dumps(values, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _full_feed_product_defaults(product_data):
+    """Maps a parsed feed ProductRecord to Product field values (without internal tracking fields)."""
+    return {
+        'product_id': product_data.product_id,
+        'title': product_data.title,
+        'manufacturer': product_data.manufacturer,
+        'code_supplier': product_data.supplier_code,
+        'ean': product_data.ean,
+        'availability_id': None, # TODO: Map this to API /availabilities based on availability text
+        'availability': product_data.availability,
+        'stock': product_data.stock,
+        'stock_position': product_data.stock_position,
+        'weight': product_data.weight,
+        'unit': product_data.unit,
+        'image_url': product_data.image_url,
+    }
+
+def _full_feed_variant_defaults(variant_data):
+    """Maps a parsed feed VariantRecord to ProductVariant field values (without the parent and internal tracking fields)."""
+    prices = variant_data.prices
+    return {
+        'variant_id': variant_data.variant_id,
+        'code_supplier': variant_data.supplier_code,
+        'ean': variant_data.ean,
+        'availability_id': None, # TODO: Map this to API /availabilities based on availability text
+        'availability': variant_data.availability,
+        'stock': variant_data.stock,
+        'stock_position': variant_data.stock_position,
+        'weight': variant_data.weight,
+        'image_url': variant_data.image_url,
+        'price_original': prices.price_original if prices else None,
+        'price_with_vat': prices.price_with_vat if prices else None,
+        'price_without_vat': prices.price_without_vat if prices else None,
+        'price_purchase': prices.price_purchase if prices else None,
+        'currency': prices.currency if prices else None,
+        'parameters': variant_data.parameters or {}, # Store parsed parameters
+    }
+
+def _sync_full_feed_product(product_code, product_row, variant_rows, generation):
     """
-    Retrieves the full product XML feed, parses it, and syncs products/variants.
+    Writes a single product and its changed variants from the full feed, stamped with the sync `generation`.
+    `product_row` is a (defaults, digest, changed) tuple, `variant_rows` maps variant code to the same kind of tuple.
+    Errors are logged and isolated to this product. Returns True if the product was written.
     """
-    feed_client = UpgatesFeedClient()
+    product_defaults, product_digest, product_changed = product_row
     try:
-        xml_root = feed_client.get_full_products_xml_feed()
-        logger.info("Successfully retrieved Upgates product XML feed.")
-    except Exception as e:
-        logger.error(f"Failed to retrieve Upgates product feed: {e}")
-        return False
-
-    parser = UpgatesProductXMLParser(xml_root)
-    all_products_data = parser.get_all_products_data()
-
-    # Keep track of product and variant codes found in this sync to deactivate missing ones
-    synced_product_codes = set()
-    synced_variant_codes = set()
-
-    for product_data in all_products_data:
-        product_code = product_data.get('code')
-        if not product_code:
-            logger.warning(f"Skipping product with no CODE: {product_data}")
-            continue
-        synced_product_codes.add(product_code)
-
-        try:
-            with transaction.atomic():
-                
-                # --- Sync Product ---
-                product_defaults = {
-                    'product_id': product_data.get('product_id'),
-                    'title': product_data.get('title'),
-                    'manufacturer': product_data.get('manufacturer'),
-                    'code_supplier': product_data.get('supplier_code'),
-                    'ean': product_data.get('ean'),
-                    'availability_id': None, # TODO: Map this to API /availabilities based on availability text
-                    'availability': product_data.get('availability'),
-                    'stock': product_data.get('stock', 0),
-                    'stock_position': product_data.get('stock_position'),
-                    'weight': product_data.get('weight'),
-                    'unit': product_data.get('unit'),
-                    'image_url': product_data.get('image_url'),
-                    'uma_is_active': True,
-                    'uma_last_synced_at': timezone.now(),
-                }
+        with transaction.atomic():
+            
+            # --- Sync Product ---
+            if product_changed:
                 product_obj, created = Product.objects.update_or_create(
                     code=product_code, # Use 'code' as the unique identifier
-                    defaults=product_defaults
+                    defaults={
+                        **product_defaults,
+                        'uma_is_active': True,
+                        'uma_last_synced_at': timezone.now(),
+                        'uma_sync_digest': product_digest,
+                        'uma_sync_generation': generation,
+                    }
                 )
                 if created:
                     logger.info(f"Created new product: {product_obj.title} (Code: {product_obj.code})")
                 else:
                     logger.debug(f"Updated product: {product_obj.title} (Code: {product_obj.code})")
+            else:
+                product_obj = Product.objects.get(code=product_code)
 
-                # --- Sync Product Variants ---
-                product_variants_data = product_data.get('variants', [])
-                current_product_variant_codes = set() # Track variants for this specific product
-
-                for variant_data in product_variants_data:
-                    variant_code = variant_data.get('code')
-                    if not variant_code:
-                        logger.warning(f"Skipping variant with no CODE for product {product_code}: {variant_data}")
-                        continue
-                    synced_variant_codes.add(variant_code)
-                    current_product_variant_codes.add(variant_code)
-
-                    try:
-                        variant_defaults = {
+            # --- Sync Product Variants ---
+            for variant_code, (variant_defaults, variant_digest, variant_changed) in variant_rows.items():
+                if not variant_changed:
+                    continue
+                try:
+                    variant_obj, v_created = ProductVariant.objects.update_or_create(
+                        code=variant_code, # Use 'code' as the unique identifier for variant
+                        defaults={
+                            **variant_defaults,
                             'product': product_obj, # Link to the parent product
-                            'variant_id': variant_data.get('variant_id'),
-                            'code_supplier': variant_data.get('supplier_code'),
-                            'ean': variant_data.get('ean'),
-                            'availability_id': None, # TODO: Map this to API /availabilities based on availability text
-                            'availability': variant_data.get('availability'),
-                            'stock': variant_data.get('stock', 0),
-                            'stock_position': variant_data.get('stock_position'),
-                            'weight': variant_data.get('weight'),
-                            'image_url': variant_data.get('image_url'),
-                            'price_original': variant_data.get('prices', {}).get('price_original'),
-                            'price_with_vat': variant_data.get('prices', {}).get('price_with_vat'),
-                            'price_without_vat': variant_data.get('prices', {}).get('price_without_vat'),
-                            'price_purchase': variant_data.get('prices', {}).get('price_purchase'),
-                            'currency': variant_data.get('prices', {}).get('currency'),
-                            'parameters': variant_data.get('parameters'), # Store parsed parameters
                             'uma_is_active': True,
                             'uma_last_synced_at': timezone.now(),
+                            'uma_sync_digest': variant_digest,
+                            'uma_sync_generation': generation,
                         }
-                        variant_obj, v_created = ProductVariant.objects.update_or_create(
-                            code=variant_code, # Use 'code' as the unique identifier for variant
-                            defaults=variant_defaults
-                        )
-                        if v_created:
-                            logger.info(f"  Created new variant: {variant_obj.code} (Product: {product_obj.code})")
-                        else:
-                            logger.debug(f"  Updated variant: {variant_obj.code} (Product: {product_obj.code})")
+                    )
+                    if v_created:
+                        logger.info(f"  Created new variant: {variant_obj.code} (Product: {product_obj.code})")
+                    else:
+                        logger.debug(f"  Updated variant: {variant_obj.code} (Product: {product_obj.code})")
+
+                except IntegrityError as ie:
+                    logger.error(f"Integrity error during variant sync for CODE {variant_code}: {ie}")
+                except Exception as ve:
+                    logger.error(f"Unhandled error syncing variant {variant_code} for product {product_code}: {ve}")
+                    continue
+        return True
+
+    except IntegrityError as ie:
+        logger.error(f"Integrity error during product sync for CODE {product_code}: {ie}")
+    except Exception as e:
+        logger.error(f"Unhandled error during product sync for CODE {product_code}: {e}")
+    return False
+
+# Feed data fields of the full feed sync (the keys of _full_feed_product_defaults/_full_feed_variant_defaults)
+PRODUCT_FEED_FIELDS = [
+    'product_id', 'title', 'manufacturer', 'code_supplier', 'ean', 'availability_id', 'availability', 'stock',
+    'stock_position', 'weight', 'unit', 'image_url',
+]
+VARIANT_FEED_FIELDS = [
+    'variant_id', 'code_supplier', 'ean', 'availability_id', 'availability', 'stock', 'stock_position',
+    'weight', 'image_url', 'price_original', 'price_with_vat', 'price_without_vat', 'price_purchase', 'currency',
+    'parameters',
+]
+# Fields written by the full feed sync (besides the unique 'code')
+SYNC_TRACKING_FIELDS = ['uma_is_active', 'uma_last_synced_at', 'uma_sync_digest', 'uma_sync_generation']
+PRODUCT_FULL_SYNC_FIELDS = PRODUCT_FEED_FIELDS + SYNC_TRACKING_FIELDS
+VARIANT_FULL_SYNC_FIELDS = ['product'] + VARIANT_FEED_FIELDS + SYNC_TRACKING_FIELDS
+
+def _bulk_upsert_full_feed_rows(changed_rows, generation):
+    """
+    Writes changed products and variants of one chunk with one INSERT ... ON CONFLICT DO UPDATE per model,
+    stamped with the sync `generation`.
+    Variant FKs are resolved from a code->pk map built for the chunk. Must run inside a transaction.
+    """
+    now = timezone.now()
+    products = [
+        Product(code=product_code, **defaults, uma_is_active=True, uma_last_synced_at=now, uma_sync_digest=digest,
+                uma_sync_generation=generation)
+        for product_code, (defaults, digest, changed), _ in changed_rows if changed
+    ]
+    if products:
+        Product.objects.bulk_create(products, update_conflicts=True, unique_fields=['code'], update_fields=PRODUCT_FULL_SYNC_FIELDS)
+
+    product_pks = dict(Product.objects.filter(code__in=[row[0] for row in changed_rows]).values_list('code', 'pk'))
+
+    variants = [
+        ProductVariant(code=variant_code, product_id=product_pks[product_code], **defaults,
+                       uma_is_active=True, uma_last_synced_at=now, uma_sync_digest=digest, uma_sync_generation=generation)
+        for product_code, _, variant_rows in changed_rows
+        for variant_code, (defaults, digest, changed) in variant_rows.items() if changed
+    ]
+    if variants:
+        ProductVariant.objects.bulk_create(variants, update_conflicts=True, unique_fields=['code'], update_fields=VARIANT_FULL_SYNC_FIELDS)
+
+    logger.debug(f"Bulk upserted {len(products)} products and {len(variants)} variants.")
+
+def _full_feed_rows(products_data):
+    """
+    Maps a chunk of parsed feed products to {product code: (product defaults, {variant code: variant defaults})}.
+    Products and variants without a code are skipped.
+    """
+    rows = {}
+    for product_data in products_data:
+        product_code = product_data.code
+        if not product_code:
+            logger.warning(f"Skipping product with no CODE: {product_data}")
+            continue
 
-                    except IntegrityError as ie:
-                        logger.error(f"Integrity error during variant sync for CODE {variant_code}: {ie}")
-                    except Exception as ve:
-                        logger.error(f"Unhandled error syncing variant {variant_code} for product {product_code}: {ve}")
-                        continue
+        variant_defaults = {}
+        for variant_data in product_data.variants:
+            variant_code = variant_data.code
+            if not variant_code:
+                logger.warning(f"Skipping variant with no CODE for product {product_code}: {variant_data}")
+                continue
+            variant_defaults[variant_code] = _full_feed_variant_defaults(variant_data)
+        # A code repeated within the chunk keeps its last occurrence, same as sequential writes would
+        rows[product_code] = (_full_feed_product_defaults(product_data), variant_defaults)
+    return rows
 
-                # Deactivate variants of this specific product that were not found in the current feed
-                product_obj.variants.exclude(code__in=list(current_product_variant_codes)).update(uma_is_active=False)
+def _full_feed_product_digest(product_defaults, variant_codes):
+    # The variant codes are part of the product digest, so a product whose variant set changed gets rewritten
+    return _compute_sync_digest({**product_defaults, 'variant_codes': sorted(variant_codes)})
 
-        except IntegrityError as ie:
-            logger.error(f"Integrity error during product sync for CODE {product_code}: {ie}")
-        except Exception as e:
-            logger.error(f"Unhandled error during product sync for CODE {product_code}: {e}")
+def _full_feed_variant_digest(variant_defaults, product_code):
+    return _compute_sync_digest({**variant_defaults, 'product': product_code})
+
+def _sync_full_feed_chunk(products_data, generation, product_stats, variant_stats):
+    """
+    Syncs a chunk of parsed products from the full feed. Every row seen in the chunk is stamped with `generation`.
+    Stored digests for the whole chunk are loaded with one query per model; only new or changed rows are written,
+    unchanged rows just get their "last seen" bookkeeping refreshed in one UPDATE per model.
+    Changed rows are written with a bulk upsert; if that fails, the chunk falls back to per-product writes
+    so one bad product doesn't fail the others.
+    """
+    rows = _full_feed_rows(products_data)
+    stored_product_digests = dict(
+        Product.objects.filter(code__in=list(rows)).values_list('code', 'uma_sync_digest')
+    )
+    stored_variant_digests = dict(
+        ProductVariant.objects.filter(code__in=[code for row in rows.values() for code in row[1]]).values_list('code', 'uma_sync_digest')
+    )
+
+    unchanged_product_codes = []
+    unchanged_variant_codes = []
+    changed_rows = []
+    for product_code, (product_defaults, variant_defaults) in rows.items():
+        product_digest = _full_feed_product_digest(product_defaults, variant_defaults)
+        product_changed = stored_product_digests.get(product_code) != product_digest
+
+        variant_rows = {}
+        for variant_code, defaults in variant_defaults.items():
+            variant_digest = _full_feed_variant_digest(defaults, product_code)
+            variant_changed = stored_variant_digests.get(variant_code) != variant_digest
+            variant_rows[variant_code] = (defaults, variant_digest, variant_changed)
+
+        if not product_changed and not any(row[2] for row in variant_rows.values()):
+            unchanged_product_codes.append(product_code)
+            unchanged_variant_codes.extend(variant_rows)
+            product_stats['unchanged'] += 1
+            variant_stats['unchanged'] += len(variant_rows)
             continue
+        changed_rows.append((product_code, (product_defaults, product_digest, product_changed), variant_rows))
 
-    # Deactivate products that were not found in the current feed
-    # This should only be done if the feed is truly comprehensive and represents ALL active products
-    Product.objects.exclude(code__in=list(synced_product_codes)).update(uma_is_active=False)
+    written_rows = []
+    if changed_rows:
+        try:
+            with transaction.atomic():
+                _bulk_upsert_full_feed_rows(changed_rows, generation)
+            written_rows = changed_rows
+        except Exception as e:
+            logger.error(f"Bulk upsert of {len(changed_rows)} products failed, falling back to per-product sync: {e}")
+            written_rows = []
+            for row in changed_rows:
+                if _sync_full_feed_product(*row, generation):
+                    written_rows.append(row)
+                else:
+                    product_stats['failed'] += 1
+                    variant_stats['failed'] += len(row[2])
+            # Rows that failed to write are still in the feed, so they must not be deactivated as missing
+            Product.objects.filter(code__in=[row[0] for row in changed_rows]).update(uma_sync_generation=generation)
+            ProductVariant.objects.filter(
+                code__in=[variant_code for row in changed_rows for variant_code in row[2]]
+            ).update(uma_sync_generation=generation)
+
+    for product_code, (_, _, product_changed), variant_rows in written_rows:
+        if product_changed:
+            product_stats['changed' if product_code in stored_product_digests else 'new'] += 1
+        else:
+            product_stats['unchanged'] += 1
+            unchanged_product_codes.append(product_code)
+        for variant_code, (_, _, variant_changed) in variant_rows.items():
+            if variant_changed:
+                variant_stats['changed' if variant_code in stored_variant_digests else 'new'] += 1
+            else:
+                variant_stats['unchanged'] += 1
+                unchanged_variant_codes.append(variant_code)
+
+    # Touch "last seen" bookkeeping of unchanged rows with one set-based statement per model
+    now = timezone.now()
+    if unchanged_product_codes:
+        Product.objects.filter(code__in=unchanged_product_codes).update(
+            uma_is_active=True, uma_last_synced_at=now, uma_sync_generation=generation
+        )
+    if unchanged_variant_codes:
+        ProductVariant.objects.filter(code__in=unchanged_variant_codes).update(
+            uma_is_active=True, uma_last_synced_at=now, uma_sync_generation=generation
+        )
+
+FULL_SYNC_GENERATION_KEY = 'UPGATES_FULL_SYNC_GENERATION'
+
+def _next_full_sync_generation():
+    """
+    Allocates the generation stamp of a new full sync run. It is stored right away, so a run that fails
+    halfway never shares its stamp with the next one.
+    """
+    generation = get_int_app_setting(FULL_SYNC_GENERATION_KEY, 0) + 1
+    set_app_setting(FULL_SYNC_GENERATION_KEY, str(generation))
+    return generation
 
-    logger.info("Product synchronization complete.")
+def _deactivate_stale_full_feed_rows(generation):
+    """
+    Deactivates products and variants that the full sync run `generation` didn't see in the feed,
+    with one UPDATE per model. Returns (deactivated products, deactivated variants).
+    """
+    stale = Q(uma_sync_generation__lt=generation) | Q(uma_sync_generation__isnull=True)
+    with current_sync_run().phase(SyncPhase.DEACTIVATE):
+        products = Product.objects.filter(stale, uma_is_active=True).update(uma_is_active=False)
+        variants = ProductVariant.objects.filter(stale, uma_is_active=True).update(uma_is_active=False)
+    return products, variants
+
+FULL_SYNC_MODE_DIRECT = 'direct' # Write changed rows straight into the live tables, chunk by chunk
+FULL_SYNC_MODE_STAGED = 'staged' # Load the whole feed into staging tables, then merge in one short transaction
+FULL_SYNC_MODE_FANOUT = 'fanout' # Load the feed into staging tables, then merge it in parallel Celery subtasks
+
+def _clear_full_feed_staging(before_generation):
+    """Removes staged rows left behind by earlier (failed) runs."""
+    StagedProduct.objects.filter(generation__lt=before_generation).delete()
+    StagedProductVariant.objects.filter(generation__lt=before_generation).delete()
+
+def _staged_code_hash(code):
+    return zlib.crc32(code.encode('utf-8'))
+
+def _stage_full_feed_chunk(products_data, generation, staged_counts):
+    """Bulk-loads a chunk of parsed feed products into the staging tables under `generation`, in one transaction."""
+    staged_products = []
+    staged_variants = []
+    for product_code, (product_defaults, variant_defaults) in _full_feed_rows(products_data).items():
+        staged_products.append(StagedProduct(
+            generation=generation, code=product_code, code_hash=_staged_code_hash(product_code), **product_defaults,
+            sync_digest=_full_feed_product_digest(product_defaults, variant_defaults),
+        ))
+        staged_variants.extend(
+            StagedProductVariant(
+                generation=generation, code=variant_code, code_hash=_staged_code_hash(variant_code),
+                product_code=product_code, **defaults, sync_digest=_full_feed_variant_digest(defaults, product_code),
+            )
+            for variant_code, defaults in variant_defaults.items()
+        )
+    with transaction.atomic():
+        # A code repeated in the feed keeps its last occurrence, same as the direct mode
+        StagedProduct.objects.bulk_create(
+            staged_products, update_conflicts=True, unique_fields=['generation', 'code'],
+            update_fields=PRODUCT_FEED_FIELDS + ['sync_digest'],
+        )
+        StagedProductVariant.objects.bulk_create(
+            staged_variants, update_conflicts=True, unique_fields=['generation', 'code'],
+            update_fields=['product_code'] + VARIANT_FEED_FIELDS + ['sync_digest'],
+        )
+    staged_counts['products'] += len(staged_products)
+    staged_counts['variants'] += len(staged_variants)
+
+def _merge_staged_rows(cursor, target_model, staged_model, fields, generation, now, join_products=False, code_hash_range=None):
+    """
+    Upserts the staged rows of `generation` into `target_model` with one INSERT ... SELECT ... ON CONFLICT DO UPDATE.
+    Rows whose stored digest matches the staged one are left alone. With `join_products`, the variant's product FK
+    is resolved from the staged product code. `code_hash_range` ([start, end)) limits the merge to the staged rows
+    whose code hash is in the range. Returns the number of inserted or updated rows.
+    """
+    quote = connection.ops.quote_name
+    target = quote(target_model._meta.db_table)
+    staged = quote(staged_model._meta.db_table)
+    target_column = lambda name: quote(target_model._meta.get_field(name).column)
+    staged_column = lambda name: f"s.{quote(staged_model._meta.get_field(name).column)}"
+
+    insert_columns = ['code'] + fields + SYNC_TRACKING_FIELDS
+    select_columns = [staged_column('code')] + [staged_column(name) for name in fields] + ['%s', '%s', staged_column('sync_digest'), '%s']
+    join = ''
+    update_columns = fields
+    if join_products:
+        product_table = quote(Product._meta.db_table)
+        insert_columns = ['product'] + insert_columns
+        select_columns = [f"p.{quote(Product._meta.pk.column)}"] + select_columns
+        join = f"JOIN {product_table} p ON p.{quote(Product._meta.get_field('code').column)} = {staged_column('product_code')}"
+        update_columns = ['product'] + fields
+
+    where = f"{staged_column('generation')} = %s"
+    params = [True, connection.ops.adapt_datetimefield_value(now), generation, generation]
+    if code_hash_range is not None:
+        where += f" AND {staged_column('code_hash')} >= %s AND {staged_column('code_hash')} < %s"
+        params.extend(code_hash_range)
+
+    digest = target_column('uma_sync_digest')
+    sql = (
+        f"INSERT INTO {target} ({', '.join(target_column(name) for name in insert_columns)}) "
+        f"SELECT {', '.join(select_columns)} FROM {staged} s {join} WHERE {where} "
+        f"ON CONFLICT ({target_column('code')}) DO UPDATE SET "
+        + ', '.join(f"{target_column(name)} = excluded.{target_column(name)}" for name in update_columns + SYNC_TRACKING_FIELDS)
+        + f" WHERE {target}.{digest} IS NULL OR {target}.{digest} <> excluded.{digest}"
+    )
+    cursor.execute(sql, params)
+    return cursor.rowcount
+
+def _merge_full_feed_staging(generation):
+    """
+    Merges the staged feed of `generation` into the live Product/ProductVariant tables in one transaction:
+    one upsert per model for new and changed rows, one UPDATE per model for the "last seen" bookkeeping of the
+    other staged rows, and the deactivation of rows missing from the feed. The staged rows are removed afterwards.
+    Returns (product stats, variant stats, deactivated products, deactivated variants).
+    """
+    now = timezone.now()
+    product_stats = Counter()
+    variant_stats = Counter()
+    staged_products = StagedProduct.objects.filter(generation=generation)
+    staged_variants = StagedProductVariant.objects.filter(generation=generation)
+    with current_sync_run().phase(SyncPhase.DB_WRITE), transaction.atomic():
+        new_products = staged_products.exclude(code__in=Product.objects.values('code')).count()
+        new_variants = staged_variants.exclude(code__in=ProductVariant.objects.values('code')).count()
+        with connection.cursor() as cursor:
+            written_products = _merge_staged_rows(cursor, Product, StagedProduct, PRODUCT_FEED_FIELDS, generation, now)
+            written_variants = _merge_staged_rows(
+                cursor, ProductVariant, StagedProductVariant, VARIANT_FEED_FIELDS, generation, now, join_products=True,
+            )
+        # Unchanged rows were skipped by the upserts, refresh their bookkeeping
+        Product.objects.filter(code__in=staged_products.values('code')).exclude(uma_sync_generation=generation).update(
+            uma_is_active=True, uma_last_synced_at=now, uma_sync_generation=generation
+        )
+        ProductVariant.objects.filter(code__in=staged_variants.values('code')).exclude(uma_sync_generation=generation).update(
+            uma_is_active=True, uma_last_synced_at=now, uma_sync_generation=generation
+        )
+        deactivated_products, deactivated_variants = _deactivate_stale_full_feed_rows(generation)
+
+    product_stats['new'] = new_products
+    product_stats['changed'] = written_products - new_products
+    product_stats['unchanged'] = staged_products.count() - written_products
+    variant_stats['new'] = new_variants
+    variant_stats['changed'] = written_variants - new_variants
+    variant_stats['unchanged'] = staged_variants.count() - written_variants
+    staged_products.delete()
+    staged_variants.delete()
+    return product_stats, variant_stats, deactivated_products, deactivated_variants
+
+def _record_full_sync_totals(run, generation, product_stats, variant_stats, deactivated_products, deactivated_variants):
+    run.add_rows(
+        read=sum(product_stats.values()) + sum(variant_stats.values()),
+        inserted=product_stats['new'] + variant_stats['new'],
+        updated=product_stats['changed'] + variant_stats['changed'],
+        skipped=product_stats['unchanged'] + variant_stats['unchanged'],
+        failed=product_stats['failed'] + variant_stats['failed'],
+    )
+    run.note(deactivated_products=deactivated_products, deactivated_variants=deactivated_variants)
+    logger.info(
+        f"Product synchronization complete (generation {generation}). "
+        f"Products: {product_stats['new']} new, {product_stats['changed']} changed, {product_stats['unchanged']} unchanged, {deactivated_products} deactivated. "
+        f"Variants: {variant_stats['new']} new, {variant_stats['changed']} changed, {variant_stats['unchanged']} unchanged, {deactivated_variants} deactivated."
+    )
+
+# --- FAN-OUT FULL SYNC ---
+# The coordinator loads the feed into the staging tables chunk by chunk, like the staged mode (so its memory stays
+# flat and the load is checkpointed), then fans the merge out to Celery subtasks. Every staged row carries a hash of
+# its code; each subtask merges one range of hashes with the set-based statements of the staged mode. A code is
+# staged once per run (its last occurrence in the feed), so the ranges never share a row and can merge in any order.
+# Task arguments are just (kind, generation, hash range): no feed rows go through the broker.
+# The ranges are spread over UPGATES_FULL_SYNC_FANOUT_CONCURRENCY chains ("lanes"); a lane merges its ranges one
+# after another and passes the accumulated row stats along, so at most that many merges run at once.
+# A chord over the product lanes is followed by a chord over the variant ranges (variants need their products);
+# its callback deactivates rows missing from the feed and finishes the coordinator's SyncRun.
+CODE_HASH_SPACE = 2 ** 32 # zlib.crc32() values
+FANOUT_MERGE_TARGETS = {
+    'products': (Product, StagedProduct, PRODUCT_FEED_FIELDS, False),
+    'variants': (ProductVariant, StagedProductVariant, VARIANT_FEED_FIELDS, True),
+}
+
+def _code_hash_ranges(rows, chunk_size):
+    """Splits the code hash space into equal [start, end) ranges of about `chunk_size` of `rows` staged rows each."""
+    count = max(1, -(-rows // chunk_size))
+    return [[CODE_HASH_SPACE * i // count, CODE_HASH_SPACE * (i + 1) // count] for i in range(count)]
+
+def _full_feed_fanout_ranges(kind, generation):
+    """Code hash ranges of the staged `kind` rows of `generation`, UPGATES_FULL_SYNC_FANOUT_CHUNK_SIZE rows each."""
+    chunk_size = max(1, get_int_app_setting(
+        'UPGATES_FULL_SYNC_FANOUT_CHUNK_SIZE', get_int_app_setting('UPGATES_PRODUCT_SYNC_BATCH_SIZE', 500)
+    ))
+    staged_model = FANOUT_MERGE_TARGETS[kind][1]
+    return _code_hash_ranges(staged_model.objects.filter(generation=generation).count(), chunk_size)
+
+def _dispatch_full_feed_fanout_chord(kind, generation, run_id, ranges, callback):
+    """
+    Sends one merge subtask per code hash range of the staged `kind` rows, chained into at most
+    UPGATES_FULL_SYNC_FANOUT_CONCURRENCY lanes, with `callback` as the chord callback. Returns the number of lanes.
+    """
+    from celery import chain, chord
+    from .tasks import fail_full_feed_fanout_task, merge_full_feed_range_task
+
+    concurrency = max(1, get_int_app_setting('UPGATES_FULL_SYNC_FANOUT_CONCURRENCY', 4))
+    queue = get_app_setting('UPGATES_FULL_SYNC_FANOUT_QUEUE') or None
+    options = {'queue': queue} if queue else {}
+    lanes = [ranges[lane::concurrency] for lane in range(min(concurrency, len(ranges)))]
+    header = [
+        chain(
+            merge_full_feed_range_task.signature(({}, kind, generation, lane[0], run_id), options=options),
+            *(merge_full_feed_range_task.signature((kind, generation, code_hash_range, run_id), options=options)
+              for code_hash_range in lane[1:]),
+        )
+        for lane in lanes
+    ]
+    callback.set(**options)
+    callback.link_error(fail_full_feed_fanout_task.signature(kwargs={'run_id': run_id}, options=options))
+    chord(header)(callback)
+    return len(lanes)
+
+def _start_full_feed_fanout(generation, feed):
+    """
+    Dispatches the fan-out merge of the staged feed of `generation`. The current run is detached (and saved) first,
+    since the chord callback that finishes it may run before this returns. Returns the number of product ranges.
+    """
+    from .tasks import merge_full_feed_variants_task
+
+    run = current_sync_run()
+    run_id = run.run.pk if run.run is not None else None
+    ranges = _full_feed_fanout_ranges('products', generation)
+    run.note(fanout_product_ranges=len(ranges))
+    run.detach() # Finished by the chord callback
+    callback = merge_full_feed_variants_task.signature((generation, run_id, feed.state_key, feed.validators()))
+    _dispatch_full_feed_fanout_chord('products', generation, run_id, ranges, callback)
+    return len(ranges)
+
+def merge_full_feed_fanout_range(stats, kind, generation, code_hash_range, run_id=None):
+    """
+    Fan-out subtask body: merges the staged `kind` rows ('products' or 'variants') of `generation` whose code hash
+    is in `code_hash_range` into the live table, like _merge_full_feed_staging(). Returns `stats` (the lane's
+    accumulated row stats) with this range's counts added.
+    """
+    target_model, staged_model, fields, join_products = FANOUT_MERGE_TARGETS[kind]
+    start, end = code_hash_range
+    now = timezone.now()
+    staged = staged_model.objects.filter(generation=generation, code_hash__gte=start, code_hash__lt=end)
+    # No other subtask merges these codes, so the count stays valid until the merge below
+    new = staged.exclude(code__in=target_model.objects.values('code')).count()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            written = _merge_staged_rows(
+                cursor, target_model, staged_model, fields, generation, now, join_products, code_hash_range,
+            )
+        # Unchanged rows were skipped by the upsert, refresh their bookkeeping
+        target_model.objects.filter(code__in=staged.values('code')).exclude(uma_sync_generation=generation).update(
+            uma_is_active=True, uma_last_synced_at=now, uma_sync_generation=generation
+        )
+    if run_id is not None:
+        SyncLock(SyncType.PRODUCTS_FULL).extend(run_id) # The coordinator's keep-alive is gone
+    stats = Counter(stats)
+    stats.update({'new': new, 'changed': written - new, 'unchanged': staged.count() - written})
+    return dict(stats)
+
+def merge_full_feed_fanout_variants(product_lane_stats, generation, run_id, feed_state_key, feed_validators):
+    """Callback of the product ranges chord: dispatches the chord over the variant ranges."""
+    from .tasks import finish_full_feed_fanout_task
+
+    product_stats = Counter()
+    for stats in product_lane_stats:
+        product_stats.update(stats)
+    callback = finish_full_feed_fanout_task.signature(
+        (dict(product_stats), generation, run_id, feed_state_key, feed_validators),
+    )
+    ranges = _full_feed_fanout_ranges('variants', generation)
+    lanes = _dispatch_full_feed_fanout_chord('variants', generation, run_id, ranges, callback)
+    logger.info(f"Full sync (generation {generation}): products merged, dispatched {len(ranges)} variant ranges in {lanes} lanes.")
+    return len(ranges)
+
+def finish_full_feed_fanout(variant_lane_stats, product_stats, generation, run_id, feed_state_key, feed_validators):
+    """
+    Callback of the variant ranges chord: deactivates rows missing from the feed, removes the staged rows, marks the
+    feed as processed and finishes the coordinator's SyncRun with the run totals.
+    """
+    product_stats = Counter(product_stats)
+    variant_stats = Counter()
+    for stats in variant_lane_stats:
+        variant_stats.update(stats)
+    try:
+        with SyncRunRecorder(SyncType.PRODUCTS_FULL, resume_run_id=run_id) as run:
+            deactivated_products, deactivated_variants = _deactivate_stale_full_feed_rows(generation)
+            StagedProduct.objects.filter(generation=generation).delete()
+            StagedProductVariant.objects.filter(generation=generation).delete()
+            UpgatesFeedClient().mark_feed_processed(FeedDownload(state_key=feed_state_key, **feed_validators))
+            _record_full_sync_totals(run, generation, product_stats, variant_stats, deactivated_products, deactivated_variants)
+    finally:
+        if run_id is not None:
+            SyncLock(SyncType.PRODUCTS_FULL).release(run_id)
     return True
 
-# --- PARTIAL PRODUCT SYNC ---
-def sync_products_from_partial_feed():
+def fail_full_feed_fanout(run_id, error):
     """
-    Retrieves the partial product XML feed and updates specific fields (e.g., stock, price).
-    This only updates existing products/variants and does NOT deactivate missing ones.
+    Fan-out chord error handler: fails the coordinator's SyncRun. Rows missing from the feed stay active;
+    the staged rows are removed by the next run.
+    """
+    logger.error(f"Fan-out full product sync failed, missing products were not deactivated: {error}")
+    try:
+        with SyncRunRecorder(SyncType.PRODUCTS_FULL, resume_run_id=run_id) as run:
+            run.fail(str(error))
+    finally:
+        if run_id is not None:
+            SyncLock(SyncType.PRODUCTS_FULL).release(run_id)
+
+@recorded_sync(SyncType.PRODUCTS_FULL)
+def sync_products_from_full_feed(force=False):
+    """
+    Downloads the full product XML feed, parses it product by product, and syncs products/variants.
+    Products are consumed straight from an incremental parse, so memory doesn't grow with the catalog size.
+    Large feeds are parsed by UPGATES_FEED_PARSE_WORKERS processes in chunks of UPGATES_FEED_PARSE_CHUNK_BYTES.
+    Rows whose feed data didn't change since the last sync (per stored digest) are not rewritten,
+    changed rows are written in bulk per chunk of UPGATES_PRODUCT_SYNC_BATCH_SIZE products.
+    Every row seen in the feed is stamped with the run's sync generation; at the end, products and variants
+    with an older stamp are deactivated.
+    With UPGATES_FULL_SYNC_MODE='staged', the feed is first loaded into staging tables and then merged into the
+    live tables with a few set-based statements in one transaction, so the live tables are only locked for the merge.
+    Progress is checkpointed after every chunk; a run over the same feed content after an interrupted one
+    skips the products that were already committed and keeps the interrupted run's generation. Download and database
+    errors are raised, so the task retries and resumes; a feed that can't be parsed fails the run without retrying.
+    With UPGATES_FULL_SYNC_MODE='fanout', the feed is staged the same way and then merged by parallel Celery subtasks;
+    the deactivation runs in their chord callback, which also finishes this run's SyncRun (see _start_full_feed_fanout).
+    If the feed hasn't changed since the last processed run (and `force` is not set), nothing is parsed or written.
     """
     feed_client = UpgatesFeedClient()
+    parser = UpgatesProductXMLParser()
+    batch_size = get_int_app_setting('UPGATES_PRODUCT_SYNC_BATCH_SIZE', 500)
+    mode = get_app_setting('UPGATES_FULL_SYNC_MODE', FULL_SYNC_MODE_DIRECT)
+    if mode not in (FULL_SYNC_MODE_DIRECT, FULL_SYNC_MODE_STAGED, FULL_SYNC_MODE_FANOUT):
+        logger.warning(f"Unknown UPGATES_FULL_SYNC_MODE '{mode}', using '{FULL_SYNC_MODE_DIRECT}'.")
+        mode = FULL_SYNC_MODE_DIRECT
+    run = current_sync_run()
+    run.note(mode=mode, force=force)
+
+    product_stats = Counter()
+    variant_stats = Counter()
+    staged_counts = Counter()
+    offset = 0 # Products committed so far (and checkpointed)
+
     try:
-        xml_root = feed_client.get_partial_products_xml_feed()
-        if xml_root is None:
-            return False # Partial feed URL not configured or fetch failed
-        logger.info("Successfully retrieved Upgates PARTIAL product XML feed.")
-    except Exception as e:
-        logger.error(f"Failed to retrieve Upgates PARTIAL product feed: {e}")
+        with feed_client.open_full_products_feed(conditional=not force) as feed:
+            if feed.unchanged:
+                logger.info("Upgates product XML feed unchanged since last sync. Skipping product synchronization.")
+                run.note(feed_unchanged=True)
+                return True
+            logger.info("Successfully retrieved Upgates product XML feed.")
+            # Continue after the last committed chunk if a run over the same feed content was interrupted
+            fingerprint = compute_fingerprint(feed.content_hash, mode)
+            checkpoint = load_checkpoint(SyncType.PRODUCTS_FULL, fingerprint)
+            if checkpoint is not None:
+                # Keep the interrupted run's generation, so the rows it already stamped count as seen
+                generation = checkpoint.state['generation']
+                offset = checkpoint.position
+                logger.info(f"Resuming full product sync (generation {generation}) after {offset} products.")
+                run.note(resumed_after_products=offset)
+            else:
+                # Rows seen by this run get its generation, rows missing from the feed keep an older one
+                generation = _next_full_sync_generation()
+            run.note(generation=generation)
+            products = parser.iter_products_data_parallel(
+                feed.path,
+                workers=get_int_app_setting('UPGATES_FEED_PARSE_WORKERS', min(4, os.cpu_count() or 1)),
+                chunk_bytes=get_int_app_setting('UPGATES_FEED_PARSE_CHUNK_BYTES', DEFAULT_PARSE_CHUNK_BYTES),
+            )
+            if offset:
+                products = islice(products, offset, None) # Already committed by the interrupted run
+            load_started = time.monotonic()
+            staging = mode in (FULL_SYNC_MODE_STAGED, FULL_SYNC_MODE_FANOUT)
+            if staging:
+                _clear_full_feed_staging(before_generation=generation)
+            for products_chunk in run.timed(_chunked(products, batch_size), SyncPhase.PARSE):
+                with run.phase(SyncPhase.DB_WRITE):
+                    if staging:
+                        _stage_full_feed_chunk(products_chunk, generation, staged_counts)
+                    else:
+                        _sync_full_feed_chunk(products_chunk, generation, product_stats, variant_stats)
+                offset += len(products_chunk)
+                save_checkpoint(SyncType.PRODUCTS_FULL, fingerprint, offset, generation=generation)
+            load_seconds = time.monotonic() - load_started
+    except XML_PARSE_ERRORS as e:
+        # The feed is incomplete, so we must not deactivate products that we haven't seen
+        logger.error(f"Failed to parse Upgates product feed: {e}")
         return False
+    except Exception as e:
+        logger.error(f"Failed to sync Upgates product feed after {offset} products: {e}")
+        # Fail the run so the task retries; the retry resumes after the last checkpointed chunk
+        run.note(failed_after_products=offset)
+        raise
+
+    if mode == FULL_SYNC_MODE_FANOUT:
+        try:
+            range_count = _start_full_feed_fanout(generation, feed)
+        except Exception as e:
+            # The checkpoint stays, so the next run only dispatches the merge again
+            logger.error(f"Failed to dispatch the fan-out merge of the staged product feed (generation {generation}): {e}")
+            return False
+        clear_checkpoint(SyncType.PRODUCTS_FULL, fingerprint)
+        logger.info(
+            f"Full sync (generation {generation}): staged {staged_counts['products']} products and {staged_counts['variants']} variants "
+            f"in {load_seconds:.2f}s, dispatched {range_count} product ranges to Celery workers."
+        )
+        return True
 
-    parser = UpgatesProductXMLParser(xml_root)
-    all_products_data = parser.get_all_products_data() # Use the same parser, it handles missing tags gracefully
+    # Deactivate products and variants that were not found in the current feed
+    # This should only be done if the feed is truly comprehensive and represents ALL active products
+    merge_started = time.monotonic()
+    if mode == FULL_SYNC_MODE_STAGED:
+        try:
+            product_stats, variant_stats, deactivated_products, deactivated_variants = _merge_full_feed_staging(generation)
+        except Exception as e:
+            logger.error(f"Failed to merge staged Upgates product feed (generation {generation}): {e}")
+            return False
+    else:
+        deactivated_products, deactivated_variants = _deactivate_stale_full_feed_rows(generation)
+    merge_seconds = time.monotonic() - merge_started
+
+    clear_checkpoint(SyncType.PRODUCTS_FULL, fingerprint)
+    feed_client.mark_feed_processed(feed)
+    if mode == FULL_SYNC_MODE_STAGED:
+        logger.info(
+            f"Staged full sync: loaded {staged_counts['products']} products and {staged_counts['variants']} variants in {load_seconds:.2f}s, "
+            f"merged into the live tables in {merge_seconds:.2f}s."
+        )
+    else:
+        logger.info(f"Full sync: wrote the feed in {load_seconds:.2f}s, deactivated missing rows in {merge_seconds:.2f}s.")
+    _record_full_sync_totals(run, generation, product_stats, variant_stats, deactivated_products, deactivated_variants)
+    return True
 
-    updated_count = 0
-    created_count = 0
+# --- PARTIAL PRODUCT SYNC ---
+PRODUCT_PARTIAL_SYNC_FIELDS = ['product_id', 'stock', 'availability']
+VARIANT_PARTIAL_SYNC_FIELDS = ['stock', 'availability']
 
-    for product_data in all_products_data:
-        product_code = product_data.get('code')
+def _partial_feed_changes(model, updates, fields):
+    """
+    Compares partial feed values with the stored ones for a dict of code -> {field: value}.
+    Current values of all codes are preloaded with one query. Returns (objects_to_update, unknown_codes),
+    where objects carry the merged values of `fields` and are ready for bulk_update.
+    """
+    current_rows = {
+        row[0]: row[1:]
+        for row in model.objects.filter(code__in=list(updates)).values_list('code', 'pk', *fields)
+    }
+    now = timezone.now()
+    objects_to_update = []
+    unknown_codes = []
+    for code, new_values in updates.items():
+        current = current_rows.get(code)
+        if current is None:
+            unknown_codes.append(code)
+            continue
+        pk, current_values = current[0], dict(zip(fields, current[1:]))
+        # None means the field is missing from the feed; don't nullify existing data
+        merged_values = {field: new_values.get(field) if new_values.get(field) is not None else value for field, value in current_values.items()}
+        if merged_values == current_values:
+            continue
+        objects_to_update.append(model(
+            pk=pk, code=code, **merged_values,
+            uma_last_synced_at=now,
+            uma_sync_digest=None, # Out-of-band change, next full sync must rewrite the row
+        ))
+    return objects_to_update, unknown_codes
+
+def _sync_partial_feed_chunk(products_data, stats, unknown_product_codes, unknown_variant_codes):
+    """
+    Updates stock/availability of existing products and variants for a chunk of the partial feed.
+    Stored values are preloaded with one query per model and compared in memory; only rows whose values
+    actually changed are written, with one bulk_update per model.
+    """
+    product_updates = {}
+    variant_updates = {}
+    variants_by_product = {}
+    for product_data in products_data:
+        product_code = product_data.code
         if not product_code:
             logger.warning(f"Skipping product with no CODE from partial feed: {product_data}")
             continue
+        product_updates[product_code] = {field: getattr(product_data, field) for field in PRODUCT_PARTIAL_SYNC_FIELDS}
+        for variant_data in product_data.variants:
+            variant_code = variant_data.code
+            if not variant_code:
+                logger.warning(f"Skipping variant with no CODE for product {product_code} from partial feed: {variant_data}")
+                continue
+            variants_by_product.setdefault(product_code, []).append(variant_code)
+            variant_updates[variant_code] = {field: getattr(variant_data, field) for field in VARIANT_PARTIAL_SYNC_FIELDS}
+
+    products_to_update, unknown_products = _partial_feed_changes(Product, product_updates, PRODUCT_PARTIAL_SYNC_FIELDS)
+    # Partial feeds only update existing items, and variants of unknown products need a full sync first
+    for product_code in unknown_products:
+        for variant_code in variants_by_product.get(product_code, []):
+            variant_updates.pop(variant_code, None)
+    variants_to_update, unknown_variants = _partial_feed_changes(ProductVariant, variant_updates, VARIANT_PARTIAL_SYNC_FIELDS)
+
+    with current_sync_run().phase(SyncPhase.DB_WRITE), transaction.atomic():
+        if products_to_update:
+            Product.objects.bulk_update(products_to_update, PRODUCT_PARTIAL_SYNC_FIELDS + ['uma_last_synced_at', 'uma_sync_digest'])
+        if variants_to_update:
+            ProductVariant.objects.bulk_update(variants_to_update, VARIANT_PARTIAL_SYNC_FIELDS + ['uma_last_synced_at', 'uma_sync_digest'])
+
+    stats['read'] += len(product_updates) + len(variant_updates)
+    stats['updated'] += len(products_to_update) + len(variants_to_update)
+    stats['unchanged'] += (len(product_updates) - len(unknown_products) - len(products_to_update)) + (len(variant_updates) - len(unknown_variants) - len(variants_to_update))
+    unknown_product_codes.extend(unknown_products)
+    unknown_variant_codes.extend(unknown_variants)
+
+@recorded_sync(SyncType.PRODUCTS_PARTIAL)
+def sync_products_from_partial_feed(force=False):
+    """
+    Downloads the partial product XML feed and updates specific fields (e.g., stock, price).
+    This only updates existing products/variants and does NOT deactivate missing ones.
+    Items are processed in chunks; only rows whose stock/availability actually changed are written.
+    Progress is checkpointed after every chunk, so a run over the same feed content continues after an interrupted one.
+    Download and database errors are raised, so the task retries and resumes from the checkpoint.
+    If the feed hasn't changed since the last processed run (and `force` is not set), nothing is parsed or written.
+    """
+    feed_client = UpgatesFeedClient()
+    parser = UpgatesProductXMLParser() # Use the same parser, it handles missing tags gracefully
+    batch_size = get_int_app_setting('UPGATES_PRODUCT_SYNC_BATCH_SIZE', 500)
+    run = current_sync_run()
+    run.note(force=force)
 
-        try:
-            with transaction.atomic():
-                # Attempt to get the product first
-                product_obj = Product.objects.filter(code=product_code).first()
-
-                if product_obj:
-                    # Construct defaults ONLY with fields present in the partial feed and meant to be updated
-                    # Use .get() with None as default for safety, then filter out Nones
-                    product_defaults_partial = {
-                        'product_id': product_data.get('product_id'),
-                        'stock': product_data.get('stock'),
-                        'availability': product_data.get('availability'),
-                    }
-                    # Filter out None values so we don't accidentally nullify existing data
-                    product_defaults_partial = {k: v for k, v in product_defaults_partial.items() if v is not None}
-
-                    if product_defaults_partial: # Only update if there's actually data to update
-                        for field, value in product_defaults_partial.items():
-                            setattr(product_obj, field, value)
-                        product_obj.uma_last_synced_at = timezone.now() # Update last synced time
-                        product_obj.save(update_fields=list(product_defaults_partial.keys()) + ['uma_last_synced_at'])
-                        updated_count += 1
-                        logger.debug(f"Partially updated product: {product_obj.code}")
-                    else:
-                        logger.debug(f"No relevant fields to update for product {product_code} from partial feed.")
-
-                else:
-                    # If product not found in DB, it might be a new product.
-                    # Create it, but only with data from the partial feed.
-                    # Full sync will fill missing details.
-                    # This decision depends on if partial feeds can introduce new products.
-                    # For now, let's assume partial feeds are only for updates to existing items.
-                    logger.warning(f"Product {product_code} not found in DB for partial update. Skipping creation from partial feed.")
-                    continue
-
-
-                # --- Sync Product Variants ---
-                product_variants_data = product_data.get('variants', [])
-                if not product_variants_data and product_obj:
-                    # If the partial feed only contains product-level info, skip variant loop
-                    continue
+    stats = Counter()
+    unknown_product_codes = []
+    unknown_variant_codes = []
+    offset = 0 # Products written so far (and checkpointed)
 
-                for variant_data in product_variants_data:
-                    variant_code = variant_data.get('code')
-                    if not variant_code:
-                        logger.warning(f"Skipping variant with no CODE for product {product_code} from partial feed: {variant_data}")
-                        continue
+    try:
+        with feed_client.open_partial_products_feed(conditional=not force) as feed:
+            if feed is None:
+                return False # Partial feed URL not configured
+            if feed.unchanged:
+                logger.info("Upgates PARTIAL product XML feed unchanged since last sync. Skipping.")
+                run.note(feed_unchanged=True)
+                return True
+            logger.info("Successfully retrieved Upgates PARTIAL product XML feed.")
+            fingerprint = compute_fingerprint(feed.content_hash)
+            checkpoint = load_checkpoint(SyncType.PRODUCTS_PARTIAL, fingerprint)
+            if checkpoint is not None:
+                offset = checkpoint.position
+            if offset:
+                logger.info(f"Resuming PARTIAL product sync after {offset} products.")
+                run.note(resumed_after_products=offset)
+            products = parser.iter_products_data_parallel(
+                feed.path,
+                workers=get_int_app_setting('UPGATES_FEED_PARSE_WORKERS', min(4, os.cpu_count() or 1)),
+                chunk_bytes=get_int_app_setting('UPGATES_FEED_PARSE_CHUNK_BYTES', DEFAULT_PARSE_CHUNK_BYTES),
+            )
+            if offset:
+                products = islice(products, offset, None) # Already written by the interrupted run
+            for products_chunk in run.timed(_chunked(products, batch_size), SyncPhase.PARSE):
+                _sync_partial_feed_chunk(products_chunk, stats, unknown_product_codes, unknown_variant_codes)
+                offset += len(products_chunk)
+                save_checkpoint(SyncType.PRODUCTS_PARTIAL, fingerprint, offset)
+    except XML_PARSE_ERRORS as e:
+        logger.error(f"Failed to parse Upgates PARTIAL product feed: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"Failed to update products from Upgates PARTIAL product feed after {offset} products: {e}")
+        # Fail the run so the task retries; the retry resumes after the last checkpointed chunk
+        run.note(failed_after_products=offset)
+        raise
+
+    for item_type, unknown_codes in (('products', unknown_product_codes), ('variants', unknown_variant_codes)):
+        if unknown_codes:
+            # This means the products or variants need a full sync first
+            logger.warning(
+                f"Partial feed contains {len(unknown_codes)} {item_type} not found in DB, skipped: "
+                f"{', '.join(unknown_codes[:50])}{' ...' if len(unknown_codes) > 50 else ''}"
+            )
+
+    run.add_rows(
+        read=stats['read'], updated=stats['updated'],
+        skipped=stats['unchanged'] + len(unknown_product_codes) + len(unknown_variant_codes),
+    )
+    run.note(unknown_products=len(unknown_product_codes), unknown_variants=len(unknown_variant_codes))
+    clear_checkpoint(SyncType.PRODUCTS_PARTIAL, fingerprint)
+    feed_client.mark_feed_processed(feed)
+    logger.info(f"PARTIAL Product synchronization complete. Updated {stats['updated']} existing items, {stats['unchanged']} unchanged.")
+    return True
 
-                    # Attempt to get the variant
-                    variant_obj = ProductVariant.objects.filter(code=variant_code).first()
+# --- Core logic for processing stock adjustments ---
+PRESYNC_UPDATE_BATCH_SIZE = 2000 # Codes per stock UPDATE statement of the targeted pre-sync
+
+def _chunk_codes_for_url(codes, max_length):
+    """Splits codes into groups whose ';'-joined, URL-encoded `codes` parameter stays within `max_length` characters."""
+    chunk = []
+    length = 0
+    for code in codes:
+        code_length = len(quote(code, safe='')) + 3 # Plus the encoded ';' separator
+        if chunk and length + code_length > max_length:
+            yield chunk
+            chunk = []
+            length = 0
+        chunk.append(code)
+        length += code_length
+    if chunk:
+        yield chunk
+
+def _fetch_stock_levels(client, codes):
+    """
+    Fetches every page of /products/simple for one chunk of product codes.
+    Returns ({product code: stock}, {variant code: stock}) of the returned items.
+    """
+    product_stock = {}
+    variant_stock = {}
+    page = number_of_pages = 1
+    while page <= number_of_pages:
+        response, return_code = client.get_products_simple(codes=';'.join(codes), page=page)
+        number_of_pages = response.get('number_of_pages', 1)
+        for product_api_data in response.get('products', []):
+            if product_api_data.get('code') and product_api_data.get('stock') is not None:
+                product_stock[product_api_data['code']] = product_api_data['stock']
+            for variant_api_data in product_api_data.get('variants') or []:
+                if variant_api_data.get('code') and variant_api_data.get('stock') is not None:
+                    variant_stock[variant_api_data['code']] = variant_api_data['stock']
+        page += 1
+    return product_stock, variant_stock
+
+def _update_stock_levels(model, stock_by_code, now):
+    """Sets the stock of rows by code with one CASE UPDATE per PRESYNC_UPDATE_BATCH_SIZE codes. Returns updated rows."""
+    updated = 0
+    for codes in _chunked(stock_by_code, PRESYNC_UPDATE_BATCH_SIZE):
+        updated += model.objects.filter(code__in=codes).update(
+            stock=Case(*(When(code=code, then=Value(stock_by_code[code])) for code in codes), output_field=IntegerField()),
+            uma_last_synced_at=now,
+            uma_sync_digest=None, # Out-of-band change, next full sync must rewrite the row
+        )
+    return updated
+
+def _presync_stock_levels(codes):
+    """
+    Targeted pre-sync of stock adjustments: refreshes only the stock of the given products and their variants.
+    The codes are split into requests whose `codes` parameter stays within UPGATES_PRESYNC_MAX_CODES_LENGTH
+    characters; the requests run concurrently on UPGATES_API_MAX_WORKERS threads. Raises if any request fails.
+    Returns (requests made, updated products, updated variants).
+    """
+    client = UpgatesAPIClient()
+    max_length = max(1, get_int_app_setting('UPGATES_PRESYNC_MAX_CODES_LENGTH', 1500))
+    max_workers = max(1, get_int_app_setting('UPGATES_API_MAX_WORKERS', 4))
+    chunks = list(_chunk_codes_for_url(sorted(codes), max_length))
+
+    product_stock = {}
+    variant_stock = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)), thread_name_prefix='upgates-presync') as executor:
+        # Requests run in the caller's context, so they are counted in the current sync run
+        futures = [executor.submit(contextvars.copy_context().run, _fetch_stock_levels, client, chunk) for chunk in chunks]
+        for future in futures:
+            chunk_product_stock, chunk_variant_stock = future.result()
+            product_stock.update(chunk_product_stock)
+            variant_stock.update(chunk_variant_stock)
+
+    now = timezone.now()
+    with transaction.atomic():
+        updated_products = _update_stock_levels(Product, product_stock, now)
+        updated_variants = _update_stock_levels(ProductVariant, variant_stock, now)
+    return len(chunks), updated_products, updated_variants
+
+ADJUSTMENT_STATUS_FIELDS = ['status', 'processed_at', 'error_message', 'api_response_data', 'lease_expires_at', 'updated_at']
+ADJUSTMENT_TARGET_FIELDS = ['stock', 'uma_last_synced_at', 'uma_sync_digest']
+
+def _adjustment_target(adjustment):
+    """Returns (target Product/ProductVariant, 'product'/'variant') of an adjustment, or (None, None)."""
+    if adjustment.variant_id:
+        return adjustment.variant, 'variant'
+    if adjustment.product_id:
+        return adjustment.product, 'product'
+    return None, None
+
+def _fail_adjustment(adjustment, error_message, api_response_data=None):
+    adjustment.status = 'failed'
+    adjustment.error_message = error_message
+    if api_response_data is not None:
+        adjustment.api_response_data = api_response_data
+
+def _save_adjustment_statuses(adjustments, worker_id):
+    """
+    Writes the final status fields of the given adjustments with bulk UPDATEs and releases their claim. This bypasses
+    ProductStockAdjustment.save(), so the records aren't re-validated with full_clean() on every transition.
+    Only adjustments still claimed by `worker_id` are written: one whose lease ran out may have been claimed by
+    another worker since, and its result is that worker's to save. Returns the pks of such lost adjustments.
+    """
+    if not adjustments:
+        return set()
+    now = timezone.now()
+    for adjustment in adjustments:
+        adjustment.lease_expires_at = None
+        adjustment.updated_at = now # auto_now isn't applied by bulk_update
+    # The filter applies to every UPDATE of the bulk update
+    written = ProductStockAdjustment.objects.filter(claimed_by=worker_id).bulk_update(adjustments, ADJUSTMENT_STATUS_FIELDS)
+    if written == len(adjustments):
+        return set()
+    lost_pks = set(
+        ProductStockAdjustment.objects.filter(pk__in=[adjustment.pk for adjustment in adjustments])
+        .exclude(claimed_by=worker_id).values_list('pk', flat=True)
+    )
+    logger.warning(
+        f"Lost the claim on {len(lost_pks)} stock adjustment(s) to another worker, their status was not saved: "
+        f"{', '.join(str(pk) for pk in sorted(lost_pks))}"
+    )
+    return lost_pks
+
+def _stock_adjustment_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def _lock_sqlite_for_write():
+    """
+    On SQLite, takes the database write lock for the current transaction right away, like BEGIN IMMEDIATE would.
+    A transaction that reads before it writes otherwise fails with "database is locked", instead of waiting for the
+    busy timeout, when another worker wrote in between. Other databases lock the rows with SELECT ... FOR UPDATE.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        # A write statement takes the lock even when it matches no row
+        cursor.execute(f"UPDATE {connection.ops.quote_name(ProductStockAdjustment._meta.db_table)} SET id = id WHERE 1 = 0")
 
-                    if variant_obj:
-                        variant_defaults_partial = {
-                            'stock': variant_data.get('stock'),
-                            'availability': variant_data.get('availability'),
-                        }
-                        # Filter out None values
-                        variant_defaults_partial = {k: v for k, v in variant_defaults_partial.items() if v is not None}
-
-                        if variant_defaults_partial:
-                            for field, value in variant_defaults_partial.items():
-                                setattr(variant_obj, field, value)
-                            variant_obj.uma_last_synced_at = timezone.now()
-                            variant_obj.save(update_fields=list(variant_defaults_partial.keys()) + ['uma_last_synced_at'])
-                            updated_count += 1
-                            logger.debug(f"  Partially updated variant: {variant_obj.code}")
-                        else:
-                            logger.debug(f"  No relevant fields to update for variant {variant_code} from partial feed.")
-                    else:
-                        logger.warning(f"Variant {variant_code} not found in DB for partial update. Skipping creation from partial feed.")
-                        # This means the product or variant needs a full sync first.
-                        # You could potentially queue a full sync for this product here if the business logic allows.
+def _claim_stock_adjustments(worker_id, limit, lease_seconds):
+    """
+    Claims up to `limit` adjustments for `worker_id`, oldest first: pending ones, and 'processing' ones whose lease
+    expired (their worker died) or that have no lease at all (left behind by a worker from before leases existed).
+    They are moved to 'processing' with a lease of `lease_seconds`.
+    Adjustments of a product/variant that another worker holds a lease on are left alone, so the stock of one item
+    is only computed and pushed by one worker at a time. Returns the claimed adjustments with their targets.
+    """
+    now = timezone.now()
+    claimable = (
+        Q(status='pending')
+        | Q(status='processing', lease_expires_at__lt=now)
+        | Q(status='processing', lease_expires_at__isnull=True)
+    )
+    leased = ProductStockAdjustment.objects.filter(status='processing', lease_expires_at__gte=now).exclude(claimed_by=worker_id)
+    with transaction.atomic():
+        _lock_sqlite_for_write()
+        candidates = list(
+            ProductStockAdjustment.objects.filter(claimable)
+            .exclude(Exists(leased.filter(product_id=OuterRef('product_id'))))
+            .exclude(Exists(leased.filter(variant_id=OuterRef('variant_id'))))
+            .order_by('created_at')
+            .values_list('pk', 'product_id', 'variant_id')[:limit]
+        )
+        if not candidates:
+            return []
+        product_ids = sorted({product_id for _, product_id, _ in candidates if product_id is not None})
+        variant_ids = sorted({variant_id for _, _, variant_id in candidates if variant_id is not None})
+
+        # Lock the targets (in pk order), so concurrent claims of the same product/variant are serialized
+        list(Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('pk', flat=True))
+        list(ProductVariant.objects.select_for_update().filter(pk__in=variant_ids).order_by('pk').values_list('pk', flat=True))
+
+        # Check the leases again now that the targets are locked (another claim may have committed in the meantime)
+        busy_products = set(leased.filter(product_id__in=product_ids).values_list('product_id', flat=True))
+        busy_variants = set(leased.filter(variant_id__in=variant_ids).values_list('variant_id', flat=True))
+        claim_pks = [
+            pk for pk, product_id, variant_id in candidates
+            if product_id not in busy_products and variant_id not in busy_variants
+        ]
+        # Conditional UPDATE: rows claimed by another worker since they were read don't match anymore
+        ProductStockAdjustment.objects.filter(claimable, pk__in=claim_pks).update(
+            status='processing', claimed_by=worker_id, lease_expires_at=now + timedelta(seconds=lease_seconds), updated_at=now,
+        )
+    return list(
+        ProductStockAdjustment.objects.filter(pk__in=claim_pks, status='processing', claimed_by=worker_id)
+        .select_related('product', 'variant__product')
+        .order_by('created_at')
+    )
+
+def _renew_stock_adjustment_claims(worker_id, adjustments, lease_seconds):
+    """Extends the lease of the adjustments still claimed by `worker_id`. Returns the pks of those adjustments."""
+    now = timezone.now()
+    held = ProductStockAdjustment.objects.filter(pk__in=[adjustment.pk for adjustment in adjustments], status='processing', claimed_by=worker_id)
+    if held.update(lease_expires_at=now + timedelta(seconds=lease_seconds)) == len(adjustments):
+        return {adjustment.pk for adjustment in adjustments}
+    return set(held.values_list('pk', flat=True))
+
+def _chunk_push_items(items, max_items, max_bytes):
+    """
+    Splits (key, payload item) pairs into chunks of at most `max_items` items whose serialized items
+    take at most `max_bytes` (a single bigger item still gets its own chunk).
+    """
+    chunk = []
+    size = 0
+    for key, item in items:
+        item_size = len(json.dumps({"code": item["code"], "stock": item["stock"]})) + 2 # Plus the separator
+        if chunk and (len(chunk) >= max_items or size + item_size > max_bytes):
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append((key, item))
+        size += item_size
+    if chunk:
+        yield chunk
+
+def _push_stock_chunk(api_client, items):
+    """
+    Sends one chunk of stock items with PUT /products. Returns the per-item results as {code: response item}
+    (variants are listed under their products in the response). Raises if the request fails.
+    """
+    # API expects a list of products with their updated stock and list of variants
+    products = [{"code": item["code"], "stock": item["stock"]} for item in items if item['type'] == 'product']
+    variants = [{"code": item["code"], "stock": item["stock"]} for item in items if item['type'] == 'variant']
+    response, return_code = api_client.put_product_data(data={
+        "products": products or None,
+        "variants": variants or None,
+    })
+
+    # Check if the response indicates success
+    logger.info(f"Batch update response: {response}")
+    if not response:
+        raise Exception("Batch update failed with no success flag in response.")
 
-        except IntegrityError as ie:
-            logger.error(f"Integrity error during product sync for CODE {product_code} from partial feed: {ie}")
-        except Exception as e:
-            logger.error(f"Unhandled error during product sync for CODE {product_code} from partial feed: {e}")
-            continue
+    response_item_lookup = {}
+    for item in response.get('products', []):
+        # Add the product itself to the lookup (if it has a code)
+        if 'code' in item:
+            response_item_lookup[item['code']] = item
 
-    logger.info(f"PARTIAL Product synchronization complete. Updated {updated_count} existing items.")
-    return True
+        # Add its variants to the lookup
+        if 'variants' in item and item['variants']:
+            for variant in item['variants']:
+                if 'code' in variant:
+                    response_item_lookup[variant['code']] = variant
+    return response_item_lookup
 
-# --- Core logic for processing stock adjustments ---
-def process_stock_adjustments():
+@recorded_sync(SyncType.STOCK_ADJUSTMENTS)
+def process_stock_adjustments(worker_id=None):
     """
-    Processes pending stock adjustments from the ProductStockAdjustment table in a batch.
-    1. Collects all pending adjustments.
-    2. Syncs current stock for all relevant items from Upgates API.
-    3. Calculates new stock levels for each.
-    4. Sends a single batch PUT request to Upgates API.
-    5. Updates ProductStockAdjustment records based on batch API response (or success/failure).
-    6. Verifies updates by re-syncing and checking last_synced_at.??? maybe not needed
+    Processes a slice of the pending stock adjustments from the ProductStockAdjustment table in a batch.
+    1. Claims up to UPGATES_STOCK_ADJUSTMENT_CLAIM_SIZE adjustments, oldest first, with a lease of
+       UPGATES_STOCK_ADJUSTMENT_LEASE_SECONDS (see _claim_stock_adjustments). Several workers can process the
+       backlog in parallel; an adjustment whose worker died returns to the pool when its lease expires.
+    2. Refreshes the stock of all relevant items from Upgates API (targeted pre-sync, see _presync_stock_levels).
+    3. Sums the adjustments of each product/variant into one net delta, calculates the new stock levels
+       and marks the adjustments 'processing'.
+    4. Renews the lease and sends the items (one per product/variant) to Upgates API with PUT requests of at most
+       UPGATES_STOCK_PUSH_MAX_ITEMS items / UPGATES_STOCK_PUSH_MAX_BYTES bytes, UPGATES_STOCK_PUSH_MAX_WORKERS at a time.
+    5. Updates ProductStockAdjustment records (every adjustment gets the result of its item) and local stock
+       based on batch API response (or success/failure), releasing the claim. Adjustments claimed by another
+       worker in the meantime are left alone.
+    Status transitions are written with bulk updates, so the number of queries doesn't grow with the batch size.
     """
     api_client = UpgatesAPIClient()
-    
-    # Get all pending adjustments. Order by created_at to process oldest first.
-    pending_adjustments = ProductStockAdjustment.objects.filter(status='pending').order_by('created_at')
-    
-    if not pending_adjustments.exists():
+    run = current_sync_run()
+    worker_id = worker_id or _stock_adjustment_worker_id()
+    claim_size = max(1, get_int_app_setting('UPGATES_STOCK_ADJUSTMENT_CLAIM_SIZE', 500))
+    lease_seconds = max(10, get_int_app_setting('UPGATES_STOCK_ADJUSTMENT_LEASE_SECONDS', 600))
+    failed_adjustments = [] # Every adjustment failed along the way, for the run counters
+
+    # Claim the oldest pending adjustments with their targets
+    pending_adjustments = _claim_stock_adjustments(worker_id, claim_size, lease_seconds)
+    run.note(worker=worker_id, claimed=len(pending_adjustments), claim_size=claim_size)
+
+    if not pending_adjustments:
         logger.info("No pending product stock adjustments to process.")
         return True
 
-    logger.info(f"Found {pending_adjustments.count()} pending product stock adjustments.")
+    logger.info(f"Claimed {len(pending_adjustments)} pending product stock adjustments as {worker_id}.")
+    run.add_rows(read=len(pending_adjustments))
 
     # Collect all unique codes for the initial sync
     all_codes_to_sync = set()
+    valid_adjustments = []
+    invalid_adjustments = []
     for adjustment in pending_adjustments:
-        if adjustment.variant:
-            all_codes_to_sync.add(adjustment.variant.product.code)
-        elif adjustment.product:
-            all_codes_to_sync.add(adjustment.product.code)
-        else:
+        target, item_type = _adjustment_target(adjustment)
+        if target is None:
             # Log and mark as failed if neither product nor variant is set
             logger.error(f"ProductStockAdjustment {adjustment.pk} has neither product nor variant set. Marking as failed.")
-            adjustment.status = 'failed'
-            adjustment.error_message = "Neither product nor variant specified."
-            adjustment.save(update_fields=['status', 'error_message'])
+            _fail_adjustment(adjustment, "Neither product nor variant specified.")
+            invalid_adjustments.append(adjustment)
             continue # Skip this adjustment
+        all_codes_to_sync.add(target.product.code if item_type == 'variant' else target.code)
+        valid_adjustments.append(adjustment)
+    _save_adjustment_statuses(invalid_adjustments, worker_id)
+    failed_adjustments.extend(invalid_adjustments)
 
     if not all_codes_to_sync:
         logger.info("No valid product/variant codes found in pending adjustments after initial check.")
+        run.add_rows(failed=len(failed_adjustments))
         return True
-    
+
     logger.info(f"Syncing current stock for {len(all_codes_to_sync)} items from simple API before batch adjustment.")
     try:
-        sync_success = sync_products_simple_from_api(codes=list(all_codes_to_sync))
-        if not sync_success:
-            # If initial sync fails, we can't reliably calculate new stock.
-            # Mark all relevant adjustments as failed or retry the whole task.
-            raise Exception("Failed to perform initial stock sync from Upgates API. Cannot proceed with adjustments.")
+        presync_started = time.monotonic()
+        with run.phase(SyncPhase.PRESYNC):
+            request_count, updated_products, updated_variants = _presync_stock_levels(all_codes_to_sync)
+        presync_seconds = time.monotonic() - presync_started
+        logger.info(
+            f"Targeted pre-sync refreshed the stock of {updated_products} products and {updated_variants} variants "
+            f"with {request_count} requests in {presync_seconds:.2f}s."
+        )
+        run.note(presync_requests=request_count, presync_products=updated_products, presync_variants=updated_variants)
     except Exception as e:
-        # Mark all currently selected adjustments as failed due to sync error
-        for adjustment in pending_adjustments:
-            # Ensure the adjustment is still pending before marking failed (could have been processed by another task)
-            if adjustment.status == 'pending': 
-                adjustment.status = 'failed'
-                adjustment.error_message = f"Initial stock sync failed: {e}"
-                adjustment.save(update_fields=['status', 'error_message'])
+        # If the pre-sync fails, we can't reliably calculate new stock.
+        # Mark all adjustments of the batch as failed due to sync error
+        for adjustment in valid_adjustments:
+            _fail_adjustment(adjustment, f"Initial stock sync failed: {e}")
+        _save_adjustment_statuses(valid_adjustments, worker_id)
+        run.add_rows(failed=len(failed_adjustments) + len(valid_adjustments))
         logger.error(f"Critical error during initial stock sync for batch adjustments: {e}", exc_info=True)
         return False # Indicate overall failure
-    
-    # Prepare batch update payload and update adjustment statuses to 'processing'
-    batch_update_payload = []
-    adjustments_to_process = [] # Keep track of adjustments that will be part of the batch
-    
-    # Re-fetch pending adjustments to ensure they are still in 'pending' status
-    # (in case another process tried to grab them between initial fetch and sync)
-    # Using the IDs collected from the initial query.
-    re_fetched_adjustments = ProductStockAdjustment.objects.filter(
-        pk__in=[adj.pk for adj in pending_adjustments],
-        status='pending' # Only consider those still pending
-    ).order_by('created_at').select_for_update()
 
+    # Prepare batch update payload
+    batch_update_payload = []
+    adjustments_to_process = [] # Adjustments that are part of the batch
+    sku_adjustments = {} # (item type, target pk) -> [target, net delta, contributing adjustments], oldest first
+
+    # Re-fetch the claimed adjustments together with the stock of their targets as just synced
+    # (adjustments whose lease ran out and were claimed by another worker in the meantime are dropped)
+    re_fetched_adjustments = list(
+        ProductStockAdjustment.objects.filter(pk__in=[adj.pk for adj in valid_adjustments], status='processing', claimed_by=worker_id)
+        .select_related('product', 'variant__product')
+        .order_by('created_at')
+    )
+    now = timezone.now()
+    unprocessable_adjustments = []
     for adjustment in re_fetched_adjustments:
-        # Use a nested transaction for each individual adjustment's status update
-        # This allows us to mark individual adjustments as processing/completed/failed
-        # even if the batch API call itself fails for some items.
-        with transaction.atomic():
-            target_obj = None
-            current_local_stock = None
-            item_type_for_api = None
-            target_code = None
-
-            if adjustment.variant:
-                target_obj = ProductVariant.objects.get(pk=adjustment.variant.pk) # Get latest from DB
-                current_local_stock = target_obj.stock
-                item_type_for_api = 'variant'
-                target_code = target_obj.code
-            elif adjustment.product:
-                target_obj = Product.objects.get(pk=adjustment.product.pk) # Get latest from DB
-                current_local_stock = target_obj.stock
-                item_type_for_api = 'product'
-                target_code = target_obj.code
-            else:
-                # Should be caught by earlier clean() or explicit check
-                logger.error(f"Adjustment {adjustment.pk} has no valid target after initial sync. Marking failed.")
-                adjustment.status = 'failed'
-                adjustment.error_message = "No valid product/variant target found."
-                adjustment.save(update_fields=['status', 'error_message'])
-                continue # Skip to next adjustment
-
-            if current_local_stock is None:
-                logger.error(f"Current stock for {target_code} is None after API sync. Marking adjustment {adjustment.pk} as failed.")
-                adjustment.status = 'failed'
-                adjustment.error_message = f"Current stock for {target_code} is null after sync."
-                adjustment.save(update_fields=['status', 'error_message'])
-                continue
+        target, item_type = _adjustment_target(adjustment)
+        if target.stock is None:
+            logger.error(f"Current stock for {target.code} is None after API sync. Marking adjustment {adjustment.pk} as failed.")
+            _fail_adjustment(adjustment, f"Current stock for {target.code} is null after sync.")
+            unprocessable_adjustments.append(adjustment)
+            continue
 
-            new_stock_level = current_local_stock + adjustment.adjustment_quantity
-            logger.info(f"Preparing adjustment {adjustment.pk} for {target_code}: {current_local_stock} + {adjustment.adjustment_quantity} = {new_stock_level}")
-
-            # Prepare item for batch payload (ASSUMED STRUCTURE)
-            batch_item = {
-                "code": target_code,
-                "stock": new_stock_level,
-                "type": item_type_for_api, # Indicate if it's a product or variant
-            }
-            # # If variant, you might need product_code in the batch item based on Upgates API.
-            # if item_type_for_api == 'variant':
-            #      batch_item['product_code'] = target_obj.product.code # Assumed Upgates requires parent product code for variant updates
-
-            batch_update_payload.append(batch_item)
-            adjustments_to_process.append(adjustment) # Keep track of which adjustment corresponds to which item in payload
-            
-            # Mark as processing (status change will be saved later in this atomic block)
-            adjustment.status = 'processing'
-            adjustment.processed_at = timezone.now()
-            adjustment.save(update_fields=['status', 'processed_at'])
+        sku = sku_adjustments.setdefault((item_type, target.pk), [target, 0, []])
+        sku[1] += adjustment.adjustment_quantity
+        sku[2].append(adjustment)
+        adjustment.processed_at = now
+    _save_adjustment_statuses(unprocessable_adjustments, worker_id)
+    failed_adjustments.extend(unprocessable_adjustments)
+
+    # Renew the lease for the push. Items with an adjustment this worker no longer holds are not pushed,
+    # their remaining adjustments return to the pool when the lease expires.
+    held_pks = _renew_stock_adjustment_claims(worker_id, [adj for _, _, adjs in sku_adjustments.values() for adj in adjs], lease_seconds)
+    for sku_key, (target, net_delta, adjustments) in list(sku_adjustments.items()):
+        if any(adjustment.pk not in held_pks for adjustment in adjustments):
+            logger.warning(f"Lost the claim on adjustments of {target.code}, not pushing it.")
+            del sku_adjustments[sku_key]
+            continue
+        adjustments_to_process.extend(adjustments)
+
+    # One payload item per product/variant with the net delta of all its adjustments
+    new_stock_levels = {} # (item type, target pk) -> stock level sent to the API
+    for (item_type, target_pk), (target, net_delta, adjustments) in sku_adjustments.items():
+        new_stock_level = target.stock + net_delta
+        logger.info(
+            f"Preparing {len(adjustments)} adjustment(s) for {target.code}: {target.stock} + {net_delta} = {new_stock_level} "
+            f"(adjustments {', '.join(str(adjustment.pk) for adjustment in adjustments)})"
+        )
+        batch_update_payload.append({
+            "code": target.code,
+            "stock": new_stock_level,
+            "type": item_type, # Indicate if it's a product or variant
+        })
+        new_stock_levels[item_type, target_pk] = new_stock_level
+    if len(batch_update_payload) < len(adjustments_to_process):
+        logger.info(f"Aggregated {len(adjustments_to_process)} adjustments into {len(batch_update_payload)} items.")
+    run.note(adjustments=len(adjustments_to_process), pushed_items=len(batch_update_payload))
 
     # If no valid adjustments to process, return early
     if not batch_update_payload:
         logger.info("No valid adjustments to process in batch after pre-checks.")
+        run.add_rows(failed=len(failed_adjustments))
         return True # Nothing to do
-    
-    # Send batch update to Upgates API
-    try:
-        logger.info(f"Sending batch update to Upgates API for {len(batch_update_payload)} items.")
-        # transform batch_update_payload to match Upgates API expected structure
-        # API expects a list of products with their updated stock and list of variants
-        products = [item for item in batch_update_payload if item['type'] == 'product']
-        varinats = [item for item in batch_update_payload if item['type'] == 'variant']
-
-        for item in products:
-            item.pop('type', None)
-
-        for item in varinats:
-            item.pop('type', None)
-
-        if not products:
-            products = None
-        if not varinats:
-            varinats = None
-
-        batch_update_payload = {
-            "products": products,
-            "variants": varinats 
-        }
-
-        response, return_code = api_client.put_product_data(data=batch_update_payload)
-        
-        # Check if the response indicates success
-        logger.info(f"Batch update response: {response}")
-
-        if not response:
-            raise Exception("Batch update failed with no success flag in response.")
-    
-    except Exception as e:
-        logger.error(f"Batch update to Upgates API failed: {e}", exc_info=True)
-        # Mark all adjustments as failed due to API error
-        for adjustment in adjustments_to_process:
-            if adjustment.status == 'processing':
-                adjustment.status = 'failed'
-                adjustment.error_message = f"Batch update failed: {e}"
-                adjustment.save(update_fields=['status', 'error_message'])
-        return False
 
-    response_item_lookup = {}
-    for item in response.get('products', []):
-        # Add the product itself to the lookup (if it has a code)
-        if 'code' in item:
-            response_item_lookup[item['code']] = item
+    # Send the batch to Upgates API in size-bounded chunks, several requests at a time
+    max_items = max(1, get_int_app_setting('UPGATES_STOCK_PUSH_MAX_ITEMS', 100))
+    max_bytes = max(1, get_int_app_setting('UPGATES_STOCK_PUSH_MAX_BYTES', 256 * 1024))
+    max_workers = max(1, get_int_app_setting('UPGATES_STOCK_PUSH_MAX_WORKERS', get_int_app_setting('UPGATES_API_MAX_WORKERS', 4)))
+    chunks = list(_chunk_push_items(list(zip(sku_adjustments, batch_update_payload)), max_items, max_bytes))
+    logger.info(f"Sending batch update to Upgates API for {len(batch_update_payload)} items in {len(chunks)} requests.")
+    run.note(push_requests=len(chunks))
 
-        # Add its variants to the lookup
-        if 'variants' in item and item['variants']:
-            for variant in item['variants']:
-                if 'code' in variant:
-                    response_item_lookup[variant['code']] = variant
-    
-    processed_adjustments = []
-    for adjustment in adjustments_to_process:
-        # Fix: Safely get the code by checking for None first
-        adjustment_code = None
-        if adjustment.variant:
-            adjustment_code = adjustment.variant.code
-        elif adjustment.product:
-            adjustment_code = adjustment.product.code
-
-        if adjustment_code is None:
-            logger.error(f"Adjustment {adjustment.pk} has no valid code after API sync. Marking as failed.")
-            adjustment.status = 'failed'
-            adjustment.error_message = "No valid product/variant code found."
-            adjustment.save(update_fields=['status', 'error_message'])
+    response_item_lookup = {}
+    failed_chunk_errors = {} # SKU key -> error of the request its item was sent in
+    with run.phase(SyncPhase.API_PUSH), ThreadPoolExecutor(
+        max_workers=min(max_workers, len(chunks)), thread_name_prefix='upgates-push'
+    ) as executor:
+        # Requests run in the caller's context, so they are counted in the current sync run
+        futures = [
+            executor.submit(contextvars.copy_context().run, _push_stock_chunk, api_client, [item for _, item in chunk])
+            for chunk in chunks
+        ]
+        for chunk, future in zip(chunks, futures):
+            try:
+                response_item_lookup.update(future.result())
+            except Exception as e:
+                logger.error(f"Batch update of {len(chunk)} items to Upgates API failed: {e}", exc_info=True)
+                failed_chunk_errors.update((sku_key, e) for sku_key, _ in chunk)
+
+    # Fan the result of every pushed item back out to the adjustments it was aggregated from
+    completed_adjustments = []
+    updated_targets = {'product': [], 'variant': []} # Targets with the new stock
+    now = timezone.now()
+    for (item_type, target_pk), (target, net_delta, adjustments) in sku_adjustments.items():
+        if (item_type, target_pk) in failed_chunk_errors:
+            # The request carrying this item failed, the other chunks are unaffected
+            for adjustment in adjustments:
+                _fail_adjustment(adjustment, f"Batch update failed: {failed_chunk_errors[item_type, target_pk]}")
+            failed_adjustments.extend(adjustments)
             continue
 
-        corresponding_item = response_item_lookup.get(adjustment_code) # Use .get() to avoid KeyError
+        corresponding_item = response_item_lookup.get(target.code)
 
         if corresponding_item is None:
-            logger.warning(f"No corresponding item found in API response for adjustment {adjustment.pk} with code '{adjustment_code}'.")
-            adjustment.status = 'failed'
-            adjustment.error_message = f"No corresponding product/variant found in API response for code '{adjustment_code}'."
-            adjustment.save(update_fields=['status', 'error_message'])
+            logger.warning(f"No corresponding item found in API response for code '{target.code}' ({len(adjustments)} adjustment(s)).")
+            for adjustment in adjustments:
+                _fail_adjustment(adjustment, f"No corresponding product/variant found in API response for code '{target.code}'.")
+            failed_adjustments.extend(adjustments)
             continue
 
-        if corresponding_item['updated_yn']:
-            logger.info(f"Found match for '{adjustment_code}': {corresponding_item['code']}")
-            processed_adjustments.append({
-                'adjustment': adjustment,
-                'matched_item': corresponding_item
-            })
-            with transaction.atomic():
-                try:
-                    adjustment_item = adjustment.variant if adjustment.variant else adjustment.product
-                    if adjustment_item:
-                        # Update the stock in the local DB
-                        adjustment_item.stock = adjustment_item.stock + adjustment.adjustment_quantity
-                        adjustment_item.save(update_fields=['stock', 'uma_last_synced_at'])
-                except Exception as e:
-                    logger.error(f"Error updating stock for adjustment {adjustment.pk} with code '{adjustment_code}': {e}")
-                    adjustment.status = 'failed'
-                    adjustment.error_message = f"Error updating stock: {e}"
-                    adjustment.save(update_fields=['status', 'error_message'])
-                    continue
-                # Update the adjustment status to 'completed'
-                adjustment.status = 'completed'
-                adjustment.processed_at = timezone.now()
-                adjustment.api_response_data = corresponding_item
-                adjustment.save(update_fields=['status', 'processed_at', 'api_response_data'])
         if not corresponding_item['updated_yn']:
-            logger.warning(f"Item '{adjustment_code}' was not updated in the API response. Marking adjustment as failed.")
-            adjustment.status = 'failed'
-            adjustment.error_message = f"Item '{adjustment_code}' was not updated in the API response."
+            logger.warning(f"Item '{target.code}' was not updated in the API response. Marking {len(adjustments)} adjustment(s) as failed.")
+            for adjustment in adjustments:
+                _fail_adjustment(adjustment, f"Item '{target.code}' was not updated in the API response.", corresponding_item)
+            failed_adjustments.extend(adjustments)
+            continue
+
+        logger.info(f"Found match for '{target.code}': {corresponding_item['code']}")
+        target.stock = new_stock_levels[item_type, target_pk]
+        target.uma_last_synced_at = now # auto_now isn't applied by bulk_update
+        target.uma_sync_digest = None # Out-of-band change, next full sync must rewrite the row
+        updated_targets[item_type].append(target)
+        for adjustment in adjustments:
+            adjustment.status = 'completed'
+            adjustment.processed_at = now
             adjustment.api_response_data = corresponding_item
-            adjustment.save(update_fields=['status', 'error_message', 'api_response_data'])
+        completed_adjustments.extend(adjustments)
 
-    if not batch_update_payload:
-        logger.info("No valid adjustments to process in batch after pre-checks.")
-        return True
-    return True
\ No newline at end of file
+    try:
+        with transaction.atomic():
+            Product.objects.bulk_update(updated_targets['product'], ADJUSTMENT_TARGET_FIELDS)
+            ProductVariant.objects.bulk_update(updated_targets['variant'], ADJUSTMENT_TARGET_FIELDS)
+            lost_pks = _save_adjustment_statuses(adjustments_to_process, worker_id)
+    except Exception as e:
+        logger.error(f"Error updating local stock for {len(completed_adjustments)} completed adjustments: {e}")
+        for adjustment in completed_adjustments:
+            _fail_adjustment(adjustment, f"Error updating stock: {e}")
+        failed_adjustments.extend(completed_adjustments)
+        completed_adjustments = []
+        lost_pks = _save_adjustment_statuses(adjustments_to_process, worker_id)
+
+    if lost_pks:
+        # Counted by the worker that holds them now
+        run.note(lost_claims=len(lost_pks))
+        completed_adjustments = [adjustment for adjustment in completed_adjustments if adjustment.pk not in lost_pks]
+        failed_adjustments = [adjustment for adjustment in failed_adjustments if adjustment.pk not in lost_pks]
+    run.add_rows(updated=len(completed_adjustments), failed=len(failed_adjustments))
+    return not failed_chunk_errors
@@ -3,28 +3,36 @@ from celery import shared_task
 from django.utils import timezone
 import logging
 
+from .constants import SyncPhase, SyncType
+from .instrumentation import last_sync_run
+from .locks import single_flight_task
 from .sync_logic import *
 
 logger = logging.getLogger(__name__)
 
 @shared_task(bind=True, default_retry_delay=300, max_retries=5)
+@single_flight_task(SyncType.ORDERS)
 def sync_orders_task(self, creation_time_from=None, status_ids=None):
     """
     Celery task to synchronize orders from Upgates API.
     `creation_time_from` can be passed as ISO format string if triggered from API.
+    Without it, only orders modified since the stored high-water mark of the `status_ids` filter are requested.
     """
     logger.info("Starting Upgates order sync task.")
     try:
+        last_update_time_from = None
         # Convert string to datetime object if provided
         if creation_time_from:
             creation_time_from = datetime.fromisoformat(creation_time_from) # Assuming ISO format string
         else:
-            # Default to one day ago if no timestamp is provided
-            creation_time_from = timezone.now() - timezone.timedelta(days=1)
-            # strip time part for consistency
-            creation_time_from = creation_time_from.replace(hour=0, minute=0, second=0, microsecond=0).replace(tzinfo=None)
+            last_update_time_from = get_orders_watermark(status_ids)
+            if last_update_time_from is None:
+                # Default to one day ago if there is no high-water mark yet
+                creation_time_from = timezone.now() - timezone.timedelta(days=1)
+                # strip time part for consistency
+                creation_time_from = creation_time_from.replace(hour=0, minute=0, second=0, microsecond=0).replace(tzinfo=None)
 
-        success = sync_orders_from_api(creation_time_from=creation_time_from, status_ids=status_ids)
+        success = sync_orders_from_api(creation_time_from=creation_time_from, status_ids=status_ids, last_update_time_from=last_update_time_from)
         if success:
             logger.info("Upgates order sync task completed successfully.")
         else:
@@ -58,13 +66,15 @@ def debug_task():
     print("DEBUG TASK RAN TO CONSOLE!") # Also print to console for direct visibility
 
 @shared_task(bind=True, default_retry_delay=300, max_retries=5)
-def sync_full_products_task(self):
+@single_flight_task(SyncType.PRODUCTS_FULL)
+def sync_full_products_task(self, force=False):
     """
     Celery task to synchronize FULL product data from Upgates XML feed.
+    `force` re-processes the feed even if it hasn't changed since the last sync.
     """
     logger.info("Starting Upgates FULL product sync task.")
     try:
-        success = sync_products_from_full_feed()
+        success = sync_products_from_full_feed(force=force)
         if success:
             logger.info("Upgates FULL product sync task completed successfully.")
         else:
@@ -74,13 +84,15 @@ def sync_full_products_task(self):
         raise self.retry(exc=e)
 
 @shared_task(bind=True, default_retry_delay=60, max_retries=3) # Shorter retry for more frequent updates
-def sync_partial_products_task(self):
+@single_flight_task(SyncType.PRODUCTS_PARTIAL)
+def sync_partial_products_task(self, force=False):
     """
     Celery task to synchronize PARTIAL product data (e.g., stock/price) from Upgates XML feed.
+    `force` re-processes the feed even if it hasn't changed since the last sync.
     """
     logger.info("Starting Upgates PARTIAL product sync task.")
     try:
-        success = sync_products_from_partial_feed()
+        success = sync_products_from_partial_feed(force=force)
         if success:
             logger.info("Upgates PARTIAL product sync task completed successfully.")
         else:
@@ -90,6 +102,7 @@ def sync_partial_products_task(self):
         raise self.retry(exc=e)
     
 @shared_task(bind=True, default_retry_delay=300, max_retries=5)
+@single_flight_task(SyncType.PRODUCTS_SIMPLE)
 def sync_products_simple_task(self, codes=None):
     """
     Celery task to synchronize products from Upgates API.
@@ -112,6 +125,9 @@ def process_stock_adjustments_task(self):
     """
     Celery task to process stock adjustments from Upgates API.
     This will call the sync logic to handle adjustments.
+    Each task processes one claimed slice of the pending adjustments and queues a follow-up task while the slice
+    was full, so several of these tasks can run in parallel and drain a backlog (they don't take the sync lock).
+    The task result reports the recorded run and the time spent in the targeted stock pre-sync.
     """
     logger.info("Starting Upgates stock adjustments processing task.")
     try:
@@ -121,6 +137,40 @@ def process_stock_adjustments_task(self):
         else:
             logger.warning("Upgates stock adjustments processing task completed with some issues.")
             # self.retry(countdown=600)
+        sync_run = last_sync_run()
+        if sync_run and sync_run.details.get('claimed', 0) >= sync_run.details.get('claim_size', 1):
+            logger.info("Claimed a full slice of stock adjustments, queueing the next one.")
+            process_stock_adjustments_task.delay()
+        return {
+            'success': success,
+            'run_id': sync_run.pk if sync_run else None,
+            'duration_seconds': sync_run.duration_seconds if sync_run else None,
+            'presync_seconds': sync_run.phase_durations.get(SyncPhase.PRESYNC) if sync_run else None,
+        }
     except Exception as e:
         logger.error(f"Upgates stock adjustments processing task failed: {e}", exc_info=True)
-        raise self.retry(exc=e)
\ No newline at end of file
+        raise self.retry(exc=e)
+
+@shared_task
+def merge_full_feed_range_task(stats, kind, generation, code_hash_range, run_id=None):
+    """
+    Celery subtask of the fan-out FULL product sync: merges one code hash range of the staged products or variants.
+    Chained per lane, so `stats` is the result of the previous range of the lane.
+    """
+    return merge_full_feed_fanout_range(stats, kind, generation, code_hash_range, run_id)
+
+@shared_task
+def merge_full_feed_variants_task(product_lane_stats, generation, run_id, feed_state_key, feed_validators):
+    """Chord callback of the fan-out FULL product sync: products are merged, fans out the variant ranges."""
+    return merge_full_feed_fanout_variants(product_lane_stats, generation, run_id, feed_state_key, feed_validators)
+
+@shared_task
+def finish_full_feed_fanout_task(variant_lane_stats, product_stats, generation, run_id, feed_state_key, feed_validators):
+    """Chord callback of the fan-out FULL product sync: deactivates missing products and records the run totals."""
+    logger.info(f"All fan-out ranges of full sync generation {generation} merged, finishing the sync.")
+    return finish_full_feed_fanout(variant_lane_stats, product_stats, generation, run_id, feed_state_key, feed_validators)
+
+@shared_task
+def fail_full_feed_fanout_task(request, exc, traceback, run_id=None):
+    """Error handler of the fan-out FULL product sync chord."""
+    fail_full_feed_fanout(run_id, exc)
@@ -1,3 +1,332 @@
+import importlib.util
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from http.server import ThreadingHTTPServer
+from unittest import mock, skipUnless
+from celery import chord
+from celery.exceptions import Retry
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError
 from django.test import TestCase
+from djanproj.celery import app as celery_app
+from apps.djangocore.utils import set_app_setting
+from apps.orders.models import Order
+from apps.products.models import Product, ProductVariant
+from . import sync_logic, tasks, xml_parser
+from .api_client import UpgatesAPIClient
+from .management.commands.benchmark_feed_parser import write_synthetic_feed
+from .constants import SyncPhase, SyncRunStatus, SyncType
+from .feed_client import FULL_FEED_STATE_KEY, UpgatesFeedClient
+from .models import StagedProduct, StagedProductVariant, SyncRun
+from .sync_logic import ORDERS_WATERMARK_KEY, sync_products_from_full_feed
+from .xml_parser import BACKEND_LXML, BACKEND_STDLIB, UpgatesProductXMLParser, lxml_etree, parse_xml_string
 
-# Create your tests here.
+SAMPLE_FULL_FEED = settings.BASE_DIR.parent / 'export-full.xml'
+SAMPLE_FEEDS = [SAMPLE_FULL_FEED, settings.BASE_DIR.parent / 'export-partial.xml']
+
+def _load_request_logger_server():
+    """Imports request_logger_server.py (next to the sample exports) without its root logging setup."""
+    spec = importlib.util.spec_from_file_location('request_logger_server', settings.BASE_DIR.parent / 'request_logger_server.py')
+    module = importlib.util.module_from_spec(spec)
+    with mock.patch('logging.basicConfig'):
+        spec.loader.exec_module(module)
+    module.logger.setLevel(logging.WARNING)
+    return module
+
+def _sample_feed_codes(path=SAMPLE_FULL_FEED):
+    """Distinct (product codes, variant codes) of a sample feed, as the full sync sees them."""
+    product_codes = set()
+    variant_codes = set()
+    for product in UpgatesProductXMLParser().iter_products_data(str(path)):
+        if product.code:
+            product_codes.add(product.code)
+            variant_codes.update(variant.code for variant in product.variants if variant.code)
+    return product_codes, variant_codes
+
+class FeedServerMixin:
+    """
+    Serves the sample exports over HTTP with request_logger_server.py, which sends ETag/Last-Modified and 304s.
+    A test class can serve the exports of its own `feed_dir` instead.
+    """
+    feed_dir = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        server_module = _load_request_logger_server()
+        if cls.feed_dir is not None:
+            # The server serves the exports next to itself
+            server_module.__file__ = os.path.join(cls.feed_dir, 'request_logger_server.py')
+
+        class QuietHandler(server_module.RequestLoggerHandler):
+            def log_message(self, format, *args):
+                pass
+
+        cls.feed_server = ThreadingHTTPServer(('127.0.0.1', 0), QuietHandler)
+        threading.Thread(target=cls.feed_server.serve_forever, daemon=True).start()
+        cls.feed_base_url = f"http://127.0.0.1:{cls.feed_server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.feed_server.shutdown()
+        cls.feed_server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        cache.clear() # App settings are cached, and the cache outlives the test transaction
+        set_app_setting('UPGATES_PRODUCTS_FULL_XML_URL', f"{self.feed_base_url}/export-full.xml")
+        set_app_setting('UPGATES_PRODUCTS_AVAIBILITY_XML_URL', f"{self.feed_base_url}/export-partial.xml")
+
+@skipUnless(lxml_etree is not None, "lxml is not installed")
+class XMLBackendParityTests(TestCase):
+    """The lxml and stdlib backends must produce the same records for the sample feeds."""
+
+    def _parse(self, path, backend):
+        return list(UpgatesProductXMLParser(backend=backend).iter_products_data(str(path)))
+
+    def test_streaming_parse_parity(self):
+        for path in SAMPLE_FEEDS:
+            with self.subTest(feed=path.name):
+                stdlib_records = self._parse(path, BACKEND_STDLIB)
+                self.assertTrue(stdlib_records)
+                self.assertEqual(self._parse(path, BACKEND_LXML), stdlib_records)
+
+    def test_parsed_tree_parity(self):
+        for path in SAMPLE_FEEDS:
+            with self.subTest(feed=path.name):
+                content = path.read_bytes()
+                records = {
+                    backend: list(UpgatesProductXMLParser(parse_xml_string(content, backend=backend), backend=backend).iter_products_data())
+                    for backend in (BACKEND_STDLIB, BACKEND_LXML)
+                }
+                self.assertEqual(records[BACKEND_LXML], records[BACKEND_STDLIB])
+                # The tree and the streaming parse agree too
+                self.assertEqual(records[BACKEND_STDLIB], self._parse(path, BACKEND_STDLIB))
+
+class DaemonicParallelParseTests(TestCase):
+    """Celery prefork pool workers are daemonic; the parallel parse must still run there."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.feed_dir = tempfile.mkdtemp(prefix='upgates-test-')
+        cls.feed_path = os.path.join(cls.feed_dir, 'export-full.xml')
+        write_synthetic_feed(SAMPLE_FULL_FEED, 6, cls.feed_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.feed_dir)
+        super().tearDownClass()
+
+    def _parse_in_daemon(self):
+        daemon_process = mock.Mock(daemon=True)
+        with mock.patch.object(xml_parser.multiprocessing, 'current_process', return_value=daemon_process):
+            # One byte per chunk: every product is a range of its own
+            return list(UpgatesProductXMLParser().iter_products_data_parallel(self.feed_path, workers=2, chunk_bytes=1))
+
+    def test_parses_with_a_billiard_pool(self):
+        with open(self.feed_path, 'rb') as feed_file:
+            expected = list(UpgatesProductXMLParser().iter_products_data(feed_file))
+        with mock.patch.object(xml_parser, '_BilliardParsePool', wraps=xml_parser._BilliardParsePool) as pool:
+            self.assertEqual(self._parse_in_daemon(), expected)
+        pool.assert_called_once_with(2)
+
+    def test_warns_when_parallel_parsing_is_disabled(self):
+        with mock.patch.object(xml_parser, 'billiard', None), \
+                self.assertLogs('apps.upgates_integration.xml_parser', 'WARNING') as logs:
+            self.assertEqual(len(self._parse_in_daemon()), 6)
+        self.assertIn("Parallel feed parsing (2 workers) is disabled", logs.output[0])
+
+class ConditionalFeedDownloadTests(FeedServerMixin, TestCase):
+    """A feed that was processed and hasn't changed since is answered with a 304 and not processed again."""
+
+    def _download(self):
+        """Downloads the full feed conditionally; returns the FeedDownload (its file is closed) and the client's logs."""
+        with self.assertLogs('apps.upgates_integration.feed_client', 'INFO') as logs:
+            with UpgatesFeedClient()._download_xml_feed(f"{self.feed_base_url}/export-full.xml", FULL_FEED_STATE_KEY) as download:
+                return download, '\n'.join(logs.output)
+
+    def test_processed_feed_is_not_downloaded_again(self):
+        download, _ = self._download()
+        self.assertFalse(download.unchanged)
+        self.assertEqual(download.size, SAMPLE_FULL_FEED.stat().st_size)
+        self.assertTrue(download.etag)
+        self.assertTrue(download.last_modified)
+
+        # Not processed yet: downloaded again
+        self.assertFalse(self._download()[0].unchanged)
+
+        UpgatesFeedClient().mark_feed_processed(download)
+        download, logs = self._download()
+        self.assertTrue(download.unchanged)
+        self.assertIsNone(download.file)
+        self.assertIn("(HTTP 304)", logs)
+
+    def test_same_content_counts_as_unchanged(self):
+        download, _ = self._download()
+        download.etag = '"stale"' # e.g. a server that changes the ETag on every deploy
+        UpgatesFeedClient().mark_feed_processed(download)
+
+        download, logs = self._download()
+        self.assertTrue(download.unchanged)
+        self.assertIn("same content as the last processed one", logs)
+        # The fresh validators are stored, so the next download is a 304
+        self.assertIn("(HTTP 304)", self._download()[1])
+
+    def test_unchanged_feed_skips_the_full_sync(self):
+        self.assertTrue(sync_products_from_full_feed())
+        synced_at = dict(Product.objects.values_list('code', 'uma_last_synced_at'))
+        self.assertTrue(synced_at)
+
+        with mock.patch.object(UpgatesProductXMLParser, 'iter_products_data_parallel') as parse:
+            self.assertTrue(sync_products_from_full_feed())
+        parse.assert_not_called()
+
+        first_run, second_run = SyncRun.objects.filter(sync_type=SyncType.PRODUCTS_FULL).order_by('pk')
+        self.assertEqual(first_run.rows_inserted, len(set().union(*_sample_feed_codes())))
+        self.assertEqual(second_run.status, SyncRunStatus.SUCCEEDED)
+        self.assertTrue(second_run.details['feed_unchanged'])
+        self.assertEqual(second_run.bytes_downloaded, 0)
+        self.assertEqual(second_run.rows_read, 0)
+        self.assertEqual(dict(Product.objects.values_list('code', 'uma_last_synced_at')), synced_at)
+
+class FanoutFullSyncTests(FeedServerMixin, TestCase):
+    """The fan-out full sync, with the Celery chords run eagerly in the test process."""
+
+    def setUp(self):
+        super().setUp()
+        set_app_setting('UPGATES_FULL_SYNC_MODE', 'fanout')
+        set_app_setting('UPGATES_FULL_SYNC_FANOUT_CHUNK_SIZE', '5')
+        self.addCleanup(setattr, celery_app.conf, 'task_always_eager', celery_app.conf.task_always_eager)
+        celery_app.conf.task_always_eager = True
+
+    def test_chord_callback_finishes_the_run(self):
+        product_codes, variant_codes = _sample_feed_codes()
+        with mock.patch.object(tasks, 'merge_full_feed_fanout_range', wraps=tasks.merge_full_feed_fanout_range) as merge_range:
+            self.assertTrue(sync_products_from_full_feed(force=True))
+        # One subtask per 5 staged rows and kind
+        self.assertEqual(merge_range.call_count, -(-len(product_codes) // 5) + -(-len(variant_codes) // 5))
+
+        # The callback finished the run before the coordinator returned, which must not reopen it
+        run = SyncRun.objects.get(sync_type=SyncType.PRODUCTS_FULL)
+        self.assertEqual(run.status, SyncRunStatus.SUCCEEDED)
+        self.assertIsNotNone(run.finished_at)
+        self.assertEqual(run.rows_read, len(product_codes) + len(variant_codes))
+        self.assertEqual(run.rows_inserted, len(product_codes) + len(variant_codes))
+        # Recorded by the coordinator before it detached the run
+        self.assertEqual(run.bytes_downloaded, SAMPLE_FULL_FEED.stat().st_size)
+        self.assertIn(SyncPhase.DOWNLOAD, run.phase_durations)
+
+        self.assertEqual(set(Product.objects.values_list('code', flat=True)), product_codes)
+        self.assertEqual(set(ProductVariant.objects.values_list('code', flat=True)), variant_codes)
+        self.assertFalse(StagedProduct.objects.exists())
+        self.assertFalse(StagedProductVariant.objects.exists())
+
+    def test_ranges_are_chained_into_concurrency_lanes(self):
+        set_app_setting('UPGATES_FULL_SYNC_FANOUT_CONCURRENCY', '3')
+        product_codes, variant_codes = _sample_feed_codes()
+        with mock.patch('celery.chord', wraps=chord) as fanout_chord:
+            self.assertTrue(sync_products_from_full_feed(force=True))
+        # 1 product range, 4 variant ranges in 3 lanes
+        self.assertEqual([len(call.args[0]) for call in fanout_chord.call_args_list], [1, 3])
+
+        # The lanes pass their row stats along, the totals are the same as with a task per range
+        run = SyncRun.objects.get(sync_type=SyncType.PRODUCTS_FULL)
+        self.assertEqual(run.status, SyncRunStatus.SUCCEEDED)
+        self.assertEqual(run.rows_inserted, len(product_codes) + len(variant_codes))
+        self.assertEqual(set(ProductVariant.objects.values_list('code', flat=True)), variant_codes)
+
+class OrderWatermarkTests(TestCase):
+    """Incremental order syncs against a fake /orders endpoint that honours the status and update time filters."""
+
+    def setUp(self):
+        cache.clear()
+        set_app_setting('UPGATES_API_BASE_URL', 'http://upgates.invalid')
+        set_app_setting('UPGATES_API_KEY', 'key')
+        set_app_setting('UPGATES_API_LOGIN', 'login')
+        self.api_orders = {}
+        patcher = mock.patch.object(UpgatesAPIClient, 'get_orders', autospec=True, side_effect=self._get_orders)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _put_order(self, order_number, status_id, last_update_time):
+        self.api_orders[order_number] = {
+            'order_number': order_number, 'order_id': int(order_number[1:]), 'uuid': f'uuid-{order_number}',
+            'status_id': status_id, 'creation_time': '2026-03-01T08:00:00+01:00', 'last_update_time': last_update_time,
+            'products': [],
+        }
+
+    def _get_orders(self, client, page=1, status_ids=None, last_update_time_from=None, creation_time_from=None):
+        orders = [
+            order for order in self.api_orders.values()
+            if (not status_ids or str(order['status_id']) in status_ids.split(';'))
+            and (not last_update_time_from or datetime.fromisoformat(order['last_update_time']) >= datetime.fromisoformat(last_update_time_from))
+        ]
+        return {'current_page': page, 'number_of_pages': 1, 'orders': orders}, 200
+
+    def test_filtered_run_does_not_advance_the_unfiltered_watermark(self):
+        self._put_order('O1', 1, '2026-03-01T10:00:00+01:00')
+        self._put_order('O2', 2, '2026-03-01T10:00:00+01:00')
+        set_app_setting(ORDERS_WATERMARK_KEY, '2026-03-01T09:00:00+01:00') # Left by an earlier scheduled run
+        tasks.sync_orders_task.apply()
+
+        # An order in another status changes before a status filtered run (the API trigger's default filter)
+        self._put_order('O2', 2, '2026-03-01T11:00:00+01:00')
+        self._put_order('O1', 1, '2026-03-01T12:00:00+01:00')
+        tasks.sync_orders_task.apply(kwargs={'status_ids': '1'})
+        self.assertEqual(Order.objects.get(order_number='O1').last_update_time, datetime.fromisoformat('2026-03-01T12:00:00+01:00'))
+
+        # The next unfiltered run still asks for everything modified since its own mark
+        tasks.sync_orders_task.apply()
+        self.assertEqual(Order.objects.get(order_number='O2').last_update_time, datetime.fromisoformat('2026-03-01T11:00:00+01:00'))
+
+class FullSyncResumeTests(FeedServerMixin, TestCase):
+    """A full sync that fails halfway is retried by its task and continues after the last committed chunk."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.feed_dir = tempfile.mkdtemp(prefix='upgates-test-')
+        write_synthetic_feed(SAMPLE_FULL_FEED, 6, os.path.join(cls.feed_dir, 'export-full.xml'))
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.feed_dir)
+
+    def test_retry_resumes_after_the_failed_chunk(self):
+        set_app_setting('UPGATES_PRODUCT_SYNC_BATCH_SIZE', '2')
+        written_chunks = []
+        sync_chunk = sync_logic._sync_full_feed_chunk
+
+        def sync_chunk_failing_once(products_data, *args):
+            written_chunks.append([product.code for product in products_data])
+            if len(written_chunks) == 3:
+                raise OperationalError("database is locked")
+            return sync_chunk(products_data, *args)
+
+        with mock.patch.object(sync_logic, '_sync_full_feed_chunk', side_effect=sync_chunk_failing_once), \
+                mock.patch.object(tasks.sync_full_products_task, 'retry', side_effect=Retry) as retry:
+            with self.assertLogs('apps.upgates_integration', 'ERROR'):
+                tasks.sync_full_products_task.apply()
+            retry.assert_called_once()
+            tasks.sync_full_products_task.apply() # The retry
+            retry.assert_called_once()
+
+        # The retry starts at the failed chunk, the first two chunks aren't written again
+        self.assertEqual(written_chunks, [
+            ['B000000', 'B000001'], ['B000002', 'B000003'], ['B000004', 'B000005'], ['B000004', 'B000005'],
+        ])
+        failed_run, retried_run = SyncRun.objects.filter(sync_type=SyncType.PRODUCTS_FULL).order_by('pk')
+        self.assertEqual(failed_run.status, SyncRunStatus.FAILED)
+        self.assertEqual(failed_run.details['failed_after_products'], 4)
+        self.assertEqual(retried_run.status, SyncRunStatus.SUCCEEDED)
+        self.assertEqual(retried_run.details['resumed_after_products'], 4)
+        self.assertEqual(retried_run.details['generation'], failed_run.details['generation'])
+        self.assertEqual(Product.objects.filter(uma_is_active=True).count(), 6)
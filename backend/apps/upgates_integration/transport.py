@@ -0,0 +1,105 @@
+import logging
+import os
+import socket
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from apps.djangocore.utils import get_float_app_setting, get_int_app_setting
+from .instrumentation import current_sync_run
+from .ratelimit import get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+class UpgatesRetry(Retry):
+    """
+    Retry policy for Upgates requests.
+    Connection errors and 5xx responses are retried for idempotent methods only (see allowed_methods),
+    HTTP 429 is retried for any method because a throttled request was not processed at all.
+    A retry is another request against the API quota, so it takes a rate limiter token after the backoff
+    (retries of feed downloads, which share the session, draw from the same bucket).
+    """
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 and self.total:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        waited = get_rate_limiter().acquire()
+        run = current_sync_run()
+        run.add_counts(http_retries=1)
+        if waited:
+            run.add_counts(api_throttled_calls=1, api_throttle_wait_seconds=waited)
+
+class KeepAliveHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that enables TCP keep-alive on pooled connections, so idle connections survive between calls."""
+    def __init__(self, keepalive_seconds=0, **kwargs):
+        self.keepalive_seconds = keepalive_seconds
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.keepalive_seconds > 0:
+            socket_options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1), (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+            if hasattr(socket, 'TCP_KEEPIDLE'): # Not available on all platforms (e.g. Windows, older macOS)
+                socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive_seconds))
+            if hasattr(socket, 'TCP_KEEPINTVL'):
+                socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, self.keepalive_seconds // 3)))
+            kwargs['socket_options'] = socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+def _build_session():
+    pool_size = max(1, get_int_app_setting('UPGATES_HTTP_POOL_SIZE', 10))
+    max_retries = max(0, get_int_app_setting('UPGATES_HTTP_MAX_RETRIES', 3))
+    retry = UpgatesRetry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS'}), # Only idempotent reads are retried on errors
+        status_forcelist=(429, 500, 502, 503, 504),
+        backoff_factor=get_float_app_setting('UPGATES_HTTP_BACKOFF_FACTOR', 0.5), # Exponential: factor * 2 ** (retry - 1)
+        backoff_jitter=get_float_app_setting('UPGATES_HTTP_BACKOFF_JITTER', 0.5), # Random extra delay, avoids retry storms
+        backoff_max=get_float_app_setting('UPGATES_HTTP_BACKOFF_MAX', 60),
+        respect_retry_after_header=True, # Honour Retry-After on 429/503
+        raise_on_status=False, # Return the last response so callers log the real status/body
+    )
+    adapter = KeepAliveHTTPAdapter(
+        keepalive_seconds=get_int_app_setting('UPGATES_HTTP_KEEPALIVE_SECONDS', 60),
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    logger.debug(f"Created Upgates HTTP session (pool size {pool_size}, max retries {max_retries}) in process {os.getpid()}.")
+    return session
+
+def get_session():
+    """
+    Returns the long-lived pooled HTTP session shared by all Upgates clients in this process.
+    The session is re-created after a fork (e.g. in Celery prefork workers), so processes never share sockets.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+def reset_session():
+    """Drops the shared session, e.g. after changing HTTP settings. The next get_session() builds a new one."""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_pid = None
@@ -1,13 +1,285 @@
 import xml.etree.ElementTree as ET
+import io
 import logging
+import mmap
+import multiprocessing
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+from .records import PriceRecord, ProductRecord, VariantRecord
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError: # lxml is optional; the stdlib parser is used without it
+    lxml_etree = None
+
+try:
+    import billiard # Installed with Celery
+except ImportError:
+    billiard = None
 
 logger = logging.getLogger(__name__)
 
+BACKEND_LXML = 'lxml'
+BACKEND_STDLIB = 'stdlib'
+DEFAULT_XML_BACKEND = BACKEND_LXML if lxml_etree is not None else BACKEND_STDLIB
+
+# Exceptions raised for malformed XML by either backend
+XML_PARSE_ERRORS = (ET.ParseError,) + ((lxml_etree.ParseError,) if lxml_etree is not None else ())
+
+def _resolve_backend(backend=None):
+    backend = backend or DEFAULT_XML_BACKEND
+    if backend == BACKEND_LXML and lxml_etree is None:
+        logger.warning("lxml is not installed, falling back to the stdlib XML parser.")
+        return BACKEND_STDLIB
+    if backend not in (BACKEND_LXML, BACKEND_STDLIB):
+        raise ValueError(f"Unknown XML backend '{backend}'.")
+    return backend
+
+def _lxml_parser_options():
+    # Match the stdlib tree: no comments or processing instructions as children, and never
+    # resolve external entities or touch the network; huge_tree lifts lxml's text/depth limits for big feeds
+    return {'remove_comments': True, 'remove_pis': True, 'resolve_entities': False, 'no_network': True, 'huge_tree': True}
+
+DEFAULT_PARSE_CHUNK_BYTES = 8 * 1024 * 1024
+HEADER_SCAN_BYTES = 64 * 1024
+
+# Start of a <PRODUCT> element, used to split a feed into byte ranges for parallel parsing
+PRODUCT_START_RE = re.compile(rb'<PRODUCT[\s/>]')
+ROOT_START_RE = re.compile(rb'<([A-Za-z_][\w.\-]*)(?:\s[^>]*)?>')
+
+def is_xml_element(obj):
+    """True for both xml.etree and lxml elements."""
+    return isinstance(obj, ET.Element) or (lxml_etree is not None and isinstance(obj, lxml_etree._Element))
+
+def parse_xml_string(content, backend=None):
+    """Parses an XML document (bytes) with the selected backend and returns the root element."""
+    if _resolve_backend(backend) == BACKEND_LXML:
+        return lxml_etree.fromstring(content, parser=lxml_etree.XMLParser(**_lxml_parser_options()))
+    return ET.fromstring(content)
+
+FIELD_TEXT = 'text'
+FIELD_LABEL = 'label' # Text from a small vocabulary (availability, units, ...), stored once per distinct value
+FIELD_DECIMAL = 'decimal'
+
+# Max distinct labels/decimals remembered by a parser; the caches are reset when they grow past this
+SHARED_VALUES_LIMIT = 10000
+
+# Field tables for the single-pass parser: child tag -> (record field, kind). The kind is FIELD_TEXT, FIELD_LABEL,
+# FIELD_DECIMAL or the name of the parser method for a nested element. Each <PRODUCT>/<VARIANT> is walked once
+# and the first child with a given tag wins, like element.find(tag). The *_DEFAULTS dicts give the record fields
+# that are read from the feed and the values used when an element is missing or has no text.
+PRODUCT_FIELDS = {
+    'CODE': ('code', FIELD_TEXT),
+    'PRODUCT_ID': ('product_id', FIELD_TEXT),
+    'MANUFACTURER': ('manufacturer', FIELD_LABEL),
+    'EAN': ('ean', FIELD_TEXT),
+    'SUPPLIER_CODE': ('supplier_code', FIELD_TEXT),
+    'AVAILABILITY': ('availability', FIELD_LABEL),
+    'STOCK': ('stock', FIELD_TEXT),
+    'STOCK_POSITION': ('stock_position', FIELD_LABEL),
+    'WEIGHT': ('weight', FIELD_DECIMAL),
+    'UNIT': ('unit', FIELD_LABEL),
+    'IMAGES': ('image_url', '_parse_main_image_url'),
+}
+PRODUCT_DEFAULTS = {
+    'code': None,
+    'product_id': None,
+    'title': None, # Read from .//DESCRIPTION[@language="cz"]/TITLE, see _get_title
+    'manufacturer': None,
+    'ean': None,
+    'supplier_code': None,
+    'availability': None,
+    'stock': '0',
+    'stock_position': None,
+    'weight': Decimal(0),
+    'unit': None,
+    'image_url': None,
+}
+
+VARIANT_FIELDS = {
+    'CODE': ('code', FIELD_TEXT),
+    'VARIANT_ID': ('variant_id', FIELD_TEXT),
+    'SUPPLIER_CODE': ('supplier_code', FIELD_TEXT),
+    'EAN': ('ean', FIELD_TEXT),
+    'AVAILABILITY': ('availability', FIELD_LABEL),
+    'STOCK': ('stock', FIELD_TEXT),
+    'STOCK_POSITION': ('stock_position', FIELD_LABEL),
+    'WEIGHT': ('weight', FIELD_DECIMAL),
+    'IMAGE_URL': ('image_url', FIELD_TEXT),
+    'PRICES': ('prices', '_parse_prices'),
+    'PARAMETERS': ('parameters', '_parse_parameters'),
+}
+VARIANT_DEFAULTS = {
+    'code': None,
+    'variant_id': None,
+    'supplier_code': None,
+    'ean': None,
+    'availability': None,
+    'stock': '0',
+    'stock_position': None,
+    'weight': Decimal(0),
+    'image_url': None,
+    'prices': None,
+    'parameters': None,
+}
+
+PRICELIST_FIELDS = {
+    'PRICE_ORIGINAL': ('price_original', FIELD_DECIMAL),
+    'PRICE_SALE': ('price_sale', FIELD_DECIMAL),
+    'PRICE_WITH_VAT': ('price_with_vat', FIELD_DECIMAL),
+    'PRICE_WITHOUT_VAT': ('price_without_vat', FIELD_DECIMAL),
+}
+PRICELIST_DEFAULTS = {
+    'price_original': None,
+    'price_sale': None,
+    'price_with_vat': None,
+    'price_without_vat': None,
+}
+
+class FeedLayout:
+    """Byte layout of a feed file split for parallel parsing."""
+    def __init__(self, header, footer, body_end, ranges):
+        self.header = header # Prolog and root start tag, prepended to every range
+        self.footer = footer # Root end tag, appended to every range
+        self.body_end = body_end
+        self.ranges = ranges # [(start, end)] covering the root's content, each starting at a <PRODUCT>
+
+def _split_feed(path, chunk_bytes):
+    """
+    Splits a feed file into byte ranges of roughly `chunk_bytes` that start at <PRODUCT> tags.
+    Every range is parsed as its own document (header + range + footer). A split that lands inside a product
+    (e.g. a nested PRODUCT) makes that document malformed, which iter_products_data_parallel detects.
+    Returns None if the file's prolog can't be handled (e.g. a DOCTYPE with an internal subset).
+    """
+    with open(path, 'rb') as feed_file, mmap.mmap(feed_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        size = len(data)
+        head = data[:HEADER_SCAN_BYTES]
+        pos = 3 if head.startswith(b'\xef\xbb\xbf') else 0 # UTF-8 BOM
+        # Skip the XML declaration, comments, processing instructions and a simple DOCTYPE
+        while True:
+            while pos < len(head) and head[pos:pos + 1].isspace():
+                pos += 1
+            if head.startswith(b'<?', pos):
+                end = head.find(b'?>', pos)
+                pos = end + 2 if end != -1 else -1
+            elif head.startswith(b'<!--', pos):
+                end = head.find(b'-->', pos)
+                pos = end + 3 if end != -1 else -1
+            elif head.startswith(b'<!', pos):
+                end = head.find(b'>', pos)
+                if end == -1 or b'[' in head[pos:end]:
+                    return None
+                pos = end + 1
+            else:
+                break
+            if pos == -1:
+                return None
+
+        root_match = ROOT_START_RE.match(head, pos)
+        if root_match is None or root_match.group(0).endswith(b'/>'):
+            return None
+        body_start = root_match.end()
+        body_end = data.rfind(b'</' + root_match.group(1), body_start)
+        if body_end == -1:
+            return None
+
+        first = PRODUCT_START_RE.search(data, body_start, body_end)
+        if first is None:
+            return None
+        ranges = []
+        start = first.start()
+        while start < body_end:
+            next_match = PRODUCT_START_RE.search(data, min(start + chunk_bytes, body_end), body_end)
+            end = next_match.start() if next_match is not None else body_end
+            ranges.append((start, end))
+            start = end
+        header = head[:body_start]
+        footer = b'</' + root_match.group(1) + b'>'
+        return FeedLayout(header, footer, body_end, ranges)
+
+class FeedRangeReader:
+    """File-like object that reads header + bytes [start, end) of a file + footer, for iterparse."""
+    def __init__(self, path, start, end, header, footer):
+        self.file = open(path, 'rb')
+        self.file.seek(start)
+        self.remaining = end - start
+        self.prefix = header
+        self.suffix = footer
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self.prefix) + self.remaining + len(self.suffix)
+        chunks = []
+        if self.prefix and size > 0:
+            chunks.append(self.prefix[:size])
+            self.prefix = self.prefix[size:]
+            size -= len(chunks[-1])
+        if self.remaining and size > 0:
+            chunk = self.file.read(min(size, self.remaining))
+            self.remaining -= len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+            if not chunk:
+                self.remaining = 0 # Truncated file
+        if not self.remaining and self.suffix and size > 0:
+            chunks.append(self.suffix[:size])
+            self.suffix = self.suffix[size:]
+        return b''.join(chunks)
+
+    def close(self):
+        self.file.close()
+
+def _parse_feed_range(path, start, end, header, footer, backend):
+    """Worker process entry point: parses one byte range of a feed into ProductRecords."""
+    reader = FeedRangeReader(path, start, end, header, footer)
+    try:
+        parser = UpgatesProductXMLParser(backend=backend)
+        return list(parser.iter_products_data(reader))
+    except XML_PARSE_ERRORS as e:
+        # Parser exceptions (lxml's in particular) don't always pickle; report a plain error instead
+        raise ValueError(f"XML parse error: {e}") from None
+    finally:
+        reader.close()
+
+class _BilliardParsePool:
+    """
+    The parts of ProcessPoolExecutor used by iter_products_data_parallel, on top of a billiard pool.
+    Unlike multiprocessing, billiard can start child processes from daemonic processes (Celery prefork pool workers).
+    """
+    def __init__(self, workers):
+        self.pool = billiard.get_context('spawn').Pool(workers)
+
+    def submit(self, fn, *args):
+        return _BilliardParseResult(self.pool.apply_async(fn, args))
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        # Queued ranges are parsed rather than cancelled: billiard's terminate() takes seconds to stop the pool,
+        # finishing the at most 2 * workers submitted ranges is quicker
+        self.pool.close()
+        if wait:
+            self.pool.join()
+
+class _BilliardParseResult:
+    def __init__(self, async_result):
+        self.async_result = async_result
+
+    def result(self):
+        return self.async_result.get()
+
 class UpgatesProductXMLParser:
-    def __init__(self, xml_root):
-        if not isinstance(xml_root, ET.Element):
-            raise ValueError("xml_root must be an ElementTree Element object.")
+    def __init__(self, xml_root=None, backend=None):
+        # xml_root is optional: streaming parsing (iter_products_data with a source) doesn't need a parsed tree
+        if xml_root is not None and not is_xml_element(xml_root):
+            raise ValueError("xml_root must be an ElementTree or lxml Element object.")
         self.xml_root = xml_root
+        # Backend for streaming parsing: lxml's C parser when installed, xml.etree otherwise
+        self.backend = _resolve_backend(backend)
+        # Feed values repeat a lot (prices, availability texts, parameter names); equal values are shared
+        # between records instead of being stored once per variant
+        self.labels = {}
+        self.decimals = {}
 
     def _get_text(self, element, tag, default=None):
         """Helper to safely get text from a sub-element."""
@@ -25,47 +297,134 @@ class UpgatesProductXMLParser:
 
     def _get_decimal(self, element, tag, default=None):
         """Helper to safely get decimal from a sub-element."""
-        text = self._get_text(element, tag)
+        return self._to_decimal(self._get_text(element, tag), tag, default)
+
+    def _to_decimal(self, text, tag, default=None):
+        """Converts element text to Decimal (exact, no float rounding); blank or invalid text gives the default."""
+        if text is not None:
+            text = text.strip()
         if text:
             try:
-                return float(text) # Convert to float, DecimalField will handle it
-            except ValueError:
+                return Decimal(text)
+            except InvalidOperation:
                 logger.warning(f"Could not convert '{text}' to decimal for tag '{tag}'.")
         return default
 
+    def _label(self, text):
+        """Stripped text, shared with earlier equal labels."""
+        text = text.strip()
+        labels = self.labels
+        label = labels.get(text)
+        if label is None:
+            if len(labels) >= SHARED_VALUES_LIMIT:
+                labels.clear()
+            label = labels[text] = text
+        return label
+
+    def _decimal(self, text, tag, default=None):
+        """Like _to_decimal, but shares the Decimal with earlier equal texts."""
+        if text is None:
+            return default
+        value = self.decimals.get(text)
+        if value is None:
+            try:
+                value = Decimal(text) # Decimal() ignores surrounding whitespace itself
+            except InvalidOperation:
+                # Blank or invalid text: default (with a warning for invalid values)
+                return self._to_decimal(text, tag, default)
+            if len(self.decimals) >= SHARED_VALUES_LIMIT:
+                self.decimals.clear()
+            self.decimals[text] = value
+        return value
+
+    def _parse_element(self, element, field_table, defaults):
+        """
+        Walks the direct children of `element` once and dispatches on the tag through `field_table`.
+        Returns a new dict with the keys of `defaults`. Children are visited last to first, so for repeated
+        tags the first occurrence is written last and wins, like element.find(tag).
+        """
+        data = defaults.copy()
+        for child in element[::-1]:
+            field = field_table.get(child.tag)
+            if field is None:
+                continue
+            key, kind = field
+            if kind is FIELD_TEXT:
+                text = child.text
+                data[key] = text.strip() if text is not None else defaults[key]
+            elif kind is FIELD_LABEL:
+                text = child.text
+                data[key] = self._label(text) if text is not None else defaults[key]
+            elif kind is FIELD_DECIMAL:
+                data[key] = self._decimal(child.text, child.tag, defaults[key])
+            else:
+                data[key] = getattr(self, kind)(child)
+        return data
+
     def _parse_prices(self, price_element):
-        """Parses price information from a <PRICE> element."""
-        prices = {}
+        """Parses price information from a <PRICES> element into a PriceRecord, or None without a 'cz' price."""
         if price_element is None:
-            return prices
+            return None
 
         # Assuming 'cz' language for now, adjust if you need other languages
-        cz_price_node = price_element.find('PRICE[@language="cz"]')
+        cz_price_node = None
+        for child in price_element:
+            if child.tag == 'PRICE' and child.get('language') == 'cz':
+                cz_price_node = child
+                break
         if cz_price_node is None:
-            return prices
+            return None
+
+        pricelist_node = purchase_node = currency_node = None
+        for child in cz_price_node:
+            tag = child.tag
+            if tag == 'PRICELISTS':
+                # PRICELISTS/PRICELIST: the first PRICELIST of any PRICELISTS
+                if pricelist_node is None:
+                    for pricelist in child:
+                        if pricelist.tag == 'PRICELIST':
+                            pricelist_node = pricelist
+                            break
+            elif tag == 'PRICE_PURCHASE':
+                if purchase_node is None:
+                    purchase_node = child
+            elif tag == 'CURRENCY':
+                if currency_node is None:
+                    currency_node = child
 
-        # Extracting from PRICELISTS/PRICELIST
-        pricelist_node = cz_price_node.find('PRICELISTS/PRICELIST')
-        if pricelist_node:
-            prices['price_original'] = self._get_decimal(pricelist_node, 'PRICE_ORIGINAL')
-            prices['price_sale'] = self._get_decimal(pricelist_node, 'PRICE_SALE')
-            prices['price_with_vat'] = self._get_decimal(pricelist_node, 'PRICE_WITH_VAT')
-            prices['price_without_vat'] = self._get_decimal(pricelist_node, 'PRICE_WITHOUT_VAT')
+        # Extracting from PRICELISTS/PRICELIST (an element without children is falsy, so it's skipped)
+        if pricelist_node is not None and len(pricelist_node):
+            prices = self._parse_element(pricelist_node, PRICELIST_FIELDS, PRICELIST_DEFAULTS)
+        else:
+            prices = {}
 
         # Extracting from direct price fields
-        prices['price_purchase'] = self._get_decimal(cz_price_node, 'PRICE_PURCHASE')
-        prices['currency'] = self._get_text(cz_price_node, 'CURRENCY')
-        
-        return prices
+        return PriceRecord(
+            **prices,
+            price_purchase=self._decimal(purchase_node.text, 'PRICE_PURCHASE') if purchase_node is not None else None,
+            currency=self._label(currency_node.text) if currency_node is not None and currency_node.text is not None else None,
+        )
 
     def _parse_parameters(self, parameters_element):
         """Parses parameters from a <PARAMETERS> element into a dictionary."""
         params_dict = {}
         if parameters_element is None:
             return params_dict
-        for param_node in parameters_element.findall('PARAMETER'):
-            name = self._get_text(param_node, 'NAME[@language="cz"]') # Assuming CZ language
-            value = self._get_text(param_node, 'VALUE[@language="cz"]') # Assuming CZ language
+        for param_node in parameters_element:
+            if param_node.tag != 'PARAMETER':
+                continue
+            name_node = value_node = None
+            for child in param_node:
+                if child.get('language') != 'cz': # Assuming CZ language
+                    continue
+                if child.tag == 'NAME':
+                    if name_node is None:
+                        name_node = child
+                elif child.tag == 'VALUE':
+                    if value_node is None:
+                        value_node = child
+            name = self._label(name_node.text) if name_node is not None and name_node.text is not None else None
+            value = self._label(value_node.text) if value_node is not None and value_node.text is not None else None
             if name and value:
                 params_dict[name] = value
         return params_dict
@@ -85,31 +444,42 @@ class UpgatesProductXMLParser:
         
         return default
 
+    def _get_title(self, product_node):
+        """Same as _get_nested_text(product_node, './/DESCRIPTION[@language="cz"]/TITLE'), without the XPath machinery."""
+        for description in product_node.iter('DESCRIPTION'):
+            if description.get('language') == 'cz':
+                for child in description:
+                    if child.tag == 'TITLE':
+                        return child.text.strip() if child.text is not None else None
+        return None
+
     def _get_main_image_url(self, element):
         """Get the URL of the main image (MAIN_YN="1")"""
-        images = element.find('IMAGES')
-        if images is not None:
-            for image in images.findall('IMAGE'):
-                if self._get_text(image, 'MAIN_YN') == '1':
-                    return self._get_text(image, 'URL')
+        return self._parse_main_image_url(element.find('IMAGES'))
+
+    def _parse_main_image_url(self, images):
+        """Get the URL of the main image (MAIN_YN="1") from an <IMAGES> element."""
+        if images is None:
+            return None
+        for image in images:
+            if image.tag != 'IMAGE':
+                continue
+            main_node = url_node = None
+            for child in image:
+                if child.tag == 'MAIN_YN':
+                    if main_node is None:
+                        main_node = child
+                elif child.tag == 'URL':
+                    if url_node is None:
+                        url_node = child
+            if main_node is not None and main_node.text is not None and main_node.text.strip() == '1':
+                return url_node.text.strip() if url_node is not None and url_node.text is not None else None
         return None
 
     def parse_product(self, product_node):
-        """Parses a single <PRODUCT> XML element."""
-        product_data = {
-            'code': self._get_text(product_node, 'CODE'),
-            'product_id': self._get_text(product_node, 'PRODUCT_ID'),
-            'title': self._get_nested_text(product_node, './/DESCRIPTION[@language="cz"]/TITLE'),
-            'manufacturer': self._get_text(product_node, 'MANUFACTURER'),
-            'ean': self._get_text(product_node, 'EAN'),
-            'supplier_code': self._get_text(product_node, 'SUPPLIER_CODE'),
-            'availability': self._get_text(product_node, 'AVAILABILITY'),
-            'stock': self._get_text(product_node, 'STOCK', '0'),
-            'stock_position': self._get_text(product_node, 'STOCK_POSITION'),
-            'weight': self._get_decimal(product_node, 'WEIGHT', 0),
-            'unit': self._get_text(product_node, 'UNIT'),
-            'image_url': self._get_main_image_url(product_node),
-        }
+        """Parses a single <PRODUCT> XML element into a ProductRecord (without variants)."""
+        product_data = self._parse_element(product_node, PRODUCT_FIELDS, PRODUCT_DEFAULTS)
+        product_data['title'] = self._get_title(product_node)
 
         # Convert product_id and stock to integers safely
         try:
@@ -121,23 +491,11 @@ class UpgatesProductXMLParser:
             product_data['product_id'] = None
             product_data['stock'] = 0
 
-        return product_data
+        return ProductRecord(**product_data)
 
     def parse_variant(self, variant_node):
-        """Parses a single <VARIANT> XML element."""
-        variant_data = {
-            'code': self._get_text(variant_node, 'CODE'),
-            'variant_id': self._get_text(variant_node, 'VARIANT_ID'),
-            'supplier_code': self._get_text(variant_node, 'SUPPLIER_CODE'),
-            'ean': self._get_text(variant_node, 'EAN'),
-            'availability': self._get_text(variant_node, 'AVAILABILITY'),
-            'stock': self._get_text(variant_node, 'STOCK', '0'),
-            'stock_position': self._get_text(variant_node, 'STOCK_POSITION'),
-            'weight': self._get_decimal(variant_node, 'WEIGHT', 0),
-            'image_url': self._get_text(variant_node, 'IMAGE_URL'),
-            'prices': self._parse_prices(variant_node.find('PRICES')),
-            'parameters': self._parse_parameters(variant_node.find('PARAMETERS')),
-        }
+        """Parses a single <VARIANT> XML element into a VariantRecord."""
+        variant_data = self._parse_element(variant_node, VARIANT_FIELDS, VARIANT_DEFAULTS)
 
         # Convert variant_id and stock to integers safely
         try:
@@ -149,21 +507,128 @@ class UpgatesProductXMLParser:
             variant_data['variant_id'] = None
             variant_data['stock'] = 0
 
-        return variant_data
+        return VariantRecord(**variant_data)
+
+    def parse_product_with_variants(self, product_node):
+        """Parses a single <PRODUCT> XML element including its <VARIANTS> into a ProductRecord."""
+        product_info = self.parse_product(product_node)
+
+        # Parse variants for this product
+        variants_node = product_node.find('VARIANTS')
+        if variants_node is not None:
+            for variant_node in variants_node:
+                if variant_node.tag == 'VARIANT':
+                    variant_info = self.parse_variant(variant_node)
+                    product_info.variants.append(variant_info)
+        return product_info
+
+    def iter_products_data(self, source=None):
+        """
+        Yields parsed products (ProductRecords with their variants) one at a time.
+        If `source` (file path or file-like object) is given, the XML is read incrementally with iterparse
+        and every finished <PRODUCT> element is cleared, so memory stays flat regardless of the catalog size.
+        Without `source`, iterates over the already parsed xml_root.
+        """
+        if source is None:
+            if self.xml_root is None:
+                raise ValueError("Either xml_root or source must be provided.")
+            for product_node in self.xml_root.findall('PRODUCT'):
+                yield self.parse_product_with_variants(product_node)
+            return
+
+        if self.backend == BACKEND_LXML:
+            yield from self._iter_products_lxml(source)
+            return
+
+        root = None
+        depth = 0
+        for event, element in ET.iterparse(source, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = element
+                depth += 1
+                continue
+
+            depth -= 1
+            # Only top-level <PRODUCT> elements (direct children of <PRODUCTS>) are products
+            if depth == 1 and element.tag == 'PRODUCT':
+                yield self.parse_product_with_variants(element)
+                # Drop the finished product so the tree doesn't grow with the feed
+                element.clear()
+                root.clear()
+
+    def _iter_products_lxml(self, source):
+        """iter_products_data for the lxml backend: iterparse only reports <PRODUCT> end events."""
+        for event, element in lxml_etree.iterparse(source, events=('end',), tag='PRODUCT', **_lxml_parser_options()):
+            parent = element.getparent()
+            # Only top-level <PRODUCT> elements (direct children of <PRODUCTS>) are products
+            if parent is None or parent.getparent() is not None:
+                continue
+            yield self.parse_product_with_variants(element)
+            # Drop the finished product and its already processed siblings
+            element.clear(keep_tail=True)
+            while element.getprevious() is not None:
+                del parent[0]
+
+    def iter_products_data_parallel(self, path, workers=1, chunk_bytes=DEFAULT_PARSE_CHUNK_BYTES):
+        """
+        Same as iter_products_data(path), but splits the feed file at <PRODUCT> boundaries into byte ranges
+        of about `chunk_bytes` that are parsed by up to `workers` processes. Products are yielded in feed order;
+        at most 2 * workers parsed ranges are kept in memory.
+        Inside daemonic processes (e.g. Celery prefork pool workers), where multiprocessing can't start child
+        processes, the ranges are parsed by a billiard pool instead.
+        Falls back to parsing in this process for small feeds (fewer than two ranges) and for workers <= 1.
+        If a range can't be parsed on its own, the rest of the feed from that range on is parsed in this process,
+        so a malformed feed still raises the usual parse error.
+        """
+        layout = None
+        in_daemon = multiprocessing.current_process().daemon
+        if workers > 1:
+            if in_daemon and billiard is None:
+                logger.warning(f"Parallel feed parsing ({workers} workers) is disabled: running in a daemonic process and billiard is not installed, parsing the feed in a single process.")
+            else:
+                layout = _split_feed(path, chunk_bytes)
+        if layout is None or len(layout.ranges) < 2:
+            with open(path, 'rb') as feed_file:
+                yield from self.iter_products_data(feed_file)
+            return
+
+        workers = min(workers, len(layout.ranges))
+        logger.info(f"Parsing feed in {len(layout.ranges)} chunks with {workers} worker processes.")
+        fallback_start = None
+        next_range = 0
+        pending = deque() # (start, future) in feed order
+        # spawn: workers don't inherit the parent's DB connections, locks or threads
+        if in_daemon:
+            executor = _BilliardParsePool(workers)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        try:
+            while next_range < len(layout.ranges) or pending:
+                while next_range < len(layout.ranges) and len(pending) < workers * 2:
+                    start, end = layout.ranges[next_range]
+                    pending.append((start, executor.submit(
+                        _parse_feed_range, path, start, end, layout.header, layout.footer, self.backend
+                    )))
+                    next_range += 1
+                start, future = pending.popleft()
+                try:
+                    products = future.result()
+                except Exception as e:
+                    logger.warning(f"Parallel parsing of the feed chunk at byte {start} failed ({e}), parsing the rest in a single process.")
+                    fallback_start = start
+                    break
+                yield from products
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        if fallback_start is not None:
+            reader = FeedRangeReader(path, fallback_start, layout.body_end, layout.header, layout.footer)
+            try:
+                yield from self.iter_products_data(reader)
+            finally:
+                reader.close()
 
     def get_all_products_data(self):
         """Iterates through all products and their variants in the XML."""
-        products_data = []
-        for product_node in self.xml_root.findall('PRODUCT'):
-            product_info = self.parse_product(product_node)
-            
-            # Parse variants for this product
-            product_info['variants'] = []
-            variants_node = product_node.find('VARIANTS')
-            if variants_node is not None:
-                for variant_node in variants_node.findall('VARIANT'):
-                    variant_info = self.parse_variant(variant_node)
-                    product_info['variants'].append(variant_info)
-            
-            products_data.append(product_info)
-        return products_data
\ No newline at end of file
+        return list(self.iter_products_data())
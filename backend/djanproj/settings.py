@@ -86,6 +86,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Seconds a write waits for the database lock held by another worker before failing with "database is locked"
+        'OPTIONS': {'timeout': 20},
     }
 }
 
@@ -141,6 +143,7 @@ REST_FRAMEWORK = {
 }
 
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
+CELERY_RESULT_BACKEND = CELERY_BROKER_URL # Needed for chords (fan-out full product sync)
 
 FIELD_ENCRYPTION_KEY = '10QGQcbD0cHP-qnJu-CrfZzfyN0EtBMIKyHWmTmo1ts='
 
@@ -3,7 +3,9 @@ import socketserver
 import json
 import logging
 import os
+import hashlib
 from email.parser import Parser
+from email.utils import formatdate
 
 # Configure logging for the server itself
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,6 +19,40 @@ class RequestLoggerHandler(http.server.BaseHTTPRequestHandler):
         self.send_header('Content-type', content_type)
         self.end_headers()
 
+    def _serve_xml_export(self, filename):
+        """Serves an XML export with ETag/Last-Modified validators and answers conditional requests with 304."""
+        try:
+            # Get the directory of the current script
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            xml_path = os.path.join(current_dir, filename)
+
+            with open(xml_path, 'rb') as f:
+                body = f.read()
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            last_modified = formatdate(os.path.getmtime(xml_path), usegmt=True)
+
+            if self.headers.get('If-None-Match') == etag:
+                logger.info(f"{filename} not modified (ETag match), returning 304")
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header('Content-type', 'application/xml')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.end_headers()
+            self.wfile.write(body)
+        except FileNotFoundError:
+            self._set_headers(404, 'application/json')
+            self.wfile.write(json.dumps({'error': 'XML file not found'}).encode('utf-8'))
+        except Exception as e:
+            self._set_headers(500, 'application/json')
+            self.wfile.write(json.dumps({'error': str(e)}).encode('utf-8'))
+
     def parse_content_type(self, content_type):
         """Parse content type header into main type and parameters"""
         if not content_type:
@@ -103,46 +139,12 @@ class RequestLoggerHandler(http.server.BaseHTTPRequestHandler):
         logger.info(f"Path: {self.path}")
         logger.info(f"Headers:\n{self.headers}")
 
-        if self.path == '/export-full.xml':
-            try:
-                # Get the directory of the current script
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                xml_path = os.path.join(current_dir, 'export-full.xml')
-                
-                with open(xml_path, 'rb') as f:
-                    self._set_headers(200, 'application/xml')
-                    self.wfile.write(f.read())
-                return
-            except FileNotFoundError:
-                self._set_headers(404, 'application/json')
-                self.wfile.write(json.dumps({'error': 'XML file not found'}).encode('utf-8'))
-                return
-            except Exception as e:
-                self._set_headers(500, 'application/json')
-                self.wfile.write(json.dumps({'error': str(e)}).encode('utf-8'))
-                return
-        
-        elif self.path == '/export-partial.xml':
-            try:
-                # Get the directory of the current script
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                xml_path = os.path.join(current_dir, 'export-partial.xml')
-                
-                with open(xml_path, 'rb') as f:
-                    self._set_headers(200, 'application/xml')
-                    self.wfile.write(f.read())
-                return
-            except FileNotFoundError:
-                self._set_headers(404, 'application/json')
-                self.wfile.write(json.dumps({'error': 'XML file not found'}).encode('utf-8'))
-                return
-            except Exception as e:
-                self._set_headers(500, 'application/json')
-                self.wfile.write(json.dumps({'error': str(e)}).encode('utf-8'))
-                return
+        if self.path in ('/export-full.xml', '/export-partial.xml'):
+            self._serve_xml_export(self.path.lstrip('/'))
+            return
 
         # Handle /orders endpoint directly
-        elif '/orders' in self.path:
+        if '/orders' in self.path:
             self._set_headers(200, 'application/json')
             dummy_orders_response = {
                 "current_page": 1,